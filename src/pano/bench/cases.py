@@ -0,0 +1,480 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+The benchmarks of the engine, each function of BENCHMARKS receives a harness.Benchmarks instance and a 
+BenchEnvironment and measures one area of the engine:
+    index       building the resources index of directory and multifile locations and looking up resources
+    node        loading and parsing .node files
+    texture     loading the textures of cubemaps and of 2D nodes
+    raycast2d   loading hotspots maps, looking up the hotspots of 2D nodes and building .qmap files
+    raycast3d   displaying a 3D node and raycasting its hotspots
+    cubemap     the geoms and the frame time of a cubemap rendered with a geom per face and through an atlas
+    i18n        loading the message bundles and translating messages
+    persistence saving and loading a game
+    
+The example data don't contain any 3D nodes, so BenchEnvironment generates a cubemap node in its work 
+directory, see createCubemapFixture. The benchmarks also run against the games of pano.bench.generate, in
+which case the nodes are loaded by a single benchmark and the saved game grows with the number of nodes 
+and items.
+'''
+
+import os
+import random
+import cPickle
+import logging
+
+from pandac.PandaModules import PNMImage, Filename, TexturePool
+
+from pano.constants import PanoConstants
+from pano.model.HotspotsMaps import QuadTreeMap
+from pano.persistence import PersistenceManager, SavedGameData
+from pano.resources.i18n import i18n
+from pano.resources.ResourceLoader import ResourceLoader
+from pano.resources.ResourcesTypes import ResourcesTypes
+from pano.resources.ResourcesLocationsFactory import ResourcesLocationsFactory
+from pano.view.CubemapTiles import CubemapTiles
+from pano.view.NodeRenderer import NodeRenderer
+from pano.view.sprites import SpritesEngine
+from pano.bench.harness import UNIT_MICROS, UNIT_COUNT
+
+
+# names of the faces as used by .node files
+FACE_NAMES = {
+              PanoConstants.CBM_FRONT_FACE  : 'front',
+              PanoConstants.CBM_BACK_FACE   : 'back',
+              PanoConstants.CBM_LEFT_FACE   : 'left',
+              PanoConstants.CBM_RIGHT_FACE  : 'right',
+              PanoConstants.CBM_TOP_FACE    : 'top',
+              PanoConstants.CBM_BOTTOM_FACE : 'bottom'
+              }
+
+# the name of the generated 3D node and the basename of its cubemap
+FIXTURE_NODE = 'bench_cube'
+
+# number of points that are looked up by the raycasting benchmarks
+RAYCAST_POINTS = 1024
+
+# number of messages that are translated by the i18n benchmarks
+TRANSLATED_MESSAGES = 1024
+
+# minimum number of variables of the global context of the saved game, there are also 4 per node
+SAVED_GAME_VARS = 2000
+
+# beyond this number of nodes the nodes are loaded by a single benchmark instead of one per node
+MAX_NODE_BENCHMARKS = 16
+
+# number of frames that are rendered in each sample of the cubemap benchmarks
+CUBEMAP_FRAMES = 20
+
+
+class BenchEnvironment(object):
+    '''
+    Holds the resources and the renderer that are shared by the benchmarks. 
+    '''
+    def __init__(self, dataDir, workDir, multifile = None, seed = 0):
+        '''
+        @param dataDir: The directory of the game data to benchmark, e.g. examples/data.
+        @param workDir: A writable directory for generated fixtures and saved games.
+        @param multifile: The multifile for the index benchmark, if None then the one of the examples is used.
+        @param seed: The seed of the random generator, which provides the points of the raycasting benchmarks.
+        '''
+        self.log = logging.getLogger('pano.bench')
+        self.dataDir = dataDir
+        self.workDir = workDir
+        self.multifile = multifile if multifile is not None else os.path.join(dataDir, 'multifiles', 'resources.mf')
+        self.random = random.Random(seed)
+        self.resources = None
+        self.spritesEngine = None
+        self.renderer = None
+        
+        
+    def setup(self):
+        '''
+        Generates the fixtures and creates the resource loader, this requires the ShowBase instance.
+        '''
+        createCubemapFixture(self.workDir, FIXTURE_NODE)
+        self.resources = createResources(self.dataDir, self.workDir)
+        self.spritesEngine = SpritesEngine()
+        self.spritesEngine.initialize(self.resources)
+        
+        
+    def dispose(self):
+        if self.renderer is not None:
+            self.renderer.dispose()
+            self.renderer = None
+        if self.spritesEngine is not None:
+            self.spritesEngine.dispose()
+            self.spritesEngine = None
+        if self.resources is not None:
+            self.resources.dispose()
+            self.resources = None
+            
+            
+    def getRenderer(self):
+        '''
+        @return: The NodeRenderer instance for 3D nodes, it is created on the first call.
+        '''
+        if self.renderer is None:
+            self.renderer = NodeRenderer(self.resources, self.spritesEngine)
+            self.renderer.initialize()
+        return self.renderer
+    
+    
+    def getNodeNames(self):
+        '''
+        @return: The sorted names of all nodes.
+        '''
+        return sorted([os.path.splitext(os.path.basename(f))[0] for f in self.resources.listResources(PanoConstants.RES_TYPE_NODES, False)])
+    
+    
+    def getRandomPoints(self, count, low = 0.0, high = 1.0):
+        '''
+        @return: A list of count (x, y) tuples with coordinates in the range low..high.
+        '''
+        return [(self.random.uniform(low, high), self.random.uniform(low, high)) for i in xrange(count)]
+    
+    
+    def coldCaches(self):
+        '''
+        Empties the resources cache and Panda's texture pool, so that the next loads read from disk.
+        '''
+        self.resources.clearCache()
+        TexturePool.releaseAllTextures()
+        
+        
+def createResources(dataDir, workDir):
+    '''
+    @return: A ResourceLoader that indexes the data directory recursively and the work directory.
+    '''
+    res = ResourceLoader()
+    res.initialize()
+    allTypes = ResourcesTypes.listAllTypes()
+    res.addResourcesLocation(ResourcesLocationsFactory.create(dataDir + ResourcesLocationsFactory.RECURSIVE_SUFFIX, 'bench_data', allTypes))
+    res.addResourcesLocation(ResourcesLocationsFactory.create(workDir, 'bench_fixtures', allTypes))
+    return res
+
+
+def createCubemapFixture(directory, name, faceSize = 1024, numHotspots = 60, seed = 0):
+    '''
+    Writes a 3D node along with the six textures of its cubemap. The hotspots are rectangles of random 
+    positions and sizes, distributed evenly between the faces.
+    @param directory: The directory where the files will be written.
+    @param name: The name of the node, it is also used as the basename of the cubemap.
+    @param faceSize: The width and height of the faces' textures in pixels.
+    @param numHotspots: The number of the node's hotspots.
+    '''
+    rnd = random.Random(seed)
+    faces = sorted(FACE_NAMES.keys())
+    for face in faces:
+        img = PNMImage(faceSize, faceSize)
+        img.fill(rnd.random(), rnd.random(), rnd.random())
+        img.write(Filename.fromOsSpecific(os.path.join(directory, '%s%s.png' % (name, CubemapTiles.FACE_SUFFIXES[face]))))
+        
+    lines = ['[Node]', 'cubemap = %s' % name, 'extension = png', '']
+    for i in xrange(numHotspots):
+        width = rnd.randint(faceSize / 16, faceSize / 4)
+        height = rnd.randint(faceSize / 16, faceSize / 4)
+        lines.extend(['[hotspot_hp%d]' % i,
+                      'face = %s' % FACE_NAMES[faces[i % len(faces)]],
+                      'xo = %d' % rnd.randint(0, faceSize - width),
+                      'yo = %d' % rnd.randint(0, faceSize - height),
+                      'width = %d' % width,
+                      'height = %d' % height,
+                      ''])
+        
+    fp = open(os.path.join(directory, name + '.node'), 'w')
+    try:
+        fp.write('\n'.join(lines))
+    finally:
+        fp.close()
+        
+        
+def benchIndex(bench, env):
+    allTypes = ResourcesTypes.listAllTypes()
+    
+    def buildIndex(locationID):
+        res = ResourceLoader()
+        res.addResourcesLocation(ResourcesLocationsFactory.create(locationID, 'bench_index', allTypes))
+        res.dispose()
+    
+    bench.measure('index.build.directory', lambda: buildIndex(env.dataDir + ResourcesLocationsFactory.RECURSIVE_SUFFIX))
+    
+    if os.path.exists(env.multifile):
+        bench.measure('index.build.multifile', lambda: buildIndex(env.multifile))
+    else:
+        bench.skip('index.build.multifile', '%s was not found' % env.multifile)
+    
+    names = []
+    for resType in allTypes:
+        names.extend([(resType, f) for f in env.resources.listResources(resType, False)])
+    misses = [(allTypes[i % len(allTypes)], 'missing_%d' % i) for i in xrange(1024)]
+    
+    def lookups(names):
+        locate = env.resources.locateResource
+        for resType, filename in names:
+            locate(resType, filename)
+    
+    if names:
+        bench.measure('index.lookup.hit', lambda: lookups(names), operations = len(names), unit = UNIT_MICROS)
+    else:
+        bench.skip('index.lookup.hit', 'no resources were indexed')
+    bench.measure('index.lookup.miss', lambda: lookups(misses), operations = len(misses), unit = UNIT_MICROS)
+
+
+def benchNodes(bench, env):
+    names = env.getNodeNames()
+    if len(names) <= MAX_NODE_BENCHMARKS:
+        for name in names:
+            bench.measure('node.load.%s' % name, lambda name = name: env.resources.loadNode(name), setup = env.resources.clearCache)
+    else:
+        def loadAll():
+            for name in names:
+                env.resources.loadNode(name)
+        bench.measure('node.load.all', loadAll, setup = env.resources.clearCache, operations = len(names))
+        
+        
+def benchTextures(bench, env):
+    node = env.resources.loadNode(FIXTURE_NODE)
+    ext = node.getExtension() if node.getExtension() is not None else 'png'
+    faces = ['%s%s.%s' % (node.getCubemap(), suffix, ext) for suffix in CubemapTiles.FACE_SUFFIXES.values()]
+    
+    def loadTextures(filenames):
+        for filename in filenames:
+            if env.resources.loadTexture(filename) is None:
+                raise IOError('failed to load texture %s' % filename)
+            
+    bench.measure('texture.load.cubemap', lambda: loadTextures(faces), setup = env.coldCaches)
+    
+    images = set()
+    for name in env.getNodeNames():
+        node = env.resources.loadNode(name)
+        if node is not None and node.image is not None and node.image not in images:
+            images.add(node.image)
+            bench.measure('texture.load.%s' % node.image, lambda image = node.image: loadTextures([image]), setup = env.coldCaches)
+            
+            
+def benchHotspotsMaps(bench, env):
+    '''
+    Hotspots of 2D nodes are raycasted by looking up the node's hotspots map, as in Node2DRenderer.raycastHotspots.
+    Both the .imap and the .qmap versions of a node's map are measured, if they exist.
+    '''
+    points = env.getRandomPoints(RAYCAST_POINTS)
+    measured = set()
+    for name in env.getNodeNames():
+        node = env.resources.loadNode(name)
+        if node is None or not node.hotspotsMapFilename:
+            continue
+        
+        stem = os.path.splitext(node.hotspotsMapFilename)[0]
+        for mapFilename in (stem + '.imap', stem + '.qmap'):
+            if mapFilename in measured or env.resources.locateResource(PanoConstants.RES_TYPE_HMAPS, mapFilename) is None:
+                continue
+            measured.add(mapFilename)
+            
+            bench.measure('hmap.load.%s' % mapFilename, lambda f = mapFilename: env.resources.loadHotspotsMap(f), setup = env.resources.clearCache)
+            
+            hmap = env.resources.loadHotspotsMap(mapFilename)
+            if hmap is None:
+                bench.skip('raycast.2d.%s' % mapFilename, 'failed to load the map')
+                continue
+            
+            def raycast(node = node, hmap = hmap):
+                for x, y in points:
+                    node.getHotspot(hmap.getHotspot(x, 1.0 - y))
+                
+            bench.measure('raycast.2d.%s' % mapFilename, raycast, operations = len(points), unit = UNIT_MICROS)
+            
+            if mapFilename.endswith('.qmap'):
+                image = env.resources.loadImage(hmap.imageFile) if hmap.imageFile else None
+                if image is None:
+                    bench.skip('qmap.build.%s' % mapFilename, 'the image of the map was not found')
+                    continue
+                
+                def build(hmap = hmap, image = image):
+                    QuadTreeMap(hmap.name).fromImage(image, hmap.metric, hmap.maxDepth, hmap.hotspots)
+                    
+                bench.measure('qmap.build.%s' % mapFilename, build)
+                
+                
+def benchRaycast3D(bench, env):
+    renderer = env.getRenderer()
+    node = env.resources.loadNode(FIXTURE_NODE)
+    
+    def setupDisplay():
+        renderer.clearScene()
+        renderer.node = None
+        env.coldCaches()
+        
+    bench.measure('node.display.3d', lambda: renderer.displayNode(node), setup = setupDisplay)
+    renderer.displayNode(node)
+    
+    # the points are spread over all faces by casting from a number of camera orientations
+    cam = renderer.getCamera()
+    orientations = [(env.random.uniform(0.0, 360.0), env.random.uniform(-90.0, 90.0)) for i in xrange(32)]
+    points = env.getRandomPoints(RAYCAST_POINTS / len(orientations), -1.0, 1.0)
+    
+    def raycast():
+        for h, p in orientations:
+            cam.setHpr(h, p, 0)
+            for x, y in points:
+                renderer.raycastHotspots(x, y)
+        cam.setHpr(0, 0, 0)
+        
+    bench.measure('raycast.3d', raycast, operations = len(orientations) * len(points), unit = UNIT_MICROS)
+    
+    
+def benchCubemapAtlas(bench, env):
+    '''
+    Displays the generated 3D node with a geom for each face of its cubemap and then through an atlas, counting 
+    the visible geoms, i.e. the draw calls of the cubemap, and timing the rendering of frames.
+    '''
+    renderer = env.getRenderer()
+    node = env.resources.loadNode(FIXTURE_NODE)
+    
+    try:
+        for mode, useAtlas in (('faces', False), ('atlas', True)):
+            renderer.setAtlas(useAtlas)
+            renderer.clearScene()
+            renderer.node = None
+            renderer.displayNode(node)
+            
+            name = 'cubemap.%s.geoms' % mode
+            if bench.isSelected(name):
+                geoms = 0
+                for np in renderer.getSceneRoot().findAllMatches('**/+GeomNode'):
+                    if not np.isHidden():
+                        geoms += np.node().getNumGeoms()
+                bench.addSamples(name, [geoms], UNIT_COUNT)
+            
+            name = 'cubemap.%s.frame' % mode
+            if base.win is None:
+                bench.skip(name, 'there is no window to render to')
+            else:
+                bench.measure(name, base.graphicsEngine.renderFrame, number = CUBEMAP_FRAMES)
+    finally:
+        renderer.setAtlas(False)
+        renderer.clearScene()
+        renderer.node = None
+    
+    
+def benchI18n(bench, env):
+    '''
+    Translates messages of the language with the most messages, without specifying a bundle so that all 
+    bundles of the language are searched as for the messages of the game.
+    '''
+    bench.measure('i18n.load', env.resources.loadAllLangFiles, setup = env.resources.clearCache)
+    
+    translations = env.resources.loadAllLangFiles()
+    if not translations:
+        bench.skip('i18n.translate', 'no message bundles were found')
+        return
+    
+    counts = {}
+    for t in translations:
+        counts[t.getLanguage()] = counts.get(t.getLanguage(), 0) + len(t)
+    language = max(counts.keys(), key = counts.get)
+    
+    keys = []
+    for t in translations:
+        if t.getLanguage() == language:
+            keys.extend(t.keys())
+    keys = [env.random.choice(keys) for i in xrange(TRANSLATED_MESSAGES)]
+    misses = ['missing.message%d' % i for i in xrange(TRANSLATED_MESSAGES)]
+    
+    tr = i18n(None)
+    tr.addTranslations(translations)
+    tr.setLanguage(language)
+    
+    def translate(keys):
+        for key in keys:
+            tr.translate(key)
+            
+    bench.measure('i18n.translate', lambda: translate(keys), operations = len(keys), unit = UNIT_MICROS)
+    bench.measure('i18n.translate.miss', lambda: translate(misses), operations = len(misses), unit = UNIT_MICROS)
+    
+    
+def benchPersistence(bench, env):
+    '''
+    Saves and loads a game the same way GameSaveLoad does, but with contexts that are filled with generated 
+    values instead of the state of a running game. The contexts hold variables for every node and item.
+    '''
+    nodes = env.getNodeNames()
+    items = [os.path.splitext(os.path.basename(f))[0] for f in env.resources.listResources(PanoConstants.RES_TYPE_ITEMS, False)]
+    
+    pm = PersistenceManager()
+    globalCtx = pm.getGlobal()
+    for i in xrange(SAVED_GAME_VARS):
+        globalCtx.addVar('var_%d' % i, (i, 'value_%d' % i, [i] * (i % 8), {'flag' : i % 2 == 0}))
+    for name in nodes:
+        globalCtx.addVar(name + '.visited', True)
+        globalCtx.addVar(name + '.visits', 3)
+        globalCtx.addVar(name + '.inactive', ['hp%d' % i for i in xrange(4)])
+        globalCtx.addVar(name + '.cameraHpr', (90.0, 0.0, 0.0))
+        
+    fsmCtx = pm.createContext('fsm')
+    fsmCtx.addVar('activeNode', FIXTURE_NODE)
+    fsmCtx.addVar('states', ['state_%d' % i for i in xrange(32)])
+    
+    inventoryCtx = pm.createContext('inventory')
+    inventoryCtx.addVar('items', [(name, i % 4) for i, name in enumerate(items or ['item_%d' % i for i in xrange(200)])])
+    
+    filename = os.path.join(env.workDir, 'bench.sav')
+    
+    def save():
+        data = SavedGameData()
+        data.setName('bench')
+        data.setActiveNode(FIXTURE_NODE)
+        data.setInventoryCtx(pm.serializeContext(inventoryCtx))
+        data.setFsmCtx(pm.serializeContext(fsmCtx))
+        data.setGlobalCtx(pm.serializeContext(globalCtx))
+        fp = open(filename, 'w')
+        try:
+            fp.write(cPickle.dumps(data))
+        finally:
+            fp.close()
+            
+    def load():
+        fp = open(filename, 'r')
+        try:
+            data = cPickle.load(fp)
+        finally:
+            fp.close()
+        pm.deserializeContext(data.getInventoryCtx())
+        pm.deserializeContext(data.getFsmCtx())
+        pm.deserializeContext(data.getGlobalCtx())
+        
+    bench.measure('persistence.save', save)
+    save()
+    bench.measure('persistence.load', load)
+
+
+# the benchmarks by group name, in the order they run
+BENCHMARKS = [
+              ('index', benchIndex),
+              ('node', benchNodes),
+              ('texture', benchTextures),
+              ('raycast2d', benchHotspotsMaps),
+              ('raycast3d', benchRaycast3D),
+              ('cubemap', benchCubemapAtlas),
+              ('i18n', benchI18n),
+              ('persistence', benchPersistence)
+              ]
@@ -0,0 +1,482 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Generates a synthetic game at the scale of a shipped adventure, in order to profile the indexing of resources,
+the lookup of translations and saving and loading with realistic numbers of nodes, items and sounds.
+
+Usage: python -m pano.bench.generate [options] <output directory>
+
+The output directory has the following layout:
+    game.cfg            the configuration of the game, all its resources are found under data/
+    data/nodes          the .node files, most are 3D nodes and the rest 2D nodes with hotspots maps
+    data/textures       the faces of the cubemaps and the images of the 2D nodes and of the items
+    data/hmaps          the hotspots maps of the 2D nodes, each map is written both as .imap and as .qmap
+    data/items          the .item files
+    data/sounds         the .sound files
+    data/langs          the message bundles of every language
+    multifile/          the same game with data/ packed into data.mf, written when the -m option is given
+    
+The nodes are connected through acGotoNode hotspots, their hotspots and the items have description keys
+in the labels bundle and every other bundle is filled with generated messages. The nodes share a few
+cubemaps and hotspots maps so that the size on disk stays reasonable. The sounds refer to the audio file given
+by the -a option, which is copied to data/sounds, otherwise to a file that doesn't exist. Fonts, pointers and 
+the cubemap model aren't generated, the directory given by the -c option (examples/data/common by default) 
+is added to the resources of the game for these.
+
+Use python -m pano.bench.run -d <output directory>/data -m <output directory>/multifile/data.mf to run the
+benchmarks against the generated game.
+'''
+
+import os
+import sys
+import math
+import random
+import shutil
+import logging
+from optparse import OptionParser
+
+from pandac.PandaModules import PNMImage, Filename, Multifile
+
+from pano.model.HotspotsMaps import ImageMap, QuadTreeMap
+from pano.view.CubemapTiles import CubemapTiles
+
+
+# the fonts, pointers and cubemap model of the examples, relative to the directory of this module
+DEFAULT_COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir, 'examples', 'data', 'common')
+
+# words of the generated messages
+WORDS = ('the', 'door', 'key', 'old', 'lamp', 'is', 'locked', 'under', 'a', 'dusty', 'table', 'you', 'see', 
+         'nothing', 'special', 'map', 'of', 'harbour', 'strange', 'noise', 'from', 'cellar', 'painting', 'letter')
+
+# names of the faces as used by .node files, in the order of CubemapTiles.FACE_SUFFIXES
+FACE_NAMES = ('front', 'back', 'left', 'right', 'top', 'bottom')
+
+# subdirectories of the data directory
+DATA_DIRS = ('nodes', 'textures', 'hmaps', 'items', 'sounds', 'langs')
+
+# extensions of files that are stored compressed in the multifile, the images are compressed already
+COMPRESSED_EXTENSIONS = ('.node', '.item', '.sound', '.lang', '.imap', '.qmap')
+
+
+class SyntheticGame(object):
+    '''
+    Writes the files of a synthetic game, all the contents are derived from the random seed so that 
+    the same options always produce the same game.
+    '''
+    def __init__(self, numNodes = 1000, hotspotsPerNode = 16, numItems = 500, numSounds = 500, numKeys = 20000, 
+                 languages = ('en', 'gr', 'de'), numBundles = 2, numCubemaps = 4, faceSize = 256, numMaps = 8, 
+                 mapSize = 512, ratio2D = 0.2, seed = 0):
+        '''
+        @param numNodes: The number of nodes.
+        @param hotspotsPerNode: The number of hotspots of every node.
+        @param numItems: The number of inventory items.
+        @param numSounds: The number of sounds.
+        @param numKeys: The minimum number of keys of every message bundle.
+        @param languages: The codes of the languages, there is a message bundle per language for each bundle name.
+        @param numBundles: The number of message bundles per language, the first is always named labels.
+        @param numCubemaps: The number of distinct cubemaps that are shared by the 3D nodes.
+        @param faceSize: The width and height of the cubemaps' faces in pixels.
+        @param numMaps: The number of distinct hotspots maps that are shared by the 2D nodes.
+        @param mapSize: The width and height of the images of the hotspots maps in pixels.
+        @param ratio2D: The fraction of nodes that are 2D.
+        @param seed: The seed of the random generator.
+        '''
+        self.log = logging.getLogger('pano.bench.generate')
+        self.numNodes = numNodes
+        self.hotspotsPerNode = hotspotsPerNode
+        self.numItems = numItems
+        self.numSounds = numSounds
+        self.numKeys = numKeys
+        self.languages = languages
+        self.numBundles = numBundles
+        self.numCubemaps = numCubemaps
+        self.faceSize = faceSize
+        self.numMaps = numMaps
+        self.mapSize = mapSize
+        self.ratio2D = ratio2D
+        self.seed = seed
+        self.random = random.Random(seed)
+        
+        # the keys and the English messages of the labels bundle, as a list of (key, message) tuples
+        self.labels = []
+        
+        # the number of files written by type, e.g. { 'nodes' : 1000 }
+        self.counts = {}
+        
+        
+    def getNodeName(self, i):
+        return 'node%05d' % i
+    
+    
+    def getItemName(self, i):
+        return 'item%04d' % i
+    
+    
+    def getSoundName(self, i):
+        return 'sound%04d' % i
+    
+    
+    def write(self, directory, commonDir = None, audioFile = None):
+        '''
+        Writes the game into the given directory, any existing data directory of a previous game is replaced.
+        @param directory: The directory of the game.
+        @param commonDir: A directory with the fonts, pointers and the cubemap model that is added to the 
+        resources of the game, or None.
+        @param audioFile: An audio file for the sounds, or None.
+        @return: A dictionary with the number of files written by type.
+        '''
+        self.random.seed(self.seed)
+        self.labels = []
+        self.counts = {}
+        
+        dataDir = os.path.join(directory, 'data')
+        if os.path.exists(dataDir):
+            shutil.rmtree(dataDir)
+        for d in DATA_DIRS:
+            os.makedirs(os.path.join(dataDir, d))
+            
+        audioName = 'synthetic.ogg'
+        if audioFile is not None:
+            audioName = os.path.basename(audioFile)
+            shutil.copyfile(audioFile, os.path.join(dataDir, 'sounds', audioName))
+        
+        cubemaps = self.writeCubemaps(os.path.join(dataDir, 'textures'))
+        maps = self.writeHotspotsMaps(os.path.join(dataDir, 'textures'), os.path.join(dataDir, 'hmaps'))
+        self.writeNodes(os.path.join(dataDir, 'nodes'), cubemaps, maps)
+        self.writeItems(os.path.join(dataDir, 'items'), os.path.join(dataDir, 'textures'))
+        self.writeSounds(os.path.join(dataDir, 'sounds'), audioName)
+        self.writeLangs(os.path.join(dataDir, 'langs'))
+        
+        locations = ['data/**']
+        if commonDir is not None:
+            locations.append(os.path.abspath(commonDir))
+        self.writeConfig(os.path.join(directory, 'game.cfg'), locations)
+        return self.counts
+        
+        
+    def writeMultifile(self, directory, commonDir = None):
+        '''
+        Packs the data directory of a game that was written by write into multifile/data.mf and writes the
+        configuration of the multifile variant of the game into multifile/game.cfg.
+        @param directory: The directory of the game.
+        @param commonDir: The same as for write.
+        @return: The number of files in the multifile.
+        '''
+        dataDir = os.path.join(directory, 'data')
+        mfDir = os.path.join(directory, 'multifile')
+        if not os.path.exists(mfDir):
+            os.makedirs(mfDir)
+            
+        mfFilename = os.path.join(mfDir, 'data.mf')
+        if os.path.exists(mfFilename):
+            os.remove(mfFilename)
+            
+        mf = Multifile()
+        if not mf.openWrite(Filename.fromOsSpecific(mfFilename)):
+            raise IOError('failed to create multifile %s' % mfFilename)
+        
+        count = 0
+        try:
+            for d in DATA_DIRS:
+                for filename in sorted(os.listdir(os.path.join(dataDir, d))):
+                    compression = 6 if os.path.splitext(filename)[1] in COMPRESSED_EXTENSIONS else 0
+                    mf.addSubfile('%s/%s' % (d, filename), Filename.fromOsSpecific(os.path.join(dataDir, d, filename)), compression)
+                    count += 1
+            mf.flush()
+        finally:
+            mf.close()
+            
+        locations = ['data.mf']
+        if commonDir is not None:
+            locations.append(os.path.abspath(commonDir))
+        self.writeConfig(os.path.join(mfDir, 'game.cfg'), locations)
+        self.counts['multifile'] = count
+        return count
+    
+    
+    def writeConfig(self, filename, locations):
+        lines = ['[game]',
+                 'title = Synthetic game of %d nodes' % self.numNodes,
+                 'initial_node = %s' % self.getNodeName(0),
+                 '',
+                 '[resources]',
+                 'all = %s' % ', '.join(locations),
+                 '',
+                 '[i18n]',
+                 'language = %s' % self.languages[0],
+                 'messages = labels.lang',
+                 '']
+        self._writeLines(filename, lines)
+        
+        
+    def writeCubemaps(self, directory):
+        '''
+        @return: The list of the cubemaps' names.
+        '''
+        names = []
+        for i in xrange(self.numCubemaps):
+            name = 'cubemap%02d' % i
+            for face in sorted(CubemapTiles.FACE_SUFFIXES.keys()):
+                img = PNMImage(self.faceSize, self.faceSize)
+                img.fill(self.random.random(), self.random.random(), self.random.random())
+                self._writeImage(img, os.path.join(directory, '%s%s.png' % (name, CubemapTiles.FACE_SUFFIXES[face])))
+            names.append(name)
+        return names
+    
+    
+    def writeHotspotsMaps(self, imagesDir, mapsDir):
+        '''
+        Writes the images of the hotspots maps and the maps in both formats. Every map has hotspotsPerNode 
+        hotspots, which are rectangles of a unique colour on a white background, one in every cell of a grid.
+        @return: A list of (image filename, map basename, hotspots names) tuples.
+        '''
+        cols = 1
+        while cols * cols < self.hotspotsPerNode:
+            cols += 1
+        cell = self.mapSize / cols
+        
+        maps = []
+        for i in xrange(self.numMaps):
+            name = 'map%02d' % i
+            imageFile = name + '.png'
+            img = PNMImage(self.mapSize, self.mapSize)
+            img.fill(1.0, 1.0, 1.0)
+            
+            hotspots = {}
+            for j in xrange(self.hotspotsPerNode):
+                colour = self._getHotspotColour(j)
+                w = self.random.randint(cell / 4, cell - 2)
+                h = self.random.randint(cell / 4, cell - 2)
+                rect = PNMImage(w, h)
+                rect.fill(colour[0] / 255.0, colour[1] / 255.0, colour[2] / 255.0)
+                img.copySubImage(rect, (j % cols) * cell + self.random.randint(0, cell - w), (j / cols) * cell + self.random.randint(0, cell - h))
+                hotspots['hp%d' % j] = colour
+                
+            self._writeImage(img, os.path.join(imagesDir, imageFile))
+            
+            fp = open(os.path.join(mapsDir, name + '.imap'), 'w')
+            try:
+                ImageMap(name, imageFile, hotspots).write(fp)
+            finally:
+                fp.close()
+                
+            qmap = QuadTreeMap(name, imageFile)
+            qmap.fromImage(img, hotspots = hotspots)
+            fp = open(os.path.join(mapsDir, name + '.qmap'), 'wb')
+            try:
+                qmap.write(fp)
+            finally:
+                fp.close()
+            
+            maps.append((imageFile, name, sorted(hotspots.keys())))
+        self.counts['hmaps'] = 2 * len(maps)
+        return maps
+    
+    
+    def writeNodes(self, directory, cubemaps, maps):
+        for i in xrange(self.numNodes):
+            name = self.getNodeName(i)
+            
+            # every node leads to the next and to a random one
+            targets = [self.getNodeName((i + 1) % self.numNodes), self.getNodeName(self.random.randint(0, self.numNodes - 1))]
+            
+            lines = ['[Node]', 'description = %s' % self._addLabel(name + '.description')]
+            if maps and self.random.random() < self.ratio2D:
+                imageFile, mapName, hotspots = maps[self.random.randint(0, len(maps) - 1)]
+                mapExt = '.imap' if i % 2 == 0 else '.qmap'
+                lines.extend(['image = %s' % imageFile, 'hotspots_map = %s%s' % (mapName, mapExt), 'parent2d = render2d', ''])
+                for j, hp in enumerate(hotspots):
+                    lines.extend(self._getHotspotLines(name, hp, j, targets))
+                    lines.append('')
+            else:
+                lines.extend(['cubemap = %s' % cubemaps[self.random.randint(0, len(cubemaps) - 1)], 'extension = png', ''])
+                for j in xrange(self.hotspotsPerNode):
+                    w = self.random.randint(self.faceSize / 16, self.faceSize / 4)
+                    h = self.random.randint(self.faceSize / 16, self.faceSize / 4)
+                    lines.extend(self._getHotspotLines(name, 'hp%d' % j, j, targets))
+                    lines.extend(['face = %s' % FACE_NAMES[self.random.randint(0, len(FACE_NAMES) - 1)],
+                                  'xo = %d' % self.random.randint(0, self.faceSize - w),
+                                  'yo = %d' % self.random.randint(0, self.faceSize - h),
+                                  'width = %d' % w,
+                                  'height = %d' % h,
+                                  ''])
+            self._writeLines(os.path.join(directory, name + '.node'), lines)
+        self.counts['nodes'] = self.numNodes
+        
+        
+    def writeItems(self, directory, iconsDir):
+        '''
+        Writes the items along with their icons, every icon is shared by a number of items.
+        '''
+        icons = []
+        for i in xrange(min(self.numItems, 16)):
+            img = PNMImage(64, 64)
+            img.fill(self.random.random(), self.random.random(), self.random.random())
+            icons.append('icon%02d.png' % i)
+            self._writeImage(img, os.path.join(iconsDir, icons[-1]))
+            
+        for i in xrange(self.numItems):
+            name = self.getItemName(i)
+            maxCount = self.random.randint(1, 5)
+            lines = ['[item]',
+                     'description = %s' % self._addLabel(name + '.description'),
+                     'image = %s' % icons[i % len(icons)],
+                     'selected_image = %s' % icons[(i + 1) % len(icons)],
+                     'count = %d' % self.random.randint(1, maxCount),
+                     'max_count = %d' % maxCount]
+            if self.numSounds > 0:
+                lines.append('sound = %s' % self.getSoundName(i % self.numSounds))
+            lines.append('')
+            self._writeLines(os.path.join(directory, name + '.item'), lines)
+        self.counts['items'] = self.numItems
+    
+    
+    def writeSounds(self, directory, audioName):
+        for i in xrange(self.numSounds):
+            lines = ['[sound]',
+                     'filename = %s' % audioName,
+                     'volume = %.2f' % self.random.uniform(0.2, 1.0),
+                     'balance = %.2f' % self.random.uniform(-1.0, 1.0),
+                     'loop = %s' % ('true' if i % 4 == 0 else 'false'),
+                     'subtitles = %s' % self._addLabel(self.getSoundName(i) + '.subtitles'),
+                     '']
+            self._writeLines(os.path.join(directory, self.getSoundName(i) + '.sound'), lines)
+        self.counts['sounds'] = self.numSounds
+        
+        
+    def writeLangs(self, directory):
+        '''
+        Writes the labels bundle and the other bundles of every language. The messages of the other languages 
+        are the English messages with the language's code appended.
+        '''
+        bundles = [('labels', list(self.labels))]
+        for b in xrange(1, self.numBundles):
+            bundles.append(('messages%d' % b, []))
+            
+        for name, messages in bundles:
+            i = 0
+            while len(messages) < self.numKeys:
+                messages.append(('%s.msg%d' % (name, i), self._getMessage()))
+                i += 1
+                
+            for lang in self.languages:
+                lines = ['[labels]']
+                suffix = '' if lang == 'en' else ' (%s)' % lang
+                lines.extend(['%s = %s%s' % (key, msg, suffix) for key, msg in messages])
+                lines.append('')
+                self._writeLines(os.path.join(directory, '%s_%s.lang' % (name, lang)), lines)
+        self.counts['langs'] = len(bundles) * len(self.languages)
+        
+        
+    def _getHotspotLines(self, nodeName, hpName, index, targets):
+        lines = ['[hotspot_%s]' % hpName, 
+                 'look_text = %s' % self._addLabel('%s.%s' % (nodeName, hpName)),
+                 'cursor = interact']
+        if index < len(targets):
+            lines.append('action = acGotoNode, %s' % targets[index])
+        return lines
+    
+    
+    def _getHotspotColour(self, i):
+        '''
+        @return: A unique colour for the i-th hotspot of a map, which is never white.
+        '''
+        return (10 + (i % 16) * 15, 10 + ((i / 16) % 16) * 15, 10 + (i / 256) * 15)
+    
+    
+    def _addLabel(self, key):
+        '''
+        Adds a generated message to the labels bundle.
+        @return: The key.
+        '''
+        self.labels.append((key, self._getMessage()))
+        return key
+    
+    
+    def _getMessage(self):
+        return ' '.join([self.random.choice(WORDS) for i in xrange(self.random.randint(3, 12))])
+    
+    
+    def _writeImage(self, img, filename):
+        if not img.write(Filename.fromOsSpecific(filename)):
+            raise IOError('failed to write image %s' % filename)
+        
+        
+    def _writeLines(self, filename, lines):
+        fp = open(filename, 'w')
+        try:
+            fp.write('\n'.join(lines))
+        finally:
+            fp.close()
+
+
+def main(argv = None):
+    optParser = OptionParser(usage = 'usage: %prog [options] <output directory>')
+    optParser.add_option('-n', '--nodes', dest = 'nodes', type = 'int', default = 1000, help = 'number of nodes')
+    optParser.add_option('--hotspots', dest = 'hotspots', type = 'int', default = 16, help = 'number of hotspots per node')
+    optParser.add_option('-i', '--items', dest = 'items', type = 'int', default = 500, help = 'number of inventory items')
+    optParser.add_option('-s', '--sounds', dest = 'sounds', type = 'int', default = 500, help = 'number of sounds')
+    optParser.add_option('-k', '--keys', dest = 'keys', type = 'int', default = 20000, help = 'minimum number of keys per message bundle')
+    optParser.add_option('-l', '--languages', dest = 'languages', default = 'en,gr,de', help = 'comma separated codes of the languages')
+    optParser.add_option('-b', '--bundles', dest = 'bundles', type = 'int', default = 2, help = 'number of message bundles per language')
+    optParser.add_option('--cubemaps', dest = 'cubemaps', type = 'int', default = 4, help = 'number of distinct cubemaps')
+    optParser.add_option('--face-size', dest = 'faceSize', type = 'int', default = 256, help = 'size of the cubemaps faces in pixels')
+    optParser.add_option('--maps', dest = 'maps', type = 'int', default = 8, help = 'number of distinct hotspots maps')
+    optParser.add_option('--map-size', dest = 'mapSize', type = 'int', default = 512, help = 'size of the images of the hotspots maps in pixels')
+    optParser.add_option('--ratio-2d', dest = 'ratio2D', type = 'float', default = 0.2, help = 'fraction of the nodes that are 2D')
+    optParser.add_option('--seed', dest = 'seed', type = 'int', default = 0, help = 'seed of the random generator')
+    optParser.add_option('-a', '--audio', dest = 'audio', help = 'audio file for the sounds')
+    optParser.add_option('-c', '--common', dest = 'common', default = DEFAULT_COMMON_DIR, help = 'directory of the fonts, pointers and cubemap model, defaults to examples/data/common')
+    optParser.add_option('-m', '--multifile', dest = 'multifile', action = 'store_true', default = False, help = 'also write the multifile variant of the game')
+    options, args = optParser.parse_args(argv)
+    if len(args) != 1:
+        optParser.error('an output directory is required')
+    if options.nodes < 1 or options.cubemaps < 1 or options.bundles < 1:
+        optParser.error('at least one node, cubemap and message bundle are required')
+    if options.hotspots < 1 or options.hotspots > 4096:
+        optParser.error('the number of hotspots per node must be in the range 1..4096')
+    if options.mapSize < 8 * int(math.ceil(math.sqrt(options.hotspots))):
+        optParser.error('the hotspots maps are too small for %d hotspots' % options.hotspots)
+    if options.audio is not None and not os.path.isfile(options.audio):
+        optParser.error('the audio file %s does not exist' % options.audio)
+    if options.common is not None and not os.path.isdir(options.common):
+        optParser.error('the directory %s does not exist' % options.common)
+        
+    logging.basicConfig(level = logging.WARNING, format = '%(levelname)s %(message)s')
+    
+    directory = args[0]
+    game = SyntheticGame(numNodes = options.nodes, hotspotsPerNode = options.hotspots, numItems = options.items, 
+                         numSounds = options.sounds, numKeys = options.keys, 
+                         languages = [l.strip() for l in options.languages.split(',') if l.strip()],
+                         numBundles = options.bundles, numCubemaps = options.cubemaps, faceSize = options.faceSize, 
+                         numMaps = options.maps, mapSize = options.mapSize, ratio2D = options.ratio2D, seed = options.seed)
+    counts = game.write(directory, options.common, options.audio)
+    if options.multifile:
+        game.writeMultifile(directory, options.common)
+        
+    print 'Generated %s' % ', '.join(['%d %s' % (counts[k], k) for k in sorted(counts.keys())])
+    print 'Messages per bundle: %d labels, %d in each other bundle' % (max(len(game.labels), options.keys), options.keys)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Timing, reporting and baseline comparison for the benchmarks of pano.bench.cases.
+
+Every benchmark produces a number of samples in milliseconds, or microseconds for the very fast operations
+such as lookups, which are reduced to a few statistics. The results of a run are written as JSON and can be
+compared against the results of an earlier run, the baseline, in order to detect regressions.
+'''
+
+import os
+import json
+import time
+import timeit
+import logging
+import platform
+
+
+# the version of the format of the JSON reports
+REPORT_VERSION = 1
+
+UNIT_MILLIS = 'ms'
+UNIT_MICROS = 'us'
+# counts, e.g. of geoms, have no unit and the blanks keep the columns of the results aligned
+UNIT_COUNT = '  '
+
+
+def setupHeadless(windowType = 'offscreen'):
+    '''
+    Configures Panda for running without a visible window and creates the ShowBase instance, this must be called 
+    before anything that needs the builtins of ShowBase (i.e. loader, render, base) is used. 
+    With window-type none ShowBase doesn't create a camera, so one is attached to render in order to be
+    able to cast rays from it.
+    @param windowType: Either 'offscreen' or 'none'. 
+    '''
+    from pandac.PandaModules import loadPrcFileData
+    loadPrcFileData('pano-bench', '\n'.join([
+                                             'window-type %s' % windowType,
+                                             'audio-library-name null',
+                                             'sync-video #f',
+                                             'show-frame-rate-meter #f',
+                                             'want-pstats #f',
+                                             'model-cache-dir',
+                                             'notify-level warning',
+                                             'default-directnotify-level warning'
+                                             ]))
+    import direct.directbase.DirectStart
+    
+    if base.cam is None:
+        from pandac.PandaModules import Camera
+        base.camera = render.attachNewNode('camera')
+        base.cam = base.camera.attachNewNode(Camera('cam'))
+        
+
+class Benchmarks(object):
+    '''
+    Runs benchmarks and collects their results.
+    '''
+    def __init__(self, repeat = 5, warmup = 1, filters = None):
+        '''
+        @param repeat: The default number of samples of each benchmark.
+        @param warmup: The number of untimed runs before the samples are taken.
+        @param filters: A list of substrings, when given only the benchmarks whose name contains one of them are run.
+        '''
+        self.log = logging.getLogger('pano.bench')
+        self.repeat = repeat
+        self.warmup = warmup
+        self.filters = filters
+        
+        # the statistics of each benchmark by name
+        self.results = {}
+        
+        # the reason for skipping each skipped benchmark by name
+        self.skipped = {}
+        
+        
+    def isSelected(self, name):
+        '''
+        @return: True if the benchmark with the given name should run according to the filters.
+        '''
+        if not self.filters:
+            return True
+        for f in self.filters:
+            if f in name:
+                return True
+        return False
+    
+    
+    def measure(self, name, func, setup = None, repeat = None, number = 1, operations = 1, unit = UNIT_MILLIS):
+        '''
+        Times a function and stores the statistics of its samples under the given name.
+        @param name: The name of the benchmark, names are dot separated, e.g. node.load.Shapes
+        @param func: The function to time, it is called without arguments.
+        @param setup: An optional function that is called untimed before every sample, e.g. to clear caches.
+        @param repeat: The number of samples, if None then the default of this instance is used.
+        @param number: The number of calls of func in each sample, the sample is their average time. 
+        @param operations: The number of operations that func performs in each call, e.g. the number of lookups, 
+        in which case the samples are the average time of a single operation.
+        @param unit: Either UNIT_MILLIS or UNIT_MICROS.
+        @return: The statistics of the benchmark or None if it isn't selected or if it failed.
+        '''
+        if not self.isSelected(name):
+            return None
+        
+        repeat = repeat if repeat is not None else self.repeat
+        scale = 1000.0 if unit == UNIT_MILLIS else 1000000.0
+        samples = []
+        try:
+            for i in xrange(self.warmup + repeat):
+                if setup is not None:
+                    setup()
+                    
+                t = timeit.default_timer()
+                for j in xrange(number):
+                    func()
+                t = timeit.default_timer() - t
+                
+                if i >= self.warmup:
+                    samples.append(t * scale / (number * operations))
+        except Exception, e:
+            self.log.exception('Benchmark %s failed' % name)
+            self.skip(name, 'failed: %s' % str(e))
+            return None
+                    
+        return self.addSamples(name, samples, unit)
+    
+    
+    def addSamples(self, name, samples, unit = UNIT_MILLIS):
+        '''
+        Stores the statistics of samples that were timed by the caller.
+        @return: The statistics.
+        '''
+        stats = computeStats(samples)
+        stats['unit'] = unit
+        self.results[name] = stats
+        self.log.info('%s: median %.3f%s' % (name, stats['median'], unit))
+        return stats
+    
+    
+    def skip(self, name, reason):
+        '''
+        Records that a benchmark didn't run.
+        '''
+        if self.isSelected(name):
+            self.skipped[name] = reason
+            self.log.warning('Skipped %s, %s' % (name, reason))
+        
+        
+    def getReport(self, **info):
+        '''
+        @param info: Additional values for the report's info dictionary, e.g. the data directory.
+        @return: A dictionary with the results of this run and information about the environment, 
+        which is suitable for writeReport.
+        '''
+        details = {
+                   'created'  : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'platform' : platform.platform(),
+                   'python'   : platform.python_version(),
+                   'repeat'   : self.repeat
+                   }
+        details.update(info)
+        return {
+                'version' : REPORT_VERSION,
+                'info'    : details,
+                'results' : self.results,
+                'skipped' : self.skipped
+                }
+        
+        
+def computeStats(samples):
+    '''
+    @param samples: A list of timings.
+    @return: A dictionary with the number of samples, their minimum, median, mean, 95th percentile and maximum.
+    '''
+    s = sorted(samples)
+    n = len(s)
+    if n == 0:
+        return {'samples' : 0, 'min' : 0.0, 'median' : 0.0, 'mean' : 0.0, 'p95' : 0.0, 'max' : 0.0}
+    
+    if n % 2:
+        median = s[n / 2]
+    else:
+        median = (s[n / 2 - 1] + s[n / 2]) / 2.0
+    return {
+            'samples' : n,
+            'min'     : s[0],
+            'median'  : median,
+            'mean'    : sum(s) / float(n),
+            'p95'     : s[int(round(0.95 * (n - 1)))],
+            'max'     : s[-1]
+            }
+    
+    
+def writeReport(report, filename):
+    '''
+    Writes a report to a JSON file.
+    '''
+    dirName = os.path.dirname(filename)
+    if dirName and not os.path.exists(dirName):
+        os.makedirs(dirName)
+        
+    fp = open(filename, 'w')
+    try:
+        fp.write(json.dumps(report, indent = 4, sort_keys = True))
+    finally:
+        fp.close()
+        
+        
+def readReport(filename):
+    '''
+    Reads a report that was written by writeReport.
+    @return: The report's dictionary.
+    '''
+    fp = open(filename, 'r')
+    try:
+        report = json.loads(fp.read())
+    finally:
+        fp.close()
+        
+    if report.get('version') != REPORT_VERSION:
+        raise ValueError('unsupported version of benchmarks report: %s' % str(report.get('version')))
+    return report
+    
+
+def compareReports(report, baseline, threshold = 0.15):
+    '''
+    Compares the medians of the benchmarks of a report against those of a baseline report.
+    @param threshold: The relative change of a median above which a benchmark is considered to have 
+    regressed or improved, e.g. 0.15 for 15%.
+    @return: A list of (name, baseline median, median, relative change, status) tuples sorted by name, status is 
+    one of 'regression', 'improvement', 'ok', 'new' or 'missing'. The medians and relative change are None if 
+    they aren't available.
+    '''
+    results = report['results']
+    baseResults = baseline['results']
+    rows = []
+    for name in sorted(set(results.keys()) | set(baseResults.keys())):
+        stats = results.get(name)
+        baseStats = baseResults.get(name)
+        if baseStats is None:
+            rows.append((name, None, stats['median'], None, 'new'))
+        elif stats is None:
+            rows.append((name, baseStats['median'], None, None, 'missing'))
+        elif stats.get('unit') != baseStats.get('unit'):
+            # the benchmark changed its unit, it can't be compared
+            rows.append((name, None, stats['median'], None, 'new'))
+        else:
+            base, value = baseStats['median'], stats['median']
+            change = (value - base) / base if base > 0.0 else 0.0
+            if change > threshold:
+                status = 'regression'
+            elif change < -threshold:
+                status = 'improvement'
+            else:
+                status = 'ok'
+            rows.append((name, base, value, change, status))
+    return rows
+
+
+def formatResults(report):
+    '''
+    @return: A list of lines that display the results and skipped benchmarks of a report as a table.
+    '''
+    lines = ['%-48s %12s %12s %12s %12s' % ('benchmark', 'min', 'median', 'p95', 'max')]
+    for name in sorted(report['results'].keys()):
+        stats = report['results'][name]
+        unit = stats['unit']
+        lines.append('%-48s %10.3f%s %10.3f%s %10.3f%s %10.3f%s' % (name, stats['min'], unit, stats['median'], unit,
+                                                                      stats['p95'], unit, stats['max'], unit))
+    for name in sorted(report['skipped'].keys()):
+        lines.append('%-48s skipped, %s' % (name, report['skipped'][name]))
+    return lines
+
+
+def formatComparison(rows):
+    '''
+    @param rows: The rows returned by compareReports.
+    @return: A list of lines that display the comparison as a table.
+    '''
+    lines = ['%-48s %12s %12s %8s  %s' % ('benchmark', 'baseline', 'median', 'change', 'status')]
+    for name, base, value, change, status in rows:
+        lines.append('%-48s %12s %12s %8s  %s' % (name, 
+                                                  '%.3f' % base if base is not None else '-', 
+                                                  '%.3f' % value if value is not None else '-', 
+                                                  '%+.1f%%' % (100.0 * change) if change is not None else '-',
+                                                  status))
+    return lines
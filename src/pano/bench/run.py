@@ -0,0 +1,134 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Runs the benchmarks of the engine headlessly and compares the results against a baseline.
+
+Usage: python -m pano.bench.run [options]
+
+The benchmarks run against the example data under examples/data unless another directory is given with
+the -d option. The results are printed as a table and written as JSON with the -o option. When a baseline
+is given with -b, the median of every benchmark is compared against the baseline's and the exit code is 1 if 
+any benchmark became slower by more than the threshold. Use --save-baseline to store the results of a run as 
+the baseline of later runs.
+
+For profiling at larger scales, generate a game with pano.bench.generate and pass its data directory with -d 
+and its multifile, if any, with -m.
+'''
+
+import os
+import sys
+import shutil
+import logging
+import tempfile
+from optparse import OptionParser
+
+from pano.bench import harness
+
+
+# the example data, relative to the directory of this module
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir, 'examples', 'data')
+
+
+def runBenchmarks(dataDir, repeat = 5, filters = None, windowType = 'offscreen', multifile = None):
+    '''
+    Runs all benchmarks of pano.bench.cases.
+    @param dataDir: The directory of the game data.
+    @param repeat: The number of samples of each benchmark.
+    @param filters: A list of substrings of the names of the benchmarks to run, if None then all run.
+    @param windowType: The value of Panda's window-type variable, either 'offscreen' or 'none'.
+    @param multifile: The multifile for the index benchmarks, if None then the one of the examples is used.
+    @return: The report of the run, see harness.Benchmarks.getReport.
+    '''
+    harness.setupHeadless(windowType)
+    
+    # the benchmarks import modules that expect the builtins of ShowBase
+    from pano.bench import cases
+    
+    bench = harness.Benchmarks(repeat = repeat, filters = filters)
+    workDir = tempfile.mkdtemp(prefix = 'pano-bench-')
+    env = cases.BenchEnvironment(dataDir, workDir, multifile)
+    try:
+        env.setup()
+        for group, func in cases.BENCHMARKS:
+            try:
+                func(bench, env)
+            except Exception, e:
+                logging.getLogger('pano.bench').exception('Benchmarks %s failed' % group)
+                bench.skip(group, 'failed: %s' % str(e))
+    finally:
+        env.dispose()
+        shutil.rmtree(workDir, True)
+        
+    return bench.getReport(dataDir = dataDir, windowType = windowType, multifile = env.multifile)
+    
+
+def main(argv = None):
+    optParser = OptionParser(usage = 'usage: %prog [options]')
+    optParser.add_option('-d', '--data', dest = 'dataDir', default = DEFAULT_DATA_DIR, help = 'directory of the game data, defaults to examples/data')
+    optParser.add_option('-m', '--multifile', dest = 'multifile', help = 'multifile for the index benchmarks, defaults to the one of the examples')
+    optParser.add_option('-r', '--repeat', dest = 'repeat', type = 'int', default = 5, help = 'number of samples of each benchmark')
+    optParser.add_option('-f', '--filter', dest = 'filters', action = 'append', help = 'run only the benchmarks whose name contains the given text, can be repeated')
+    optParser.add_option('-o', '--output', dest = 'output', help = 'write the results to the given JSON file')
+    optParser.add_option('-b', '--baseline', dest = 'baseline', help = 'compare the results against the given JSON file')
+    optParser.add_option('-s', '--save-baseline', dest = 'saveBaseline', action = 'store_true', default = False, help = 'write the results to the baseline file instead of comparing against it')
+    optParser.add_option('-t', '--threshold', dest = 'threshold', type = 'float', default = 0.15, help = 'relative slowdown of a median that counts as a regression, defaults to 0.15')
+    optParser.add_option('-w', '--window-type', dest = 'windowType', default = 'offscreen', choices = ['offscreen', 'none'], help = 'offscreen or none')
+    options, args = optParser.parse_args(argv)
+    if args:
+        optParser.error('unexpected arguments: %s' % ' '.join(args))
+    if not os.path.isdir(options.dataDir):
+        optParser.error('the data directory %s does not exist' % options.dataDir)
+    if options.multifile is not None and not os.path.isfile(options.multifile):
+        optParser.error('the multifile %s does not exist' % options.multifile)
+    if options.saveBaseline and options.baseline is None:
+        optParser.error('--save-baseline requires a baseline file')
+    if options.repeat < 1:
+        optParser.error('the number of samples must be positive')
+        
+    logging.basicConfig(level = logging.WARNING, format = '%(levelname)s %(message)s')
+    
+    report = runBenchmarks(os.path.normpath(options.dataDir), options.repeat, options.filters, options.windowType, options.multifile)
+    print '\n'.join(harness.formatResults(report))
+    
+    if options.output is not None:
+        harness.writeReport(report, options.output)
+        
+    if options.baseline is None:
+        return 0
+    
+    if options.saveBaseline or not os.path.exists(options.baseline):
+        harness.writeReport(report, options.baseline)
+        print 'Saved the baseline to %s' % options.baseline
+        return 0
+    
+    rows = harness.compareReports(report, harness.readReport(options.baseline), options.threshold)
+    print
+    print '\n'.join(harness.formatComparison(rows))
+    regressions = [r for r in rows if r[4] == 'regression']
+    if regressions:
+        print '%d benchmarks regressed by more than %d%%' % (len(regressions), int(round(100 * options.threshold)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
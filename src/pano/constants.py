@@ -71,6 +71,13 @@ class PanoConstants:
     ###################################################
     
     
+    ###################################################
+    # resources related events
+    ###################################################
+    EVENT_RESOURCES_CHANGED = "resources.changed"     # args[0]: list of (resType, filename) tuples
+    ###################################################
+    
+    
     ###################################################
     # hotspots related events
     ###################################################
@@ -84,6 +91,12 @@ class PanoConstants:
     TASK_GAME_LOOP = 'game_loop_task'
     TASK_MOUSE_POINTER = 'mouse_pointer_task'
     TASK_MUSIC = 'music_task'
+    TASK_PREFETCH = 'prefetch_task'
+    TASK_HOTSWAP = 'hotswap_task'
+    TASK_CUBEMAP_STREAMING = 'cubemap_streaming_task'
+    
+    # task chain whose threads load the textures of hidden cubemap faces
+    TASK_CHAIN_STREAMING = 'streaming_chain'
     
     # config variables in boot configuration
     CVAR_GAME_DIR = 'game_dir'
@@ -101,6 +114,9 @@ class PanoConstants:
     CVAR_DEBUG_HOTSPOTS = 'debug_show_hotspots'
     CVAR_DEBUG_FPS = 'debug_show_fps'
     CVAR_DEBUG_CONSOLE = 'debug_enable_console'
+    CVAR_DEBUG_PROFILER = 'debug_profiler'
+    CVAR_DEBUG_PROFILER_OVERLAY = 'debug_profiler_overlay'
+    CVAR_DEBUG_PROFILER_BUDGET = 'debug_profiler_budget'
     
     CVAR_RESOURCES_ALL = 'resources_all'
     CVAR_RESOURCES_NODES = 'resources_nodes'
@@ -124,6 +140,14 @@ class PanoConstants:
     CVAR_RESOURCES_HMAPS = "resources_hmaps"
     CVAR_RESOURCES_IMAGES = "resources_images"
     
+    # the directory where parsed resources are stored in compiled form, see pano.resources.CompiledResourcesCache
+    CVAR_RESOURCES_COMPILED_CACHE = 'resources_compiled_cache'
+    DEFAULT_COMPILED_CACHE_DIR = '.cache/compiled'
+    
+    # the directory where textures are stored in baked form, see pano.resources.BakedTexturesCache
+    CVAR_RESOURCES_BAKED_TEXTURES = 'resources_baked_textures'
+    DEFAULT_BAKED_TEXTURES_DIR = '.cache/baked'
+    
     # cvars related to preloading
     CVAR_PRELOAD_POINTERS = 'preloads_pointers'
     CVAR_PRELOAD_NODES = 'preloads_nodes'
@@ -147,6 +171,35 @@ class PanoConstants:
     CVAR_PRELOAD_SHADERS = 'preloads_shaders'
     CVAR_PRELOAD_HMAPS = 'preload_hmaps'
     CVAR_PRELOAD_IMAGES = 'preload_images'
+    
+    # cvars related to the prefetching of neighbouring nodes
+    CVAR_PREFETCH_ENABLED = 'prefetch_enabled'
+    CVAR_PREFETCH_THREADS = 'prefetch_threads'
+    CVAR_PREFETCH_BUDGET = 'prefetch_budget'
+    
+    # cvars related to the hot-swapping of modified resources
+    CVAR_HOTSWAP_ENABLED = 'hotswap_enabled'
+    CVAR_HOTSWAP_THREADED = 'hotswap_threaded'
+    
+    # cvars related to the streaming of cubemap textures
+    CVAR_CUBEMAP_STREAMING = 'cubemap_streaming'
+    CVAR_CUBEMAP_STREAMING_BUDGET = 'cubemap_streaming_budget'
+    CVAR_CUBEMAP_TILES_BUDGET = 'cubemap_tiles_budget'
+    CVAR_CUBEMAP_ATLAS = 'cubemap_atlas'
+    
+    # if true then static sprites are merged into as few geoms as possible, see pano.view.sprites.SpriteBatch
+    CVAR_SPRITES_BATCHING = 'sprites_batching'
+    
+    # if true then the images of sprites and inventory icons are packed in the pages of a pano.view.SpriteAtlas.SpriteAtlas
+    CVAR_SPRITES_ATLAS = 'sprites_atlas'
+    CVAR_SPRITES_ATLAS_PAGE_SIZE = 'sprites_atlas_page_size'
+    CVAR_SPRITES_ATLAS_MAX_PAGES = 'sprites_atlas_max_pages'
+    
+    # the maximum number of removed sprites that are kept for reuse, see pano.view.sprites.SpritePool 
+    CVAR_SPRITES_POOL_CAPACITY = 'sprites_pool_capacity'
+    
+    # the maximum number of sprite videos that are decoded concurrently, see pano.view.VideoDecodePool
+    CVAR_SPRITES_MAX_VIDEO_DECODERS = 'sprites_max_video_decoders'
 
     # names of vars related to the credits state
     CVAR_CREDITS_BACKGROUND   = 'credits_background'
@@ -253,6 +306,12 @@ class PanoConstants:
     RES_TYPE_IMAGES = 20
     RES_TYPE_ALL = 100
     
+    # caching policies of the resource loader
+    CACHE_POLICY_NONE = 0      # resources are not cached
+    CACHE_POLICY_STRONG = 1    # resources are cached until evicted
+    CACHE_POLICY_WEAK = 2      # the data of the resources are weakly referenced by the cache
+    CACHE_POLICY_TTL = 3       # resources are cached but expire after a given time
+    
     #Constants for the predefined mouse pointers
     SELECT_POINTER = "select"
     TALK_POINTER = "talk"
@@ -279,6 +338,23 @@ class PanoConstants:
     STATE_CONSOLE   = 'consoleState'
     STATE_CREDITS   = 'creditsState'
     
+    # names of the timers of the profiler, see pano.util.Profiler
+    PROFILE_FRAME           = 'frame'
+    PROFILE_GAME_LOOP       = 'gameLoop'
+    PROFILE_SAVE_LOAD       = 'saveLoad'
+    PROFILE_INPUT           = 'input'
+    PROFILE_FSM             = 'fsm'
+    PROFILE_VIEW            = 'view'
+    PROFILE_VIEW_CAMERA     = 'view.camera'
+    PROFILE_VIEW_RENDERER   = 'view.renderer'
+    PROFILE_VIEW_INVENTORY  = 'view.inventory'
+    PROFILE_VIEW_SPRITES    = 'view.sprites'
+    PROFILE_VIEW_POSTPROCESS = 'view.postProcess'
+    PROFILE_SOUNDS          = 'sounds'
+    
+    # the loads of each resource type are timed under this prefix followed by the type
+    PROFILE_LOAD_PREFIX     = 'load.'
+    
     # default path to configuration file
     CONFIG_FILE = "Config.prc"
     
@@ -67,7 +67,8 @@ class ExploreState(FSMState):
                 PanoConstants.EVENT_GAME_RESUMED, 
                 PanoConstants.EVENT_GAME_PAUSED,
                 PanoConstants.EVENT_CHANGE_NODE,
-                PanoConstants.EVENT_RESTORE_NODE
+                PanoConstants.EVENT_RESTORE_NODE,
+                PanoConstants.EVENT_RESOURCES_CHANGED
                 )
     
     def onHotspotAction(self):
@@ -185,6 +186,27 @@ class ExploreState(FSMState):
             node = args[0]
             self.log.debug('Got message to go to node %s' % node)
             self.changeDisplayNode(node, 1.0)                    
+        elif msg == PanoConstants.EVENT_RESOURCES_CHANGED:
+            self.onResourcesChanged(args[0])
+            
+    def onResourcesChanged(self, changed):
+        '''
+        Reloads the active node if its definition or its script have been modified. Modified textures
+        don't need any handling because they get reloaded in place by the ResourceLoader.
+        @param changed: A list of (resType, filename) tuples for the resources that have changed.
+        '''
+        if self.activeNode is None:
+            return
+        
+        nodeFiles = [self.activeNode.name + '.node']
+        if self.activeNode.scriptName is not None:
+            nodeFiles.append(self.activeNode.scriptName + '.py')
+            
+        for resType, filename in changed:
+            if filename in nodeFiles:
+                self.log.info('Reloading node %s because %s has changed' % (self.activeNode.name, filename))
+                self.changeDisplayNode(self.activeNode.name, 0.0, forceReload = True)
+                break
             
     def onInputAction(self, action):
         if self.inTransition:
@@ -230,13 +252,14 @@ class ExploreState(FSMState):
         nodescriptCtx = ctx.getVar('nodescript')
         self.nodeScript.restoreState(persistence, persistence.deserializeContext(nodescriptCtx))        
     
-    def changeDisplayNode(self, newNodeName, fadeDuration = 1.0):
+    def changeDisplayNode(self, newNodeName, fadeDuration = 1.0, forceReload = False):
         '''
         Displays the specified node and fades in & out the screen in fadeDuration seconds.        
+        If forceReload is True then the node will be loaded again even if it is the active node.
         '''
 
         # dispose old node and load new
-        self._loadNode(newNodeName)
+        self._loadNode(newNodeName, forceReload)
         
         if self.activeNode is None:
             return
@@ -346,6 +369,9 @@ class ExploreState(FSMState):
 
         self._playMusic()
         
+        # start loading the nodes that can be visited next
+        self.game.getPrefetcher().prefetchNeighbours(self.activeNode)
+        
             
     def _playMusic(self):
         playlist = self.activeNode.musicPlaylist
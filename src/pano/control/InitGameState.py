@@ -153,6 +153,12 @@ class InitGameState(FSMState):
         self.logPlatformInformation() 
         
         game.getResources().initialize()                                
+        compiledDir = game.getConfig().get(PanoConstants.CVAR_RESOURCES_COMPILED_CACHE)
+        if compiledDir:
+            game.getResources().enableCompiledCache(compiledDir)
+        bakedDir = game.getConfig().get(PanoConstants.CVAR_RESOURCES_BAKED_TEXTURES)
+        if bakedDir:
+            game.getResources().enableBakedTextures(bakedDir)
         self.setupResourcesLocations()
         
         winProps = { 
@@ -167,6 +173,9 @@ class InitGameState(FSMState):
         if game.getConfig().getBool(PanoConstants.CVAR_DEBUG_CONSOLE):
             game.enableDebugConsole()
             
+        if game.getConfig().getBool(PanoConstants.CVAR_DEBUG_PROFILER, False):
+            game.getProfiler().enable()
+            
         
         game.getInput().setGlobalMappings('global')                            
         game.getView().initialize()
@@ -174,6 +183,8 @@ class InitGameState(FSMState):
         game.getMusic().initialize()
         
         self._setupPreloads()
+        game.getPrefetcher().initialize()
+        game.getResourcesWatcher().initialize()
 #   
     def exit(self):
         FSMState.exit(self)            
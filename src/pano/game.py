@@ -42,6 +42,8 @@ from cvars import ConfigVars
 from errors.PanoExceptions import *  
 from input import InputActionMappings
 from resources.ResourceLoader import ResourceLoader
+from resources.NodePrefetcher import NodePrefetcher
+from resources.ResourcesWatcher import ResourcesWatcher
 from view.GameView import GameView
 from control.InitGameState import InitGameState
 from control.ExploreState import ExploreState
@@ -58,6 +60,7 @@ from audio.sounds import SoundsPlayer
 from messaging import Messenger
 from model.inventory import Inventory
 from persistence import *
+from util.Profiler import FrameProfiler
 
 
 class PanoGame(object):
@@ -76,7 +79,14 @@ class PanoGame(object):
         
         self.windowProperties = {}
             
+        self.profiler = FrameProfiler()
+        
         self.resources = ResourceLoader()
+        self.resources.setProfiler(self.profiler)
+        
+        self.prefetcher = NodePrefetcher(self)
+        
+        self.resourcesWatcher = ResourcesWatcher(self)
         
         self.inventory = Inventory(self)
         
@@ -165,38 +175,50 @@ class PanoGame(object):
         """                    
         
         if self.quitRequested:
+            self.prefetcher.dispose()
+            self.resourcesWatcher.dispose()
+            self.gameView.dispose()
             return sys.exit()
                         
         millis = globalClock.getDt() * 1000.0
         
-        self._doSaveLoad()
-        
-        # process input events
-        events = self.inputMappings.getEvents()
-        if len(events) > 0:
-            for ev, act in events:
-                try:    
-                    processed = self.fsm.onInputAction(act)             
-                    if not(processed):
-                        if self.gameActions.isAction(act):   
-                            self.gameActions.execute(act)
-                        else:
-                            self.log.warning("Ignored unknown input action %s" % act)                    
-                                        
-                except:
-                    self.log.exception("Unexpected error while processing input action %s" % act)        
-        
-        if self.paused:
-            millis = 0
+        prof = self.profiler
+        prof.addSample(PanoConstants.PROFILE_FRAME, millis)
+        with prof.scope(PanoConstants.PROFILE_GAME_LOOP):
         
-        # update state
-        self.fsm.update(millis)       
-        
-        # update view
-        self.gameView.update(millis)
-        
-        # update sounds
-        self.soundsFx.update(millis)     
+            with prof.scope(PanoConstants.PROFILE_SAVE_LOAD):
+                self._doSaveLoad()
+            
+            # process input events
+            with prof.scope(PanoConstants.PROFILE_INPUT):
+                events = self.inputMappings.getEvents()
+                if len(events) > 0:
+                    for ev, act in events:
+                        try:    
+                            processed = self.fsm.onInputAction(act)             
+                            if not(processed):
+                                if self.gameActions.isAction(act):   
+                                    self.gameActions.execute(act)
+                                else:
+                                    self.log.warning("Ignored unknown input action %s" % act)                    
+                                                
+                        except:
+                            self.log.exception("Unexpected error while processing input action %s" % act)        
+            
+            if self.paused:
+                millis = 0
+            
+            # update state
+            with prof.scope(PanoConstants.PROFILE_FSM):
+                self.fsm.update(millis)       
+            
+            # update view
+            with prof.scope(PanoConstants.PROFILE_VIEW):
+                self.gameView.update(millis)
+            
+            # update sounds
+            with prof.scope(PanoConstants.PROFILE_SOUNDS):
+                self.soundsFx.update(millis)     
         
         return Task.cont
     
@@ -227,6 +249,15 @@ class PanoGame(object):
         
     def getResources(self):
         return self.resources
+    
+    def getPrefetcher(self):
+        return self.prefetcher
+    
+    def getProfiler(self):
+        return self.profiler
+    
+    def getResourcesWatcher(self):
+        return self.resourcesWatcher
 
     def getState(self):
         return self.fsm
@@ -287,9 +318,32 @@ class PanoGame(object):
     
     def enableDebugConsole(self):
         if self.console is None:
+            # the console's namespace is made of the locals, so this makes the profile command available as prof()
+            prof = self.profile
             self.console = pandaConsole( self, INPUT_GUI|OUTPUT_PYTHON, locals() )
             self.console.toggle()
             
+    def profile(self, command = 'dump'):
+        '''
+        Implements the prof() command of the debug console.
+        @param command: One of 'dump' to print the statistics of the profiler, 'reset' to discard them, 'on' and 'off' 
+        to enable or disable the profiler and 'overlay' to toggle the display of the statistics on screen. 
+        '''
+        if command == 'dump':
+            if not self.profiler.isEnabled():
+                print 'The profiler is disabled, enable it with prof("on")'
+            print self.profiler.dump()
+        elif command == 'reset':
+            self.profiler.reset()
+        elif command == 'on':
+            self.profiler.enable()
+        elif command == 'off':
+            self.profiler.disable()
+        elif command == 'overlay':
+            self.gameView.getProfilerOverlay().toggle()
+        else:
+            print 'Unknown command %s, use one of dump, reset, on, off or overlay' % command
+            
     def showDebugConsole(self):
         if self.console is not None:
             self.console.toggle()
@@ -22,11 +22,25 @@ THE SOFTWARE.
 '''
 
 import logging
-import math, time, array, pickle
+import sys, math, time, array, pickle, struct, mmap, bisect
 import json
+import StringIO
 
 from pandac.PandaModules import PNMImage, PNMPainter, PNMBrush, PNMImageHeader  
 from pandac.PandaModules import Filename, VBase3, VBase4D
+from pandac.PandaModules import Texture
+
+# textures can opt out of the power of 2 rescaling only since Panda 1.8
+try:
+    from pandac.PandaModules import ATSNone
+except ImportError:
+    ATSNone = None
+
+# numpy is optional, when available it is used for constructing quadtree images much faster
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 def clamp(x, low, high):
     if x < low:
@@ -35,6 +49,50 @@ def clamp(x, low, high):
         x = high
     return x
 
+def _getRGBData(img):
+    '''
+    Copies the RGB components of the given image into a string, with the top row of the image first, 
+    by transferring the whole image at once through a texture. This only works for 8bit RGB(A) images.
+    @param img: A PNMImage instance.
+    @return: A string of 3 bytes per pixel or None if the image couldn't be transferred.
+    '''
+    if img.getMaxval() != 255 or img.isGrayscale():
+        return None
+    
+    w, h = img.getXSize(), img.getYSize()
+    tex = Texture()
+    # otherwise images whose dimensions aren't powers of 2 get rescaled according to textures-power-2
+    if ATSNone is not None:
+        tex.setAutoTextureScale(ATSNone)
+    if not tex.load(img):
+        logging.getLogger('hotspotsMaps').warning('Failed to transfer a %dx%d image through a texture, reading it pixel by pixel' % (w, h))
+        return None
+    
+    ram = tex.getRamImageAs('RGB')
+    data = ram.getData() if hasattr(ram, 'getData') else str(ram)
+    if len(data) != w * h * 3:
+        logging.getLogger('hotspotsMaps').warning('A %dx%d image was resized to %dx%d while transferred through a texture, reading it pixel by pixel' % (w, h, tex.getXSize(), tex.getYSize()))
+        return None
+    
+    # textures store the bottom row first
+    pitch = 3*w
+    return ''.join([data[j*pitch : (j+1)*pitch] for j in xrange(h - 1, -1, -1)])
+
+def colour_metric(c1, c2):
+    '''
+    Provides a metric for the difference between the given colours. 
+    Each parameter should be an iterable of 3 values that represent an RGB triplet.
+    '''
+    # mean level of red
+    r = ( c1[0] + c2[0] ) / 2.0
+    
+    dr = c1[0] - c2[0]
+    dg = c1[1] - c2[1]
+    db = c1[2] - c2[2]
+    
+    metric = math.sqrt( ((512.0 + r)/256.0)*dr*dr + 4.0*dg*dg + ((767 - r)/256.0)*db*db  )
+    return metric
+
 class ImageMap(object):
     '''
     Maps image coordinates to hotspots' names. 
@@ -42,22 +100,79 @@ class ImageMap(object):
     needs to also be specified in order to define the color encoding.
     For example, for the hotspot 'door' the encoding image might have blue over the 
     hotspot's region and the dictionary should have an entry such as: dict['door'] = (0, 0, 255)
-    in order to map the name 'door' to the respective RGB color.    
+    in order to map the name 'door' to the respective RGB color.
+    
+    The image isn't kept after it has been set, instead every pixel is converted to the id of its hotspot
+    and stored in a packed array of labels, using one byte per pixel or two if there are more than 254 hotspots.
+    For very large images, the labels can be downsampled by an integer factor, in which case every label
+    holds the hotspot found at the centre of the respective block of pixels.
     '''
-    def __init__(self, name, imageFile = None, hotspots = None):
+    def __init__(self, name, imageFile = None, hotspots = None, downsample = 1):
         '''
         @param name: A unique name for this resource.
         @param imageFile: The filename of the image that will provide the color encoding.
         @param hotspots: The dictionary that will map hotspots' names to RGB colors.
+        @param downsample: The factor by which the labels are downsampled in both dimensions.
         '''
+        self.log = logging.getLogger('imap')
         self.name = name
         self.imageFile = imageFile
+        self.downsample = downsample
         
-        # this will be initialized the associated ResourceLoader instance
-        self.image = None        
+        self.hotspots = {} if hotspots is None else hotspots
+        
+        # these will be initialized when the associated ResourceLoader instance sets the image
+        self.labels = None
+        self.labelNames = [None]
+        self.labelsWidth = 0
+        self.labelsHeight = 0
+        self.imageWidth = 0
+        self.imageHeight = 0
+        
+        
+    def setImage(self, img):
+        '''
+        Converts the given encoding image into labels, the hotspots must have already been specified.
+        @param img: A PNMImage instance.
+        '''
+        # label 0 means no hotspot
+        self.labelNames = [None]
+        colourLabels = {}
+        for name, colour in self.hotspots.items():
+            key = chr(int(colour[0])) + chr(int(colour[1])) + chr(int(colour[2]))
+            if not colourLabels.has_key(key):
+                colourLabels[key] = len(self.labelNames)
+                self.labelNames.append(name)
+                
+        f = max(1, int(self.downsample))
+        w, h = img.getXSize(), img.getYSize()
+        lw, lh = (w + f - 1) / f, (h + f - 1) / f
+        labels = array.array('B' if len(self.labelNames) <= 255 else 'H')
+        
+        # sample the centre of every block of pixels
+        columns = [min(i*f + f/2, w - 1) for i in xrange(lw)]
+        rows = [min(j*f + f/2, h - 1) for j in xrange(lh)]
+        
+        data = _getRGBData(img)
+        if data is not None:
+            offsets = [3*i for i in columns]
+            for j in rows:
+                rowOffset = 3*w*j
+                for o in offsets:
+                    o += rowOffset
+                    labels.append(colourLabels.get(data[o : o + 3], 0))
+        else:
+            self.log.debug('labelling image pixel by pixel')
+            for j in rows:
+                for i in columns:
+                    el = img.getXel(i, j)
+                    key = chr(int(round(255.0*el[0]))) + chr(int(round(255.0*el[1]))) + chr(int(round(255.0*el[2])))
+                    labels.append(colourLabels.get(key, 0))
+                    
+        self.labels = labels
+        self.labelsWidth, self.labelsHeight = lw, lh
+        self.imageWidth, self.imageHeight = w, h
         
-        self.hotspots = {} if hotspots is None else hotspots        
-            
         
     def getHotspot(self, x, y):
         '''
@@ -67,15 +182,11 @@ class ImageMap(object):
         @param y: the relative y coordinate, lies in 0..1
         @return: the name of the found hotspot or None
         '''
-        if self.image is not None:                        
-            x = clamp(x*self.image.getXSize(), 0, self.image.getXSize())
-            y = clamp(y*self.image.getYSize(), 0, self.image.getYSize())            
-            col = self.image.getXel(x, y)
-            col *= 255
-                        
-            for k, v in self.hotspots.items():
-                if v[0] == col[0] and v[1] == col[1] and v[2] == col[2]:
-                    return k
+        if self.labels is not None:
+            f = max(1, int(self.downsample))
+            i = clamp(int(x*self.imageWidth) / f, 0, self.labelsWidth - 1)
+            j = clamp(int(y*self.imageHeight) / f, 0, self.labelsHeight - 1)
+            return self.labelNames[self.labels[i + j*self.labelsWidth]]
                 
 
     def write(self, file):
@@ -83,7 +194,10 @@ class ImageMap(object):
         Serializes this instance to a file using JSON. 
         JSON was preferred in order to allow editing these files by hand.
         '''        
-        file.write(json.dumps({'name' : self.name, 'imageFile' : self.imageFile, 'hotspots' : self.hotspots}, indent=4))
+        d = {'name' : self.name, 'imageFile' : self.imageFile, 'hotspots' : self.hotspots}
+        if self.downsample != 1:
+            d['downsample'] = self.downsample
+        file.write(json.dumps(d, indent=4))
         
         
     def read(self, file):                
@@ -95,17 +209,152 @@ class ImageMap(object):
         self.imageFile = d['imageFile']      
         self.name = d['name']
         self.hotspots = d['hotspots']
-        
-        print self.hotspots
+        self.downsample = d.get('downsample', 1)
+        self.labels = None
         
 
+class ClickMask(object):
+    '''
+    Defines the interactive area of a hotspot through an image, places where the image is black are not interactive.
+    
+    The image isn't kept, instead it is converted into a bitset with one bit per pixel that is set where the
+    image isn't black. The bits of each row are packed into bytes. Alternatively, the mask can be run length 
+    encoded by storing for each row the columns where the bits change value, the first run of each row 
+    consists of cleared bits. The encoding is chosen when the mask is created, by default the smaller one is used.
+    '''
+    def __init__(self, width, height):
+        '''
+        @param width: The width of the mask in pixels.
+        @param height: The height of the mask in pixels.
+        '''
+        self.width = width
+        self.height = height
+        
+        # the packed bits, ((width + 7) / 8) bytes per row, or None if the mask is run length encoded
+        self.bits = None
+        
+        # the columns where the bits change value, the changes of row j start at runStarts[j] and end before runStarts[j+1] 
+        self.runs = None
+        self.runStarts = None
+        
+        
+    def fromImage(img, compress = None):
+        '''
+        Creates a mask from an image.
+        @param img: A PNMImage instance.
+        @param compress: If True the mask will be run length encoded, if False it will be a plain bitset and if None
+        then the smaller of the two will be used.
+        @return: A ClickMask instance.
+        '''
+        w, h = img.getXSize(), img.getYSize()
+        mask = ClickMask(w, h)
+        
+        rows = []
+        data = _getRGBData(img)
+        if data is not None:
+            black = '\0\0\0'
+            for j in xrange(h):
+                offset = 3*w*j
+                rows.append([data[offset + 3*i : offset + 3*i + 3] != black for i in xrange(w)])
+        else:
+            for j in xrange(h):
+                row = []
+                for i in xrange(w):
+                    col = img.getXel(i, j)
+                    row.append(col[0] != 0.0 or col[1] != 0.0 or col[2] != 0.0)
+                rows.append(row)
+                
+        runs = array.array('H' if w < 0x10000 else 'I')
+        runStarts = array.array('I')
+        for row in rows:
+            runStarts.append(len(runs))
+            value = False
+            for i in xrange(w):
+                if row[i] != value:
+                    runs.append(i)
+                    value = row[i]
+        runStarts.append(len(runs))
+        
+        pitch = (w + 7) / 8
+        if compress is None:
+            compress = runs.itemsize * len(runs) + runStarts.itemsize * len(runStarts) < pitch * h
+            
+        if compress:
+            mask.runs = runs
+            mask.runStarts = runStarts
+        else:
+            bits = array.array('B', [0]) * (pitch * h)
+            for j in xrange(h):
+                row = rows[j]
+                offset = pitch * j
+                for i in xrange(w):
+                    if row[i]:
+                        bits[offset + (i >> 3)] |= 1 << (i & 7)
+            mask.bits = bits
+        return mask
+    
+    
+    def contains(self, x, y):
+        '''
+        @param x: the relative x coordinate, lies in 0..1
+        @param y: the relative y coordinate, lies in 0..1
+        @return: True if the given point lies in the interactive area of the mask and False if otherwise.
+        '''
+        i = clamp(int(x * self.width), 0, self.width - 1)
+        j = clamp(int(y * self.height), 0, self.height - 1)
+        if self.bits is not None:
+            return (self.bits[j * ((self.width + 7) >> 3) + (i >> 3)] >> (i & 7)) & 1 == 1
+        else:
+            # the number of changes up to and including column i gives the value of the bit
+            start = self.runStarts[j]
+            return (bisect.bisect_right(self.runs, i, start, self.runStarts[j + 1]) - start) & 1 == 1
+        
+        
+    def isCompressed(self):
+        return self.bits is None
+    
+    
+    def getSize(self):
+        '''
+        @return: The size of the mask's data in bytes.
+        '''
+        if self.bits is not None:
+            return len(self.bits)
+        return self.runs.itemsize * len(self.runs) + self.runStarts.itemsize * len(self.runStarts)
+    
+    fromImage = staticmethod(fromImage)
+    
+    
 class QuadTreeMap(object):
     '''
     Maps image coordinates to hotspots' names.
     It works in the same way as the ImageMap but uses a quadtree image representation for the encoding
     image. This can most of the time provide significant memory savings as this is a very compact representation.
     The higher the resolution of the encoding image, the higher will be the memory savings.
+    
+    Maps are stored in .qmap files using a binary format that holds the flattened quadtree (see FlatQuadTree),
+    so that it can be read directly into arrays without rebuilding the tree's nodes. All values are little endian:
+    
+        header:   char[4] magic 'QMAP', uint16 format version (2), uint16 reserved (0), 
+                  uint32 tree size (a power of 2), uint32 image width, uint32 image height, uint32 maximum depth, 
+                  float64 metric, float64[3] background colour, 
+                  uint32 number of nodes, uint32 number of palette colours, uint32 number of hotspots
+        strings:  the image filename as a uint16 length followed by that many bytes of UTF-8 text
+        hotspots: for each hotspot its name, encoded as above, followed by its float64[3] colour
+        palette:  float64[3] for each colour of the palette
+        nodes:    int32[4 * nodes] children, uint8[nodes] leaf flags, int32[nodes] palette indices
+        
+    The first version of the format was a pickled QuadTreeMap instance, such files are still read and can be
+    converted with pano.resources.convertqmap.
     '''
+    
+    MAGIC = 'QMAP'
+    FORMAT_VERSION = 2
+    
+    _HEADER = struct.Struct('<4sHHIIIId3dIII')
+    _COLOUR = struct.Struct('<3d')
+    _STRLEN = struct.Struct('<H')
+    
     def __init__(self, name, imageFile = None, metric = 2, maxDepth = 4):
         '''
         @param name: A unique name for this resource.
@@ -122,12 +371,33 @@ class QuadTreeMap(object):
         self.metric = metric
         self.maxDepth = maxDepth
         self.bgCol = (255, 255, 255)        
+        
+        # the flattened version of self.quadTree that is used for lookups, see compile()
+        self.flatTree = None
+        
+        # the name of the hotspot for each colour of self.flatTree.palette, None when it needs to be resolved again
+        self.paletteHotspots = None
             
     def setHotspots(self, hotspotsDict):
         self.hotspots = hotspotsDict
+        self.paletteHotspots = None
     
     def setBgColour(self, r, g, b):
         self.bgCol = (r, g, b)
+        self.paletteHotspots = None
+        
+    def compile(self):
+        '''
+        Flattens the quadtree into arrays and resolves the hotspot of each of its colours, so that lookups
+        don't have to traverse node objects or calculate colour metrics.
+        This happens automatically after reading or constructing the map and on the first lookup after
+        the hotspots or the background colour have changed.
+        Maps read from binary .qmap files have no quadtree, for these only the hotspots are resolved again.
+        '''
+        if self.quadTree is not None:
+            self.flatTree = FlatQuadTree(self.quadTree)
+        if self.flatTree is not None:
+            self.paletteHotspots = [self._getClosestHotspot(c) for c in self.flatTree.palette]
 
     def getHotspot(self, x, y):
         '''
@@ -137,10 +407,12 @@ class QuadTreeMap(object):
         @param y: the relative y coordinate, lies in 0..1. 
         @return: the name of the found hotspot or None
         '''        
-        if self.quadTree is not None:
-            c = self.quadTree.getColourAt(x, y)
-            if c is not None:
-                return self._getClosestHotspot(c)
+        if self.flatTree is None or self.paletteHotspots is None:
+            self.compile()
+        if self.flatTree is not None:
+            idx = self.flatTree.getPaletteIndexAt(x, y)
+            if idx >= 0:
+                return self.paletteHotspots[idx]
     
             
     def _getClosestHotspot(self, color):
@@ -151,12 +423,12 @@ class QuadTreeMap(object):
         min = 1000
         min_k = None
         for k, v in self.hotspots.items():
-            ck = self.quadTree.colour_metric(v, color)
+            ck = colour_metric(v, color)
             if ck < min:
                 min_k = k
                 min = ck
                 
-        bgMetric = self.quadTree.colour_metric(self.bgCol, color) 
+        bgMetric = colour_metric(self.bgCol, color) 
         if bgMetric < min:
             min_k = 'background'
             min = bgMetric
@@ -180,6 +452,8 @@ class QuadTreeMap(object):
         if hotspots is not None:
             self.hotspots = hotspots
             
+        if self.quadTree is None:
+            self.quadTree = QuadTreeImage()
         self.quadTree.fromImage(img, self.metric, self.maxDepth, True)
 
         nodeStack = [self.quadTree.root]
@@ -203,6 +477,8 @@ class QuadTreeMap(object):
                     
         self.log.debug('stripped %i nodes\n' % stripped)
         self.log.debug('remained %i nodes\n' % numNodes)              
+        
+        self.compile()
     
                 
     def drawOnImage(self, img):
@@ -210,6 +486,11 @@ class QuadTreeMap(object):
         Draws the quadtree on the given image.
         @param img: A PNMImage instance.
         '''
+        if self.quadTree is None:
+            if self.flatTree is None:
+                return
+            self.quadTree = self.flatTree.toQuadTreeImage()
+            
         painter = PNMPainter(img)
         painter.setFill(PNMBrush.makeTransparent())        
         self._drawImpl(painter, self.quadTree.root, 0, 0, 1)
@@ -257,25 +538,154 @@ class QuadTreeMap(object):
             
     def write(self, file):
         '''
-        Serializes this instance to a file using Pickle.
-        '''        
-        pickle.dump(self, file, -pickle.HIGHEST_PROTOCOL)
+        Serializes this instance to a file using the binary .qmap format.
+        '''
+        if self.flatTree is None:
+            self.compile()
+        tree = self.flatTree
+        hotspots = self.hotspots.items()
+        
+        file.write(self._HEADER.pack(self.MAGIC, self.FORMAT_VERSION, 0, tree.w, tree.ow, tree.oh, self.maxDepth, 
+                                     self.metric, self.bgCol[0], self.bgCol[1], self.bgCol[2],
+                                     tree.getNumNodes(), len(tree.palette), len(hotspots)))
+        file.write(self._packString(self.imageFile))
+        for name, colour in hotspots:
+            file.write(self._packString(name))
+            file.write(self._COLOUR.pack(colour[0], colour[1], colour[2]))
+            
+        for colour in tree.palette:
+            file.write(self._COLOUR.pack(colour[0], colour[1], colour[2]))
+            
+        for arr in (tree.children, tree.leaves, tree.colours):
+            if sys.byteorder == 'big':
+                arr = array.array(arr.typecode, arr)
+                arr.byteswap()
+            file.write(arr.tostring())
         
         
     def read(self, file):                
         '''
-        Deserializes a pickled instance.
+        Deserializes an instance from a .qmap file. Real files are memory mapped instead of being read.
+        Files of the first version of the format are unpickled.
         '''
-        mask = pickle.load(file)
+        data = None
+        if hasattr(file, 'fileno'):
+            try:
+                data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                data = None
+        
+        try:
+            if data is None:
+                data = file.read()
+                
+            if data[:len(self.MAGIC)] == self.MAGIC:
+                self._readBinary(data)
+            else:
+                self._readPickled(StringIO.StringIO(data[:]))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        
+        self.compile()
+        
+        
+    def _readBinary(self, data):
+        header = self._HEADER
+        if len(data) < header.size:
+            raise ValueError('truncated .qmap file')
+        
+        (magic, version, reserved, w, ow, oh, self.maxDepth, self.metric, bgR, bgG, bgB, 
+         numNodes, numColours, numHotspots) = header.unpack(data[:header.size])
+        if version > self.FORMAT_VERSION:
+            raise ValueError('unsupported .qmap format version %d' % version)
+        self.bgCol = (bgR, bgG, bgB)
+        
+        imageFile, offset = self._unpackString(data, header.size)
+        self.imageFile = imageFile or None
+        
+        self.hotspots = {}
+        for i in xrange(numHotspots):
+            name, offset = self._unpackString(data, offset)
+            self.hotspots[name], offset = self._unpackColour(data, offset)
+        
+        tree = FlatQuadTree()
+        tree.w, tree.ow, tree.oh = w, ow, oh
+        for i in xrange(numColours):
+            colour, offset = self._unpackColour(data, offset)
+            tree.palette.append(colour)
+            
+        offset = self._unpackArray(tree.children, data, offset, 4 * numNodes)
+        offset = self._unpackArray(tree.leaves, data, offset, numNodes)
+        offset = self._unpackArray(tree.colours, data, offset, numNodes)
+        
+        self.quadTree = None
+        self.flatTree = tree
+        
+        
+    def _readPickled(self, file):
+        mask = _LegacyUnpickler(file).load()
         self.quadTree = mask.quadTree
+        self.quadTree.log = logging.getLogger('quadTreeImage')
         self.hotspots = {}
         for k,v in mask.hotspots.items():
             self.hotspots[k] = v
         
         self.maxDepth = mask.maxDepth
-        self.metric   = mask.metric                     
+        self.metric   = mask.metric
+        self.bgCol    = getattr(mask, 'bgCol', self.bgCol)
+        
+        
+    def _packString(self, s):
+        if s is None:
+            s = ''
+        if isinstance(s, unicode):
+            s = s.encode('utf-8')
+        return self._STRLEN.pack(len(s)) + s
+    
+    
+    def _unpackString(self, data, offset):
+        end = offset + self._STRLEN.size
+        if len(data) < end:
+            raise ValueError('truncated .qmap file')
+        n = self._STRLEN.unpack(data[offset : end])[0]
+        if len(data) < end + n:
+            raise ValueError('truncated .qmap file')
+        return data[end : end + n].decode('utf-8'), end + n
+    
+    
+    def _unpackColour(self, data, offset):
+        end = offset + self._COLOUR.size
+        if len(data) < end:
+            raise ValueError('truncated .qmap file')
+        return self._COLOUR.unpack(data[offset : end]), end
+    
+    
+    def _unpackArray(self, arr, data, offset, count):
+        end = offset + arr.itemsize * count
+        if len(data) < end:
+            raise ValueError('truncated .qmap file')
+        arr.fromstring(data[offset : end])
+        if sys.byteorder == 'big':
+            arr.byteswap()
+        return end
         
 
+class _LegacyUnpickler(pickle.Unpickler):
+    '''
+    Unpickles .qmap files of the first version of the format, which held pickled QuadTreeMap instances. 
+    These included the loggers of the map and its quadtree, which can't be unpickled and are replaced by placeholders.
+    '''
+    def find_class(self, module, name):
+        if module == 'logging':
+            return _PickledLogger
+        return pickle.Unpickler.find_class(self, module, name)
+    
+    
+class _PickledLogger(object):
+    pass
+    
+
 class QuadTreeImage(object):
 
     NE = 0
@@ -352,18 +762,13 @@ class QuadTreeImage(object):
         Provides a metric for the difference between the given colours. 
         Each parameter should be an iterable of 3 values that represent an RGB triplet.
         '''
-        # mean level of red
-        r = ( c1[0] + c2[0] ) / 2.0
-        
-        dr = c1[0] - c2[0]
-        dg = c1[1] - c2[1]
-        db = c1[2] - c2[2]
-        
-        metric = math.sqrt( ((512.0 + r)/256.0)*dr*dr + 4.0*dg*dg + ((767 - r)/256.0)*db*db  )
-        return metric
+        return colour_metric(c1, c2)
 
 
     def calculate_area_median_colour(self, buffer,  pitch, x, y, w, h):
+        if isinstance(buffer, _NumpyImageBuffer):
+            return buffer.areaMean(x, y, w, h), False
+        
         mr, mg, mb = 0.0, 0.0, 0.0
         offset = 3*x + y*pitch
         uniform = False
@@ -493,13 +898,16 @@ class QuadTreeImage(object):
             
         self._reset(w, h, max_depth)
         
-        image_array = array.array('f')        
-        for j in xrange(h):
-            for i in xrange(w):
-                el = img.getXel(i, j)
-                image_array.append(255.0*el[0])
-                image_array.append(255.0*el[1])
-                image_array.append(255.0*el[2])                        
+        if numpy is not None:
+            image_array = _NumpyImageBuffer(self._imageToArray(img))
+        else:
+            image_array = array.array('f')        
+            for j in xrange(h):
+                for i in xrange(w):
+                    el = img.getXel(i, j)
+                    image_array.append(255.0*el[0])
+                    image_array.append(255.0*el[1])
+                    image_array.append(255.0*el[2])                        
 
         self.log.debug('subdividing nodes...%s' % time.asctime())                    
         self.subdv(self.root, image_array, 3*w, tolerance, 0, 0, w, h, 0, None)        
@@ -509,7 +917,31 @@ class QuadTreeImage(object):
             img.expandBorder(0, -expand[0], -expand[1], 0, VBase4D(0,0,0,0)) 
                     
                     
+    def _imageToArray(self, img):
+        '''
+        Copies the RGB components of the given image into a numpy array.
+        @param img: A PNMImage instance.
+        @return: A height x width x 3 numpy array of uint8 values, the top row of the image comes first.
+        '''
+        w, h = img.getXSize(), img.getYSize()
+        
+        data = _getRGBData(img)
+        if data is not None:
+            return numpy.frombuffer(data, numpy.uint8).reshape((h, w, 3))
+                
+        self.log.debug('copying image pixel by pixel')
+        rgb = numpy.empty((h, w, 3), numpy.uint8)
+        for j in xrange(h):
+            for i in xrange(w):
+                el = img.getXel(i, j)
+                rgb[j, i] = (int(round(255.0*el[0])), int(round(255.0*el[1])), int(round(255.0*el[2])))
+        return rgb
+        
+                    
     def _getUniqueColours(self, buffer, pitch, x, y, w, h):
+        if isinstance(buffer, _NumpyImageBuffer):
+            return buffer.uniqueColours(x, y, w, h)
+        
         colours = []
         offset = 3*x + y*pitch
         for i in xrange(w):
@@ -531,6 +963,170 @@ class QuadTreeImage(object):
         return colours
     
     
+class FlatQuadTree(object):
+    '''
+    An array based representation of a QuadTreeImage that is used for fast lookups.
+    
+    The nodes are numbered in breadth first order with the root being node 0. For node i, children[4*i + q]
+    holds the number of its child in quadrant q (QuadTreeImage.NE, NW, SE, SW) or -1 if there is no child 
+    and colours[i] holds the index of the node's colour in the palette or -1 if it has no colour.
+    Lookups descend the tree iteratively and return the same results as QuadTreeImage.getColourAt.
+    '''
+    __slots__ = ('w', 'ow', 'oh', 'children', 'leaves', 'colours', 'palette')
+    
+    def __init__(self, quadTree = None):
+        '''
+        @param quadTree: The QuadTreeImage to flatten, if None then an empty tree is created whose arrays
+        will be filled by the caller.
+        '''
+        self.w, self.ow, self.oh = 1, 1, 1
+        self.children = array.array('i')
+        self.leaves = array.array('B')
+        self.colours = array.array('i')
+        self.palette = []
+        
+        if quadTree is None:
+            return
+        
+        self.w = quadTree.w
+        self.ow = quadTree.ow
+        self.oh = quadTree.oh
+        paletteIndices = {}
+        queue = [quadTree.root]
+        next = 1
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            
+            leaf = 1
+            for sub in node.subNodes:
+                if sub is None:
+                    self.children.append(-1)
+                else:
+                    self.children.append(next)
+                    queue.append(sub)
+                    next += 1
+                    leaf = 0
+            self.leaves.append(leaf)
+            
+            idx = -1
+            if node.colour is not None:
+                colour = tuple(node.colour)
+                idx = paletteIndices.get(colour)
+                if idx is None:
+                    idx = len(self.palette)
+                    paletteIndices[colour] = idx
+                    self.palette.append(colour)
+            self.colours.append(idx)
+            
+            
+    def getPaletteIndexAt(self, x, y):
+        '''
+        @param x: the relative x coordinate, lies in 0..1
+        @param y: the relative y coordinate, lies in 0..1
+        @return: The index in self.palette of the colour at the given point or -1 if there is no colour.
+        '''
+        x = int(x*self.ow)
+        y = int(y*self.oh)
+        dim = self.w
+        if x < 0 or y < 0 or x >= dim or y >= dim:
+            return -1
+        
+        children = self.children
+        leaves = self.leaves
+        node = 0
+        nx, ny = 0, 0
+        while not leaves[node]:
+            dim >>= 1
+            if x >= nx + dim:
+                nx += dim
+                if y >= ny + dim:
+                    ny += dim
+                    q = QuadTreeImage.SE
+                else:
+                    q = QuadTreeImage.NE
+            elif y >= ny + dim:
+                ny += dim
+                q = QuadTreeImage.SW
+            else:
+                q = QuadTreeImage.NW
+                
+            node = children[4*node + q]
+            if node < 0:
+                return -1
+        return self.colours[node]
+    
+    
+    def getNumNodes(self):
+        return len(self.leaves)
+    
+    
+    def toQuadTreeImage(self):
+        '''
+        Rebuilds the node based representation of this tree.
+        @return: A QuadTreeImage instance.
+        '''
+        quadTree = QuadTreeImage(self.w, self.w)
+        quadTree.ow, quadTree.oh = self.ow, self.oh
+        
+        nodes = []
+        for idx in self.colours:
+            nodes.append(quadNode(list(self.palette[idx]) if idx >= 0 else None))
+            
+        for i in xrange(len(nodes)):
+            for q in xrange(4):
+                child = self.children[4*i + q]
+                if child >= 0:
+                    nodes[i].subNodes[q] = nodes[child]
+                    
+        if nodes:
+            quadTree.root = nodes[0]
+        return quadTree
+    
+    
+class _NumpyImageBuffer(object):
+    '''
+    Holds an image in numpy arrays for the vectorized construction of quadtree images. It keeps a summed-area table
+    of the RGB components for calculating the mean colour of any region in constant time and the colours packed
+    in 24bit integers for counting the unique colours of a region.
+    '''
+    def __init__(self, rgb):
+        '''
+        @param rgb: A height x width x 3 numpy array of uint8 values, the top row of the image comes first.
+        '''
+        h, w = rgb.shape[:2]
+        self.sat = numpy.zeros((h + 1, w + 1, 3), numpy.float64)
+        self.sat[1:, 1:] = rgb.cumsum(axis = 0, dtype = numpy.float64).cumsum(axis = 1)
+        
+        rgb32 = rgb.astype(numpy.uint32)
+        self.packed = (rgb32[:, :, 0] << 16) | (rgb32[:, :, 1] << 8) | rgb32[:, :, 2]
+        
+        
+    def areaMean(self, x, y, w, h):
+        s = self.sat
+        total = s[y + h, x + w] - s[y, x + w] - s[y + h, x] + s[y, x]
+        inv_n = 1.0 / (w * h)
+        
+        # return plain floats, the colours end up in pickled quadtrees which shouldn't depend on numpy
+        return (float(total[0]) * inv_n, float(total[1]) * inv_n, float(total[2]) * inv_n)
+    
+    
+    def uniqueColours(self, x, y, w, h):
+        '''
+        @return: A list of [r, g, b, count] lists, one for each colour found in the given region.
+        '''
+        values = numpy.sort(self.packed[y : y + h, x : x + w], axis = None)
+        starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(values)) + 1))
+        counts = numpy.diff(numpy.concatenate((starts, [len(values)])))
+        
+        colours = []
+        for i in xrange(len(starts)):
+            v = int(values[starts[i]])
+            colours.append([float(v >> 16), float((v >> 8) & 0xFF), float(v & 0xFF), float(counts[i])])
+        return colours
+    
+    
 class quadNode(object):
     '''
     A node of a quadtree image for representing hotspots maps.
@@ -52,6 +52,10 @@ class Node:
 
         # used for overriding the file extension of the cubemap's image (default is .png)
         self.extension = None
+        
+        # if not None then each face of the cubemap is a pyramid of tiles with this number of levels,
+        # see pano.view.CubemapTiles for the filenames of the tiles
+        self.tileLevels = None
 
         # the hotspots of this node, in { 'name' : <Hotspots instance> } format
         self.hotspots = hotspots if hotspots is not None else {}
@@ -135,4 +139,13 @@ class Node:
     
     def setExtension(self, extension):
         self.extension = extension
+        
+    def getTileLevels(self):
+        return self.tileLevels
+    
+    def setTileLevels(self, levels):
+        self.tileLevels = levels
+        
+    def isTiled(self):
+        return self.cubemap is not None and self.tileLevels is not None
     
\ No newline at end of file
@@ -0,0 +1,212 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import os
+import logging
+import cPickle
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+from pandac.PandaModules import Texture, Filename
+
+
+class BakedTexturesCache(object):
+    '''
+    An on-disk store of textures that have been baked offline into Panda's .txo format, with their mipmaps 
+    generated and their images compressed in a GPU format (DXT1 or DXT5), so that loading them skips the decoding
+    of the source image, the generation of mipmaps and the compression by the driver and they occupy less memory.
+    
+    The baked files are keyed by the MD5 digest of the source file's contents, so identical sources share the 
+    same baked file. An index maps the normalized path of each source to its modification time, size and digest, 
+    in order to find the baked file without digesting the source. When the modification time or size of a source 
+    differ from the index, e.g. after the game has been copied to a different filesystem, the source is digested 
+    and its baked file is used only if the digest matches.
+    
+    Textures are baked by pano.resources.bake before shipping the game, the cache itself is read only at runtime.
+    '''
+    
+    # the version of the format of the index
+    FORMAT_VERSION = 1
+    
+    EXTENSION = '.txo'
+    
+    INDEX_FILENAME = 'index.pti'
+    
+    def __init__(self, directory):
+        self.log = logging.getLogger('pano.bakedTextures')
+        
+        # the directory where the baked files are stored
+        self.directory = directory
+        
+        # maps the normalized path of each source to a ((mtime, size), digest) tuple, it is loaded on first use
+        self.index = None
+        
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        
+        
+    def lookup(self, path, stats, readSource):
+        '''
+        Looks up the baked file of a texture.
+        @param path: The full path to the source file of the texture.
+        @param stats: A (mtime, size) tuple for the source file or None if they are unknown.
+        @param readSource: A callable that returns the contents of the source file, it is called only if the source
+        must be digested.
+        @return: The path to the baked file or None if there isn't a valid baked file.
+        '''
+        index = self._getIndex()
+        entry = index.get(os.path.normpath(path))
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        if stats is None or entry[0] != stats:
+            source = readSource()
+            if source is None or md5(source).hexdigest() != entry[1]:
+                self.misses += 1
+                return None
+            
+        bakedPath = self._getBakedFilename(entry[1])
+        if not os.path.exists(bakedPath):
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return bakedPath
+    
+    
+    def store(self, path, stats, source, tex, compress = True):
+        '''
+        Bakes a texture and records it in the index, the index must then be written with writeIndex.
+        @param path: The full path to the source file of the texture.
+        @param stats: A (mtime, size) tuple for the source file.
+        @param source: The contents of the source file.
+        @param tex: The texture loaded from the source file, its RAM image gets replaced by the baked image.
+        @param compress: If False then only the mipmaps are generated and the images remain uncompressed.
+        @return: True if the baked file was written and False otherwise.
+        '''
+        digest = md5(source).hexdigest()
+        bakedPath = self._getBakedFilename(digest)
+        
+        # identical sources share the baked file
+        if not os.path.exists(bakedPath):
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+                
+            tex.setMinfilter(Texture.FTLinearMipmapLinear)
+            tex.generateRamMipmapImages()
+            if compress:
+                mode = Texture.CMDxt5 if tex.getNumComponents() in (2, 4) else Texture.CMDxt1
+                if not tex.compressRamImage(mode):
+                    self.log.warning('Panda could not compress texture %s, it will be stored uncompressed' % path)
+                    
+            # write to a temporary file and then rename it, so that readers never see a partially written file
+            tmpPath = bakedPath + '.tmp' + BakedTexturesCache.EXTENSION
+            if not tex.write(Filename.fromOsSpecific(tmpPath)):
+                self.log.error('Failed to write baked texture %s' % bakedPath)
+                return False
+            if os.name == 'nt' and os.path.exists(bakedPath):
+                os.remove(bakedPath)
+            os.rename(tmpPath, bakedPath)
+            
+        self._getIndex()[os.path.normpath(path)] = (stats, digest)
+        self.stores += 1
+        return True
+    
+    
+    def writeIndex(self):
+        '''
+        Writes the index to the cache's directory.
+        @return: True if the index was written and False otherwise.
+        '''
+        filename = os.path.join(self.directory, BakedTexturesCache.INDEX_FILENAME)
+        tmpFilename = filename + '.tmp'
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+                
+            fp = open(tmpFilename, 'wb')
+            try:
+                cPickle.dump((BakedTexturesCache.FORMAT_VERSION, self._getIndex()), fp, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                fp.close()
+            
+            if os.name == 'nt' and os.path.exists(filename):
+                os.remove(filename)
+            os.rename(tmpFilename, filename)
+            return True
+        
+        except (IOError, OSError):
+            self.log.exception('Failed to write the index of the baked textures %s' % filename)
+            return False
+    
+    
+    def clear(self):
+        '''
+        Deletes all baked files and the index.
+        '''
+        self.index = {}
+        if not os.path.isdir(self.directory):
+            return
+        for f in os.listdir(self.directory):
+            if f.endswith(BakedTexturesCache.EXTENSION) or f == BakedTexturesCache.INDEX_FILENAME:
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except OSError:
+                    self.log.exception('Failed to delete baked texture %s' % f)
+                    
+                    
+    def getStats(self):
+        return {
+            'hits'   : self.hits,
+            'misses' : self.misses,
+            'stores' : self.stores
+        }
+    
+    
+    def _getIndex(self):
+        if self.index is None:
+            self.index = {}
+            filename = os.path.join(self.directory, BakedTexturesCache.INDEX_FILENAME)
+            if os.path.exists(filename):
+                try:
+                    fp = open(filename, 'rb')
+                    try:
+                        version, index = cPickle.load(fp)
+                    finally:
+                        fp.close()
+                    if version == BakedTexturesCache.FORMAT_VERSION:
+                        self.index = index
+                except Exception:
+                    # a damaged index only disables the baked textures, they will load from their sources
+                    self.log.exception('Failed to read the index of the baked textures %s' % filename)
+        return self.index
+    
+    
+    def _getBakedFilename(self, digest):
+        return os.path.join(self.directory, digest + BakedTexturesCache.EXTENSION)
@@ -0,0 +1,204 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import os
+import logging
+import cPickle
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+
+class CompiledResourcesCache(object):
+    '''
+    An on-disk cache of parsed resources, it stores each parsed resource object in a pickled file so that 
+    later loads of the resource can skip the parsing of its source file.
+    
+    Each compiled file begins with a header that records the path, modification time, size and MD5 digest of 
+    the source file, as well as the version of the parser. A compiled file is used only if the parser version 
+    matches and either the modification time and size of the source are unchanged or, when they are different,
+    the digest of the source's contents is unchanged. The latter allows for compiled files to remain valid after 
+    the game has been copied to a different filesystem. The parser versions are defined by the VERSION attribute 
+    of the parsers in pano.resources.parsers, which must be incremented whenever a parser or the model classes 
+    it constructs change.
+    
+    The compiled files are named after the MD5 digest of the normalized path of the source file.
+    '''
+    
+    # the version of the format of the compiled files
+    FORMAT_VERSION = 1
+    
+    EXTENSION = '.pcr'
+    
+    def __init__(self, directory):
+        self.log = logging.getLogger('pano.compiledCache')
+        
+        # the directory where the compiled files are stored
+        self.directory = directory
+        
+        # if False then compiled files won't be written, this gets set when we fail to write to self.directory
+        self.writable = True
+        
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        
+        
+    def lookup(self, resType, path, stats, version, readSource):
+        '''
+        Looks up the compiled instance of a resource.
+        @param resType: A constant that identifies the type of the resource.
+        @param path: The full path to the source file of the resource.
+        @param stats: A (mtime, size) tuple for the source file or None if they are unknown.
+        @param version: The version of the resource's parser.
+        @param readSource: A callable that returns the contents of the source file, it is called only if the source 
+        file must be compared against the compiled file.
+        @return: A (resource object, source) tuple. The resource object is None if there is no valid compiled instance
+        and source contains the contents of the source file if readSource was called or None otherwise.
+        '''
+        filename = self._getCompiledFilename(path)
+        try:
+            fp = open(filename, 'rb')
+        except IOError:
+            self.misses += 1
+            return (None, None)
+        
+        source = None
+        try:
+            try:
+                header = cPickle.load(fp)
+                if header[:4] != (CompiledResourcesCache.FORMAT_VERSION, resType, os.path.normpath(path), version):
+                    self.misses += 1
+                    return (None, None)
+                
+                if stats is None or header[4] != stats:
+                    source = readSource()
+                    if source is None or header[5] != self._getDigest(source):
+                        self.misses += 1
+                        return (None, source)
+                    
+                obj = cPickle.load(fp)
+            finally:
+                fp.close()
+        except Exception:
+            # treat damaged and incompatible files as missing, they will get overwritten
+            self.log.exception('Failed to read compiled resource %s' % filename)
+            self.misses += 1
+            return (None, source)
+        
+        # the source was only touched, record its new stats to avoid digesting it next time
+        if source is not None and stats is not None:
+            self._write(filename, header[:4] + (stats, header[5]), obj)
+        
+        self.hits += 1
+        return (obj, source)
+    
+    
+    def store(self, resType, path, stats, version, source, obj):
+        '''
+        Stores the compiled instance of a resource.
+        @param resType: A constant that identifies the type of the resource.
+        @param path: The full path to the source file of the resource.
+        @param stats: A (mtime, size) tuple for the source file or None if they are unknown.
+        @param version: The version of the resource's parser.
+        @param source: The contents of the source file.
+        @param obj: The parsed resource object.
+        @return: True if the compiled file was written and False otherwise.
+        '''
+        if not self.writable:
+            return False
+        
+        header = (CompiledResourcesCache.FORMAT_VERSION, resType, os.path.normpath(path), version, stats, self._getDigest(source))
+        if self._write(self._getCompiledFilename(path), header, obj):
+            self.stores += 1
+            return True
+        return False
+    
+    
+    def clear(self):
+        '''
+        Deletes all compiled files.
+        '''
+        if not os.path.isdir(self.directory):
+            return
+        for f in os.listdir(self.directory):
+            if f.endswith(CompiledResourcesCache.EXTENSION):
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except OSError:
+                    self.log.exception('Failed to delete compiled resource %s' % f)
+                    
+                    
+    def getStats(self):
+        return {
+            'hits'   : self.hits,
+            'misses' : self.misses,
+            'stores' : self.stores
+        }
+    
+    
+    def _write(self, filename, header, obj):
+        # write to a temporary file and then rename it, so that readers never see a partially written file
+        tmpFilename = '%s.%d.tmp' % (filename, id(obj))
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+                
+            fp = open(tmpFilename, 'wb')
+            try:
+                cPickle.dump(header, fp, cPickle.HIGHEST_PROTOCOL)
+                cPickle.dump(obj, fp, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                fp.close()
+            
+            if os.name == 'nt' and os.path.exists(filename):
+                os.remove(filename)
+            os.rename(tmpFilename, filename)
+            return True
+        
+        except (IOError, OSError):
+            self.log.exception('Failed to write compiled resource %s, compiled resources will not be stored' % filename)
+            self.writable = False
+            
+        except (cPickle.PicklingError, TypeError):
+            self.log.exception('Resource %s cannot be compiled' % header[2])
+            
+        if os.path.exists(tmpFilename):
+            os.remove(tmpFilename)
+        return False
+    
+    
+    def _getCompiledFilename(self, path):
+        path = os.path.normpath(path)
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        return os.path.join(self.directory, md5(path).hexdigest() + CompiledResourcesCache.EXTENSION)
+    
+    
+    def _getDigest(self, source):
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+        return md5(source).hexdigest()
@@ -21,66 +21,337 @@ THE SOFTWARE.
 
 '''
 
-import dircache
-import fnmatch
 import logging
 import os
 import codecs
+import bisect
 
+from direct.stdpy import threading
+
+from pano.constants import PanoConstants
 from pano.resources.ResourcesLocation import AbstractResourceLocation
 from pano.resources.ResourcesTypes import ResourcesTypes
+from pano.util.INotify import INotify
 
 
 class DirectoryResourcesLocation(AbstractResourceLocation):
     '''
     Offers services for finding loading files from directories.
+    
+    The files of the directory are indexed by their basenames and by their resource types, so that lookups
+    don't have to scan the list of files. If the location is recursive then the subdirectories are indexed as well,
+    in which case when two files share the same basename the one closer to the root directory wins.
+    
+    When hot-swapping is enabled, changes to the files are detected through inotify if it is available 
+    or otherwise by comparing the modification times and sizes of the files against those found by the
+    previous check.
     '''
     
-    def __init__(self, directory, name, description, resTypes, hotswap=True, checkPeriod=10):
+    def __init__(self, directory, name, description, resTypes, hotswap=False, checkPeriod=10, recursive=False):
         AbstractResourceLocation.__init__(self, name, description, resTypes, hotswap, checkPeriod)
         
         self.log = logging.getLogger('pano.directoryResource')
         
         # the directory to look into for supported resource types
         self.directory = directory
+        
+        # if True then the subdirectories of self.directory will be indexed as well
+        self.recursive = recursive
 
         # a sorted list of all filenames of supported types that were found in self.directory
         self.resourcesNames = []
         
+        # maps the filenames of supported types to their full paths
+        self.resourcesPaths = {}
+        
+        # a sorted list of filenames for each supported resource type, in { resType : [filenames] } format
+        self.resourcesByType = {}
+        
+        # the modification time and size of each file of a supported type, in { fullPath : (mtime, size) } format,
+        # used for detecting changes when hot-swapping is enabled and inotify is not available
+        self.resourcesStats = {}
+        
+        # watches the indexed directories when hot-swapping is enabled and inotify is available,
+        # self.watchedDirs maps the watch descriptors to the paths of the directories
+        self.inotify = None
+        self.watchedDirs = {}
+        
+        # guards the state used for detecting changes since pollChanges is called from a background thread
+        self.watchLock = threading.Lock()
+        
         
     def dispose(self):
-        self.resourcesNames = None
+        self.watchLock.acquire()
+        try:
+            self._stopWatching()
+        finally:
+            self.watchLock.release()
+            
+        self.resourcesNames = []
+        self.resourcesPaths = {}
+        self.resourcesByType = {}
         
         
     def indexResources(self):        
         
         # get a listing of the directory and match filenames against
         # all supported resource types
+        resTypes = self._getSupportedTypes()
+        
+        paths = {}
+        byType = {}
         try:
-            filenames = dircache.listdir(self.directory)
-        except Exception, e:
-            # dircache.listdir can throw 
-            self.log.exception('error while calling dircache.listdir')
+            for dirPath, filenames in self._listDirectories():
+                for filename in filenames:
+                    types = ResourcesTypes.getTypesOfFilename(filename, resTypes)
+                    if not types:
+                        continue
+                    
+                    if paths.has_key(filename):
+                        self.log.warning('Ignoring %s because a resource with the same name exists in %s' % (os.path.join(dirPath, filename), paths[filename]))
+                        continue
+                    
+                    paths[filename] = os.path.join(dirPath, filename)
+                    for t in types:
+                        byType.setdefault(t, []).append(filename)
+        except OSError:
+            self.log.exception('error while listing directory %s' % self.directory)
             return 
         
-        suffixes = []
-        for resType in self.resTypes:                     
-            suffixes.extend(ResourcesTypes.getExtensions(resType))
-
-        suffixes = tuple(suffixes)
-        self.resourcesNames = [item for item in filenames if item.endswith(suffixes)]
+        for names in byType.values():
+            names.sort()
+            
+        self.resourcesPaths = paths
+        self.resourcesByType = byType
+        self.resourcesNames = paths.keys()
         self.resourcesNames.sort()
+        
+        # a re-indexed location that is being watched must watch its new subdirectories too
+        if self.hotswap:
+            self._startWatching()
+        
+        
+    def startWatching(self):
+        AbstractResourceLocation.startWatching(self)
+        self._startWatching()
+        
+        
+    def stopWatching(self):
+        self.watchLock.acquire()
+        try:
+            AbstractResourceLocation.stopWatching(self)
+            self._stopWatching()
+        finally:
+            self.watchLock.release()
+        
+        
+    def pollChanges(self):
+        self.watchLock.acquire()
+        try:
+            if self.inotify is not None:
+                changed = self._pollINotify()
+            elif self.hotswap:
+                changed = self._pollStats()
+            else:
+                return []
+        finally:
+            self.watchLock.release()
+            
+        resTypes = self._getSupportedTypes()
+        changed = [p for p in changed if ResourcesTypes.getTypesOfFilename(os.path.basename(p), resTypes)]
+        changed.sort()
+        return changed
+    
+    
+    def refreshResources(self, paths):
+        resTypes = self._getSupportedTypes()
+        changed = []
+        for path in paths:
+            filename = os.path.basename(path)
+            types = ResourcesTypes.getTypesOfFilename(filename, resTypes)
+            if not types:
+                continue
+            
+            current = self.resourcesPaths.get(filename)
+            if os.path.isfile(path):
+                if current is None:
+                    self._addToIndex(filename, path, types)
+                elif current != path:
+                    if os.path.isfile(current):
+                        self.log.warning('Ignoring %s because a resource with the same name exists in %s' % (path, current))
+                        continue
+                    self.resourcesPaths[filename] = path
+            elif current == path:
+                self._removeFromIndex(filename, types)
+            else:
+                continue
+            
+            changed.append(filename)
+        return changed
+        
+        
+    def _getSupportedTypes(self):
+        if self.resTypes == PanoConstants.RES_TYPE_ALL:
+            return ResourcesTypes.listAllTypes()
+        return self.resTypes
+        
+        
+    def _addToIndex(self, filename, path, types):
+        self.resourcesPaths[filename] = path
+        bisect.insort(self.resourcesNames, filename)
+        for t in types:
+            bisect.insort(self.resourcesByType.setdefault(t, []), filename)
+            
+            
+    def _removeFromIndex(self, filename, types):
+        del self.resourcesPaths[filename]
+        if filename in self.resourcesNames:
+            self.resourcesNames.remove(filename)
+        for t in types:
+            names = self.resourcesByType.get(t)
+            if names is not None and filename in names:
+                names.remove(filename)
+        
+        
+    def _startWatching(self):
+        self.watchLock.acquire()
+        try:
+            self._stopWatching()
+            try:
+                if INotify.isSupported():
+                    self.inotify = INotify()
+                    for dirPath, filenames in self._listDirectories():
+                        self._watchDirectory(dirPath)
+                else:
+                    self.resourcesStats = self._statResources()
+            except OSError:
+                self.log.exception('Failed to watch directory %s for changes' % self.directory)
+                self._stopWatching()
+        finally:
+            self.watchLock.release()
+            
+            
+    def _stopWatching(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+        self.watchedDirs = {}
+        self.resourcesStats = {}
+        
+        
+    def _watchDirectory(self, dirPath):
+        wd = self.inotify.addWatch(dirPath)
+        if wd >= 0:
+            self.watchedDirs[wd] = dirPath
+            
+            
+    def _pollINotify(self):
+        '''
+        @return: A list with the full paths of the files that were reported by inotify since the previous call.
+        '''
+        changed = {}
+        overflow = False
+        for wd, mask, name in self.inotify.readEvents():
+            if mask & INotify.IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            
+            dirPath = self.watchedDirs.get(wd)
+            if dirPath is None:
+                continue
+            
+            if mask & INotify.IN_IGNORED:
+                # the directory was removed or unmounted
+                del self.watchedDirs[wd]
+                continue
+            
+            if not name:
+                continue
+            
+            path = os.path.join(dirPath, name)
+            if mask & INotify.IN_ISDIR:
+                # the files of new subdirectories are new resources as well
+                if self.recursive and mask & (INotify.IN_CREATE | INotify.IN_MOVED_TO):
+                    for subDir, dirNames, filenames in os.walk(path):
+                        self._watchDirectory(subDir)
+                        for f in filenames:
+                            changed[os.path.join(subDir, f)] = True
+            else:
+                changed[path] = True
+                
+        if overflow:
+            # events were lost, consider every resource as changed
+            self.log.warning('Lost change events of resource location %s' % self.name)
+            for path in self.resourcesPaths.values():
+                changed[path] = True
+            try:
+                for dirPath, filenames in self._listDirectories():
+                    for f in filenames:
+                        changed[os.path.join(dirPath, f)] = True
+            except OSError:
+                self.log.exception('error while listing directory %s' % self.directory)
+                
+        return changed.keys()
+    
+    
+    def _pollStats(self):
+        '''
+        @return: A list with the full paths of the files whose modification time or size changed since the 
+        previous call, including the files that were added or removed.
+        '''
+        try:
+            stats = self._statResources()
+        except OSError:
+            self.log.exception('error while listing directory %s' % self.directory)
+            return []
+        
+        changed = [p for p, st in stats.items() if self.resourcesStats.get(p) != st]
+        changed.extend([p for p in self.resourcesStats.keys() if not stats.has_key(p)])
+        self.resourcesStats = stats
+        return changed
+    
+    
+    def _statResources(self):
+        '''
+        @return: A dictionary that maps the full paths of all files of supported types to their (mtime, size).
+        '''
+        resTypes = self._getSupportedTypes()
+        stats = {}
+        for dirPath, filenames in self._listDirectories():
+            for filename in filenames:
+                if ResourcesTypes.getTypesOfFilename(filename, resTypes):
+                    path = os.path.join(dirPath, filename)
+                    try:
+                        st = os.stat(path)
+                        stats[path] = (st.st_mtime, st.st_size)
+                    except OSError:
+                        # removed while we were listing the directory
+                        pass
+        return stats
+        
+        
+    def _listDirectories(self):
+        '''
+        @return: A list of (directory, filenames) tuples for every directory that should be indexed. The root directory
+        comes first and subdirectories, if any, follow in breadth first order.
+        '''
+        if not self.recursive:
+            return [(self.directory, [f for f in os.listdir(self.directory) if os.path.isfile(os.path.join(self.directory, f))])]
+        
+        listing = []
+        for dirPath, dirNames, filenames in os.walk(self.directory):
+            dirNames.sort()
+            listing.append((dirPath, filenames))
+        listing.sort(key = lambda entry: entry[0].count(os.sep))
+        return listing
 
 
     def containsResource(self, filename):
-        return self.resourcesNames.count(filename) > 0
+        return self.resourcesPaths.has_key(filename)
 
 
     def getResourceFullPath(self, name):
-        if self.resourcesNames.count(name) > 0:
-            return os.path.join(self.directory, name)
-        else:
-            return None
+        return self.resourcesPaths.get(name)
         
         
     def getResourceAsString(self, filename, fullPath = False):
@@ -113,16 +384,24 @@ class DirectoryResourcesLocation(AbstractResourceLocation):
                 self.log.exception(e)
                 
 
+    def getResourceStats(self, filename):
+        try:
+            st = os.stat(filename)
+            return (st.st_mtime, st.st_size)
+        except OSError:
+            return None
+        
+        
     def listResources(self, resType, fullPaths=True):
-        if resType in self.getResourcesTypes():
-            prefix = ''
-            if fullPaths:
-                prefix = self.directory
-            return [os.path.join(prefix, resName) for resName in self.resourcesNames if ResourcesTypes.isExtensionOfType(resName[-4:], resType)]
-        else:
+        names = self.resourcesByType.get(resType)
+        if names is None:
             return []
+        elif fullPaths:
+            return [self.resourcesPaths[resName] for resName in names]
+        else:
+            return list(names)
 
                 
     def __str__(self):
-        return 'Resource location %s, at path %s, of type %s' % (self.name, self.directory, self.resTypes)     
+        return 'Resource location %s, at path %s%s, of type %s' % (self.name, self.directory, ' (recursive)' if self.recursive else '', self.resTypes)     
                    
@@ -27,6 +27,7 @@ import codecs
 
 from pandac.PandaModules import VirtualFileSystem, Filename
 from pandac.PandaModules import DSearchPath
+from pandac.PandaModules import Multifile
 
 from pano.resources.ResourcesLocation import AbstractResourceLocation
 from pano.resources.ResourcesTypes import ResourcesTypes
@@ -34,10 +35,14 @@ from pano.resources.ResourcesTypes import ResourcesTypes
 class MultifileResourcesLocation(AbstractResourceLocation):
     '''
     Offers services for finding loading files from multifiles. 
+    
+    When hot-swapping is enabled, the modification time of the multifile is checked periodically and when it
+    changes the table of subfiles is read again and compared against the previous one in order to find out
+    which resources have changed. A single stat call per check is cheap enough so inotify isn't used here.
     '''
 
 
-    def __init__(self, mfFilename, name, resTypes, hotswap=True, checkPeriod=10):
+    def __init__(self, mfFilename, name, resTypes, hotswap=False, checkPeriod=10):
         
         AbstractResourceLocation.__init__(self, name, '', resTypes, hotswap, checkPeriod)
         
@@ -52,6 +57,11 @@ class MultifileResourcesLocation(AbstractResourceLocation):
         # a sorted list of all filenames of supported types that were found in self.directory
         self.resourcesNames = []
         
+        # the modification time of the multifile and the timestamp and length of each subfile, in
+        # { subfileName : (timestamp, length) } format, used for detecting changes when hot-swapping is enabled
+        self.mfTime = None
+        self.subfilesStats = {}
+        
         
     def dispose(self):
         vfs = VirtualFileSystem.getGlobalPtr()
@@ -61,13 +71,88 @@ class MultifileResourcesLocation(AbstractResourceLocation):
     def indexResources(self):        
         vfs = VirtualFileSystem.getGlobalPtr()
         vfs.mount(Filename(self.filename), self.mountPoint, VirtualFileSystem.MFReadOnly)        
+        
+        if self.hotswap:
+            self._recordStats()
+            
+            
+    def startWatching(self):
+        AbstractResourceLocation.startWatching(self)
+        self._recordStats()
+        
+        
+    def stopWatching(self):
+        AbstractResourceLocation.stopWatching(self)
+        self.mfTime = None
+        self.subfilesStats = {}
+        
+        
+    def pollChanges(self):
+        if not self.hotswap:
+            return []
+        
+        try:
+            mfTime = os.path.getmtime(self.filename)
+            if mfTime == self.mfTime:
+                return []
+            stats = self._readSubfilesStats()
+        except OSError:
+            # the multifile is probably being rewritten, try again on the next check
+            return []
+        
+        changed = [name for name, st in stats.items() if self.subfilesStats.get(name) != st]
+        changed.extend([name for name in self.subfilesStats.keys() if not stats.has_key(name)])
+        self.mfTime = mfTime
+        self.subfilesStats = stats
+        
+        changed.sort()
+        return [self.mountPoint + '/' + name for name in changed]
+    
+    
+    def refreshResources(self, paths):
+        '''
+        The virtual filesystem doesn't pick up changes to the multifile while it is mounted, so the multifile
+        gets remounted.
+        '''
+        vfs = VirtualFileSystem.getGlobalPtr()
+        vfs.unmountPoint(Filename(self.mountPoint))
+        vfs.mount(Filename(self.filename), self.mountPoint, VirtualFileSystem.MFReadOnly)
+        return [os.path.basename(p) for p in paths]
+    
+    
+    def _recordStats(self):
+        '''
+        Remembers the current state of the multifile, pollChanges reports the changes made after this call.
+        '''
+        try:
+            self.mfTime = os.path.getmtime(self.filename)
+            self.subfilesStats = self._readSubfilesStats()
+        except OSError:
+            self.log.exception('Failed to stat multifile %s' % self.filename)
+    
+    
+    def _readSubfilesStats(self):
+        '''
+        @return: A dictionary that maps the names of the subfiles to their (timestamp, length).
+        '''
+        mf = Multifile()
+        if not mf.openRead(Filename(self.filename)):
+            raise OSError('Failed to open multifile %s' % self.filename)
+        try:
+            stats = {}
+            for i in xrange(mf.getNumSubfiles()):
+                stats[mf.getSubfileName(i)] = (mf.getSubfileTimestamp(i), mf.getSubfileLength(i))
+            return stats
+        finally:
+            mf.close()
 
         
     def containsResource(self, filename):
         vfs = VirtualFileSystem.getGlobalPtr()
+        cwd = vfs.getCwd()
         vfs.chdir(self.mountPoint)
         flag = vfs.exists(Filename(filename))
-        vfs.chdir(self.mountPoint)
+        vfs.chdir(cwd)
         return flag
 
 
@@ -83,6 +168,14 @@ class MultifileResourcesLocation(AbstractResourceLocation):
                 return resFile.getFullpath()
             
 
+    def getResourceStats(self, filename):
+        vfs = VirtualFileSystem.getGlobalPtr()
+        vf = vfs.getFile(Filename(filename))
+        if vf is None:
+            return None
+        return (vf.getTimestamp(), vf.getFileSize())
+    
+
     def getResourceStream(self, name):
         vfs = VirtualFileSystem.getGlobalPtr()
         istream = vfs.openReadFile(Filename(name))
@@ -128,7 +221,7 @@ class MultifileResourcesLocation(AbstractResourceLocation):
                 directories.append(fileEntry.getFilename())
                 continue
             
-            if ResourcesTypes.isExtensionOfType(fileEntry.getFilename().getExtension(), resType):
+            if ResourcesTypes.isExtensionOfType('.' + fileEntry.getFilename().getExtension(), resType):
                 resFiles.append(fileEntry.getFilename().getFullpath() if fullPaths else fileEntry.getFilename().getBasename())
                 
         for dir in directories:
@@ -0,0 +1,382 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import re
+import logging
+
+from direct.stdpy import threading
+from direct.task.Task import Task
+from pandac.PandaModules import Thread
+
+from pano.constants import PanoConstants
+
+
+class NodePrefetcher(object):
+    '''
+    Loads in the background the resources of the nodes that can be reached from the active node, so that
+    a transition to any of them finds its resources already loaded.
+    
+    The neighbours of a node are found by inspecting its hotspots for acGotoNode actions and its script for
+    change node requests. For each neighbour we load the .node file, the script and the cubemap textures 
+    (or the background image for 2D nodes) through ResourceLoader.prefetchResource, which stores them in 
+    the preload store of the resource loader.
+    
+    Loading happens in a pool of worker threads or, if threads are not supported by the Panda build or 
+    the pool size is set to 0, in a task that loads a single resource per frame.
+    
+    The prefetched resources are bounded by a memory budget, when it is exceeded the oldest prefetched
+    resources are evicted from the preload store. Resources that were prefetched for nodes which are not 
+    neighbours of the active node anymore are evicted as well.
+    '''
+    
+    # matches change node requests inside node scripts, e.g.:
+    #    self.game.getMessenger().sendMessage(PanoConstants.EVENT_CHANGE_NODE, ['hall'])
+    #    self.game.actions().execute('acGotoNode', 'hall')
+    SCRIPT_TARGETS_RE = re.compile(r'''(?:EVENT_CHANGE_NODE|['"]node\.change['"]|['"]acGotoNode['"])\s*,\s*\[?\s*u?['"]([^'"]+)['"]''')
+    
+    # suffixes of the cubemap textures, see NodeRenderer._replaceCubemapTextures 
+    CUBEMAP_SUFFIXES = ('_fr', '_bk', '_lt', '_rt', '_top', '_bt')
+    
+    DEFAULT_THREADS = 2
+    DEFAULT_BUDGET = 128 * 1024 * 1024
+    
+    def __init__(self, game):
+        self.log = logging.getLogger('pano.prefetcher')
+        
+        self.game = game
+        
+        self.enabled = False
+        
+        # the count of worker threads, if 0 then prefetching is performed by a task on the main thread
+        self.numThreads = NodePrefetcher.DEFAULT_THREADS
+        
+        # the maximum estimated size in bytes of all prefetched resources
+        self.budget = NodePrefetcher.DEFAULT_BUDGET
+        
+        self.workers = []
+        self.task = None
+        self.running = False
+        
+        # guards self.jobs and self.prefetched
+        self.cond = threading.Condition()
+        
+        # pending jobs in (resource type, filename, neighbour node name) format
+        self.jobs = []
+        
+        # the names of the nodes for which we are prefetching resources
+        self.neighbours = []
+        
+        # resources that were prefetched and haven't been evicted yet, oldest first,
+        # in (pano.resources.Resource instance, neighbour node name) format
+        self.prefetched = []
+        self.prefetchedBytes = 0
+        
+        # statistics
+        self.scheduled = 0
+        self.loaded = 0
+        self.alreadyLoaded = 0
+        self.failures = 0
+        self.evictions = 0
+        
+        
+    def initialize(self):
+        '''
+        Reads the prefetching options from the game's configuration and starts the workers.
+        '''
+        cfg = self.game.getConfig()
+        self.enabled = cfg.getBool(PanoConstants.CVAR_PREFETCH_ENABLED, True)
+        self.numThreads = cfg.getInt(PanoConstants.CVAR_PREFETCH_THREADS, NodePrefetcher.DEFAULT_THREADS)
+        budgetMB = cfg.getInt(PanoConstants.CVAR_PREFETCH_BUDGET)
+        if budgetMB is not None:
+            self.budget = budgetMB * 1024 * 1024
+        
+        if not self.enabled:
+            return
+        
+        self.running = True
+        if self.numThreads > 0 and Thread.isThreadingSupported():
+            for i in xrange(self.numThreads):
+                worker = threading.Thread(target = self._workerLoop, name = 'prefetcher-%d' % i)
+                # the workers must not keep the process alive when the game exits without disposing us
+                worker.setDaemon(True)
+                self.workers.append(worker)
+                worker.start()
+        else:
+            if self.numThreads > 0:
+                self.log.warning('Threading is not supported, prefetching will be performed on the main thread')
+            self.task = taskMgr.add(self._prefetchTask, PanoConstants.TASK_PREFETCH)
+            
+            
+    def dispose(self):
+        '''
+        Stops the workers and evicts all prefetched resources.
+        '''
+        self.cond.acquire()
+        try:
+            self.running = False
+            self.jobs = []
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+            
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        
+        if self.task is not None:
+            taskMgr.remove(self.task)
+            self.task = None
+            
+        self.neighbours = []
+        self._evict(lambda res, owner: True)
+        
+        
+    def isEnabled(self):
+        return self.enabled
+        
+        
+    def prefetchNeighbours(self, node):
+        '''
+        Schedules the prefetching of the nodes that can be reached from the given node. Any jobs still pending for 
+        the neighbours of the previous node are cancelled. 
+        @param node: A pano.model.Node instance, normally the active node.
+        '''
+        if not self.enabled or node is None:
+            return
+        
+        neighbours = [n for n in self.getNeighbours(node) if n != node.name]
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug('Prefetching neighbours of node %s: %s' % (node.name, neighbours))
+        
+        self.cond.acquire()
+        try:
+            self.neighbours = neighbours
+            self.jobs = [(PanoConstants.RES_TYPE_NODES, n + '.node', n) for n in neighbours]
+            self.scheduled += len(self.jobs)
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+            
+        # whatever belongs to a node that is no longer a neighbour won't be needed soon
+        self._evict(lambda res, owner: owner not in neighbours)
+        
+        
+    def getNeighbours(self, node):
+        '''
+        @param node: A pano.model.Node instance.
+        @return: A list of the names of the nodes that are targeted by the hotspots or the script of the given node.
+        '''
+        targets = []
+        for hp in node.getHotspots():
+            if hp.action == 'acGotoNode' and hp.actionArgs:
+                args = hp.actionArgs
+                if isinstance(args, basestring):
+                    args = [a.strip() for a in args.split(',')]
+                targets.append(args[0])
+                
+        resources = self.game.getResources()
+        if node.scriptName is not None and resources.locateResource(PanoConstants.RES_TYPE_SCRIPTS, node.scriptName + '.py') is not None:
+            scriptText = resources.loadScript(node.scriptName)
+            if scriptText is not None:
+                targets.extend(NodePrefetcher.SCRIPT_TARGETS_RE.findall(scriptText))
+                
+        # remove duplicates but keep the order of appearance
+        unique = []
+        for t in targets:
+            if t not in unique:
+                unique.append(t)
+        return unique
+        
+        
+    def getNodeDependencies(self, node):
+        '''
+        @param node: A pano.model.Node instance.
+        @return: A list of (resource type, filename) tuples for the resources that are required for displaying the given node.
+        '''
+        deps = []
+        if node.scriptName is not None:
+            deps.append((PanoConstants.RES_TYPE_SCRIPTS, node.scriptName + '.py'))
+        
+        if node.cubemap is not None:
+            ext = node.extension if node.extension is not None else 'png'
+            # only the level 0 tiles of tiled cubemaps are needed for displaying the node
+            tileSuffix = '_0_0_0' if node.tileLevels is not None else ''
+            for suffix in NodePrefetcher.CUBEMAP_SUFFIXES:
+                deps.append((PanoConstants.RES_TYPE_TEXTURES, '%s%s%s.%s' % (node.cubemap, suffix, tileSuffix, ext)))
+        elif node.image is not None:
+            deps.append((PanoConstants.RES_TYPE_TEXTURES, node.image))
+        return deps
+    
+    
+    def getStats(self):
+        '''
+        @return: A dictionary filled with statistics about prefetching.
+        '''
+        self.cond.acquire()
+        try:
+            self._dropClaimed()
+            return {
+                'scheduled'     : self.scheduled,
+                'pending'       : len(self.jobs),
+                'loaded'        : self.loaded,
+                'alreadyLoaded' : self.alreadyLoaded,
+                'failures'      : self.failures,
+                'evictions'     : self.evictions,
+                'resources'     : len(self.prefetched),
+                'bytes'         : self.prefetchedBytes,
+                'budget'        : self.budget
+            }
+        finally:
+            self.cond.release()
+            
+            
+    def _nextJob(self, block):
+        '''
+        @param block: If True then wait until a job becomes available or the prefetcher stops running.
+        @return: The next job or None if there is none.
+        '''
+        self.cond.acquire()
+        try:
+            while block and self.running and not self.jobs:
+                self.cond.wait()
+            if self.running and self.jobs:
+                return self.jobs.pop(0)
+            return None
+        finally:
+            self.cond.release()
+
+
+    def _workerLoop(self):
+        while self.running:
+            job = self._nextJob(True)
+            if job is not None:
+                try:
+                    self._processJob(job)
+                except Exception:
+                    self.log.exception('Unexpected error while prefetching %s' % job[1])
+                
+                
+    def _prefetchTask(self, task):
+        job = self._nextJob(False)
+        if job is not None:
+            try:
+                self._processJob(job)
+            except Exception:
+                self.log.exception('Unexpected error while prefetching %s' % job[1])
+        return Task.cont
+                
+    
+    def _processJob(self, job):
+        resType, filename, owner = job
+        
+        resources = self.game.getResources()
+        if resources.locateResource(resType, filename) is None:
+            return
+        
+        resource, isNew = resources.prefetchResource(resType, filename)
+        
+        self.cond.acquire()
+        try:
+            if resource is None:
+                self.failures += 1
+                return
+                
+            if isNew:
+                self.loaded += 1
+                self.prefetchedBytes += resource.size
+                if owner in self.neighbours:
+                    self.prefetched.append((resource, owner))
+                else:
+                    # the job was scheduled for a node that is not a neighbour anymore, so it should be evicted first
+                    self.prefetched.insert(0, (resource, owner))
+            else:
+                self.alreadyLoaded += 1
+            
+            self._dropClaimed()
+            
+            # continue with the resources of the node itself 
+            if resType == PanoConstants.RES_TYPE_NODES and owner in self.neighbours:
+                deps = [(t, f, owner) for t, f in self.getNodeDependencies(resource.data)]
+                self.jobs.extend(deps)
+                self.scheduled += len(deps)
+                self.cond.notifyAll()
+        finally:
+            self.cond.release()
+            
+        if self.prefetchedBytes > self.budget:
+            self._evictOverBudget()
+            
+            
+    def _dropClaimed(self):
+        '''
+        Forgets the prefetched resources that have been requested meanwhile. These have left the preload store
+        for the cache and no longer count against the budget.
+        Must be called while holding self.cond.
+        '''
+        claimed = [res for res, owner in self.prefetched if res.requested]
+        if claimed:
+            self.prefetched = [(res, owner) for res, owner in self.prefetched if not res.requested]
+            for res in claimed:
+                self.prefetchedBytes -= res.size
+            
+            
+    def _evictOverBudget(self):
+        self.cond.acquire()
+        try:
+            victims = []
+            while self.prefetchedBytes > self.budget and self.prefetched:
+                res, owner = self.prefetched.pop(0)
+                self.prefetchedBytes -= res.size
+                victims.append(res)
+        finally:
+            self.cond.release()
+            
+        self._evictResources(victims)
+        
+            
+    def _evict(self, predicate):
+        '''
+        Evicts the prefetched resources that satisfy the given predicate.
+        @param predicate: A callable that accepts a resource and its neighbour node name and returns True if the resource should be evicted.
+        '''
+        self.cond.acquire()
+        try:
+            self._dropClaimed()
+            victims = [res for res, owner in self.prefetched if predicate(res, owner)]
+            self.prefetched = [(res, owner) for res, owner in self.prefetched if not predicate(res, owner)]
+            self.prefetchedBytes = sum([res.size for res, owner in self.prefetched])
+        finally:
+            self.cond.release()
+            
+        self._evictResources(victims)
+            
+            
+    def _evictResources(self, victims):
+        resources = self.game.getResources()
+        for res in victims:
+            # if the resource has been requested meanwhile, it has already left the preload store
+            if resources.evictPreloaded(res.fullPath, res.location) is not None:
+                self.evictions += 1
+                if self.log.isEnabledFor(logging.DEBUG):
+                    self.log.debug('Evicted prefetched resource %s' % res.fullPath)
+                    
@@ -46,8 +46,11 @@ class Resource(object):
 
         self.fullPath = fullPath
 
+        # the estimated memory footprint of the resource data in bytes
+        self.size = 0
+
         # the name of the resource location containing this resource
-        self.location = None
+        self.location = location
         
         # indicates if this resources has been requested by the user
         self.requested = False
@@ -63,7 +66,7 @@ class Resource(object):
         '''
         Releases system resources (textures, models, fonts, buffers, etc.) reserved for this resource.
         '''
-        if self.preload and not self.isRequested and not force:
+        if self.preload and not self.requested and not force:
             if self.log.isEnabledFor(logging.DEBUG):
                 self.log.debug("won't dispose resource %s because it is marked to be preloaded and hasn't been requested yet." % self.name)
                 return
@@ -32,12 +32,18 @@ from pandac.PandaModules import NodePath
 from pandac.PandaModules import Shader
 from pandac.PandaModules import VirtualFileSystem
 from pandac.PandaModules import Filename
-from pandac.PandaModules import PNMImage
+from pandac.PandaModules import PNMImage, PNMImageHeader
+from pandac.PandaModules import TexturePool
+from pandac.PandaModules import ModelPool
+from direct.stdpy import threading
 
 from pano.constants import PanoConstants
 from pano.util.Cache import Cache
 from pano.resources.Resource import Resource
 from pano.resources.ResourcesTypes import ResourcesTypes
+from pano.resources.CompiledResourcesCache import CompiledResourcesCache
+from pano.resources.BakedTexturesCache import BakedTexturesCache
+from pano.model.HotspotsMaps import ClickMask
 from pano.resources.parsers.PointerParser import PointerParser
 from pano.resources.parsers.NodeParser import NodeParser
 from pano.resources.parsers.FontParser import FontParser
@@ -54,6 +60,17 @@ class ResourceLoader(object):
     """
     Stores all declared resource paths for the various resource types.
     """
+    
+    # default limits of the resources cache
+    CACHE_MAX_ITEMS = 512
+    CACHE_MAX_BYTES = 256 * 1024 * 1024
+    
+    # caching policy for resource types that haven't been assigned one explicitly
+    DEFAULT_CACHE_POLICY = (PanoConstants.CACHE_POLICY_STRONG, 0)
+    
+    # takes the place of the resource type in the cache keys of click masks
+    CLICK_MASK_KEY = 'clickMask'
+    
     def __init__(self):
         self.log = logging.getLogger('pano.resourceLoader')
 
@@ -63,6 +80,10 @@ class ResourceLoader(object):
         # Locations of resources indexed by their names
         self.locationsByName = {}
         
+        # Merged index of the resources of all locations, it is organized as: { resType : { filename : (location, fullPath) } }.
+        # When more than one location contain the same filename, the location that was added first wins.
+        self.resourcesIndex = {}
+        
         self.parsers = {
                         PanoConstants.RES_TYPE_POINTERS     : PointerParser(),
                         PanoConstants.RES_TYPE_NODES        : NodeParser(),
@@ -75,9 +96,30 @@ class ResourceLoader(object):
                         PanoConstants.RES_TYPE_ITEMS        : InventoryItemParser()
         }
 
-        # Caches loaded resources but uses weak references to avoid storing large objects when
-        # they are no longer used.
-        self.cache = Cache('resources')
+        # Caches loaded resources, it is bounded both by the count of resources and by their estimated
+        # memory footprint in order to avoid storing too many large objects.
+        # Resources are keyed by (resource type, resource location name, full path).
+        self.cache = Cache('resources', size = ResourceLoader.CACHE_MAX_ITEMS, maxAge = 0, maxBytes = ResourceLoader.CACHE_MAX_BYTES)
+        
+        # The caching policy of each resource type, in { resType : (policy, ttl) } format. 
+        # Types that are missing use ResourceLoader.DEFAULT_CACHE_POLICY.
+        # Models, sounds and videos are not cached because their instances carry state (scenegraph parent,
+        # playback status) and cannot be shared, besides Panda already pools their underlying data.
+        self.cachePolicies = {
+                        PanoConstants.RES_TYPE_MODELS   : (PanoConstants.CACHE_POLICY_NONE, 0),
+                        PanoConstants.RES_TYPE_SFX      : (PanoConstants.CACHE_POLICY_NONE, 0),
+                        PanoConstants.RES_TYPE_MUSIC    : (PanoConstants.CACHE_POLICY_NONE, 0),
+                        PanoConstants.RES_TYPE_VIDEOS   : (PanoConstants.CACHE_POLICY_NONE, 0),
+                        PanoConstants.RES_TYPE_TEXTURES : (PanoConstants.CACHE_POLICY_WEAK, 0),
+                        PanoConstants.RES_TYPE_TEXTS    : (PanoConstants.CACHE_POLICY_TTL, 300),
+                        PanoConstants.RES_TYPE_BINARIES : (PanoConstants.CACHE_POLICY_TTL, 300)
+        }
+
+        # Stores the parsed resources in compiled form on disk, it is None unless enabled by enableCompiledCache.
+        self.compiledCache = None
+        
+        # Stores textures baked offline with mipmaps and compressed images, it is None unless enabled by enableBakedTextures.
+        self.bakedTextures = None
 
         # Stores resources that should be loaded because of a call to preloadResources or
         # preloadResourceLocation.
@@ -88,19 +130,30 @@ class ResourceLoader(object):
         # It is organized as: { res_filename : (BaseResource instance, resourceType, resource location name)
         self.stickyResources = {}
 
+        # guards the stores and the cache against concurrent access by prefetchResource
+        self.lock = threading.RLock()
+        
+        # if not None, the loads are timed by this pano.util.Profiler.FrameProfiler for each resource type
+        self.profiler = None
+
         # statistics
         self.requests = 0
         self.preloadHits = 0
         self.preloadMisses = 0
         self.stickyLoads = 0
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        self.diskLoads = 0
+        self.reloads = 0
 
 
     def initialize(self):
         pass
 
     def dispose(self):
-        for loc in self.resLocations:
+        for loc in self.locationsByName.values():
             loc.dispose()
+        self.resourcesIndex = {}
             
 
     def isLocationAdded(self, name):
@@ -127,7 +180,7 @@ class ResourceLoader(object):
         resource types.
         @param resLoc: An object that extends pano.resources.AbstractResourceLocation.
         '''
-        resTypes = resLoc.getResourcesTypes()
+        resTypes = self._getLocationTypes(resLoc)
         for type in resTypes:
             if self.resLocations.has_key(type):
                 locList = self.resLocations[type]
@@ -140,6 +193,13 @@ class ResourceLoader(object):
         # prepare it for lookups
         resLoc.indexResources()
         
+        # the new location has the lowest priority, so it only contributes the resources that aren't already indexed
+        for type in resTypes:
+            index = self.resourcesIndex.setdefault(type, {})
+            for filename, fullPath in self._listLocationResources(resLoc, type):
+                if not index.has_key(filename):
+                    index[filename] = (resLoc, fullPath)
+        
         
     def updateResourcesLocation(self, locationName):
         '''
@@ -151,12 +211,14 @@ class ResourceLoader(object):
         assert resLoc is not None, 'updateResourcesLocation called for unknown resources location'
         
         # first remove the locaion from self.resLocations
-        for li in self.resLocations.values():
+        affectedTypes = []
+        for type, li in self.resLocations.items():
             if resLoc in li:
                 li.remove(resLoc)
+                affectedTypes.append(type)
         
         # then add it to every list that corresponds to a resource type supported by this location        
-        resTypes = resLoc.getResourcesTypes()
+        resTypes = self._getLocationTypes(resLoc)
         for type in resTypes:
             if self.resLocations.has_key(type):
                 locList = self.resLocations[type]
@@ -166,6 +228,9 @@ class ResourceLoader(object):
                 self.resLocations[type] = [ resLoc ]
                 
         resLoc.indexResources()
+        
+        affectedTypes.extend([t for t in resTypes if t not in affectedTypes])
+        self._reindexTypes(affectedTypes)
 
 
     def removeResourcesLocation(self, locationName):
@@ -175,7 +240,7 @@ class ResourceLoader(object):
         '''
         resLoc = self.locationsByName.get(locationName)
         if resLoc is not None:
-            resTypes = resLoc.getResourcesTypes()
+            resTypes = self._getLocationTypes(resLoc)
             for type in resTypes:
                 if self.resLocations.has_key(type):
                     locList = self.resLocations[type]
@@ -184,6 +249,9 @@ class ResourceLoader(object):
             if self.locationsByName.has_key(resLoc.name):
                 del self.locationsByName[resLoc.name]
                 
+            # resources hidden by the removed location might now be served by another location
+            self._reindexTypes(resTypes)
+                
             resLoc.dispose()
 
 
@@ -194,12 +262,9 @@ class ResourceLoader(object):
         @param filename: The basename of the resource file.
         @return: The full path to the resource file.
         '''
-        if self.resLocations.has_key(resType):
-            locations = self.resLocations[resType]
-            if locations is not None:
-                for loc in locations:
-                    if loc.containsResource(filename):
-                        return loc.getResourceFullPath(filename)
+        entry = self.resourcesIndex.get(resType, {}).get(filename)
+        if entry is not None:
+            return entry[1]
         return None
 
 
@@ -209,11 +274,9 @@ class ResourceLoader(object):
         @param resType: A constant that identifies the type of the resource.
         @param filename: The basename of the resource file.
         '''
-        if self.resLocations.has_key(resType):
-            locations = self.resLocations[resType]
-            for loc in locations:
-                if loc.containsResource(filename):
-                    return loc
+        entry = self.resourcesIndex.get(resType, {}).get(filename)
+        if entry is not None:
+            return entry[0]
         return None
 
 
@@ -375,6 +438,37 @@ class ResourceLoader(object):
         return self._loadInternal(PanoConstants.RES_TYPE_IMAGES, filename)
 
 
+    def loadImageHeader(self, filename):
+        '''
+        Reads only the header of the image specified by the given filename, which is much faster than loading the image.
+        @param filename: The filename of the image, it can also be a texture.
+        @return: A pandac.PandaModules.PNMImageHeader object or None if the file was not found or its header couldn't be read.
+        '''
+        for resType in (PanoConstants.RES_TYPE_TEXTURES, PanoConstants.RES_TYPE_IMAGES):
+            location, fullPath = self.resourcesIndex.get(resType, {}).get(filename, (None, None))
+            if fullPath is not None:
+                header = PNMImageHeader()
+                if header.readHeader(Filename(fullPath)):
+                    return header
+                return None
+        return None
+    
+    
+    def isResourceLoaded(self, resType, filename):
+        '''
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The filename of the resource.
+        @return: True if the resource is available in the sticky or the preload stores or in the cache, in which case
+        loading it won't need to access its resource location.
+        '''
+        self.lock.acquire()
+        try:
+            location, fullPath = self.resourcesIndex.get(resType, {}).get(filename, (None, None))
+            return fullPath is not None and self._peekLoaded(resType, fullPath, location.name) is not None
+        finally:
+            self.lock.release()
+
+
     def loadModel(self, filename):
         '''
         Loads the model specified by the given filename.
@@ -392,7 +486,7 @@ class ResourceLoader(object):
         @return: A pandac.PandaModules.Shader instance or None if the file was not found or could not get loaded.
         '''
         exts = ResourcesTypes.getExtensions(PanoConstants.RES_TYPE_SHADERS)
-        if len(exts) == 1:
+        if len(exts) == 1 and not name.endswith(exts[0]):
             return self._loadInternal(PanoConstants.RES_TYPE_SHADERS, name + exts[0])
         else:
             return self._loadInternal(PanoConstants.RES_TYPE_SHADERS, name)
@@ -400,12 +494,48 @@ class ResourceLoader(object):
 
     def loadHotspotsMap(self, filename):        
         hmap = self._loadInternal(PanoConstants.RES_TYPE_HMAPS, filename)
-        # for image maps we need to load and set the actual image 
-        if filename.endswith('imap'):            
-            hmap.image = self.loadImage(hmap.imageFile)
+        # for image maps we need to load the actual image and label the map with it, unless it was cached
+        if filename.endswith('imap') and hmap is not None and hmap.labels is None:
+            image = self.loadImage(hmap.imageFile)
+            if image is not None:
+                hmap.setImage(image)
+                # the map doesn't keep the image, so neither should the cache
+                self._uncacheResource(PanoConstants.RES_TYPE_IMAGES, hmap.imageFile)
         return hmap 
 
 
+    def loadClickMask(self, filename):
+        '''
+        Loads the image of a hotspot's click mask and converts it into a bitset, see pano.model.HotspotsMaps.ClickMask.
+        The mask is cached in place of its image, so all nodes that use the same image share a single mask. 
+        @param filename: The filename of the mask's image.
+        @return: A ClickMask instance or None if the image was not found.
+        '''
+        self.lock.acquire()
+        try:
+            location, fullPath = self._resolveResource(PanoConstants.RES_TYPE_IMAGES, filename)
+            if fullPath is None:
+                return None
+            key = (ResourceLoader.CLICK_MASK_KEY, location.name, fullPath)
+            mask = self.cache.get(key)
+        finally:
+            self.lock.release()
+            
+        if mask is None:
+            img = self.loadImage(filename)
+            if img is None:
+                return None
+            
+            mask = ClickMask.fromImage(img)
+            self._uncacheResource(PanoConstants.RES_TYPE_IMAGES, filename)
+            self.lock.acquire()
+            try:
+                self.cache.put(key, mask, mask.getSize())
+            finally:
+                self.lock.release()
+        return mask
+
+
     def loadText(self, filename, encoding = "utf-8"):
         '''
         Loads the text based resource with the given filename, the decoding of the characters is based on the
@@ -426,6 +556,123 @@ class ResourceLoader(object):
         return self._loadInternal(PanoConstants.RES_TYPE_BINARIES, filename)
 
 
+    def setCachePolicy(self, resType, policy, ttl = 0):
+        '''
+        Sets the caching policy for the given resource type.
+        @param resType: A constant that identifies the type of the resource.
+        @param policy: One of the PanoConstants.CACHE_POLICY_XXX constants.
+        @param ttl: For the PanoConstants.CACHE_POLICY_TTL policy, the time in seconds before a cached resource expires. 
+        '''
+        self.cachePolicies[resType] = (policy, ttl)
+        
+        
+    def getCachePolicy(self, resType):
+        '''
+        @param resType: A constant that identifies the type of the resource.
+        @return: A (policy, ttl) tuple with the caching policy for the given resource type.
+        '''
+        return self.cachePolicies.get(resType, ResourceLoader.DEFAULT_CACHE_POLICY)
+    
+    
+    def clearCache(self):
+        '''
+        Removes all resources from the cache, preloaded and sticky resources are not affected.
+        '''
+        self.lock.acquire()
+        try:
+            self.cache.purge()
+        finally:
+            self.lock.release()
+        
+        
+    def getStats(self):
+        '''
+        @return: A dictionary filled with statistics about the loading of resources and the usage of the cache.
+        '''
+        return {
+            'requests'      : self.requests,
+            'diskLoads'     : self.diskLoads,
+            'cacheHits'     : self.cacheHits,
+            'cacheMisses'   : self.cacheMisses,
+            'preloadHits'   : self.preloadHits,
+            'preloadMisses' : self.preloadMisses,
+            'stickyLoads'   : self.stickyLoads,
+            'reloads'       : self.reloads,
+            'cache'         : self.cache.getStats(),
+            'compiled'      : self.compiledCache.getStats() if self.compiledCache is not None else {},
+            'baked'         : self.bakedTextures.getStats() if self.bakedTextures is not None else {}
+        }
+        
+        
+    def setProfiler(self, profiler):
+        self.profiler = profiler
+        
+        
+    def enableCompiledCache(self, directory):
+        '''
+        Enables storing the parsed resources in compiled form, later loads of them will then skip parsing.
+        See pano.resources.CompiledResourcesCache for more details.
+        @param directory: The directory where compiled resources will be stored, if it is None then the compiled cache
+        gets disabled.
+        '''
+        self.compiledCache = CompiledResourcesCache(directory) if directory is not None else None
+        
+        
+    def getCompiledCache(self):
+        return self.compiledCache
+    
+    
+    def enableBakedTextures(self, directory):
+        '''
+        Enables loading the baked versions of textures, when they exist, instead of their source images.
+        See pano.resources.BakedTexturesCache for more details.
+        @param directory: The directory of the baked textures, if it is None then baked textures won't be used.
+        '''
+        self.bakedTextures = BakedTexturesCache(directory) if directory is not None else None
+        
+        
+    def getBakedTextures(self):
+        return self.bakedTextures
+    
+    
+    def getParser(self, resType):
+        '''
+        @param resType: A constant that identifies the type of the resource, it should be a parsed resource type.
+        @return: The parser for the given resource type or None if there isn't one.
+        '''
+        return self.parsers.get(resType)
+        
+        
+    def refreshResources(self, locationName, paths):
+        '''
+        Updates the index of a resources location for the given changed resources and invalidates any loaded
+        instances of them, so that the next request will load them again from the resource location.
+        Textures that are in use are reloaded in place.
+        @param locationName: The name of the resources location.
+        @param paths: A list with the full paths of the changed resources, as returned by the pollChanges method
+        of the resources location.
+        @return: A list of (resType, filename) tuples for the resources that have changed.
+        '''
+        self.lock.acquire()
+        try:
+            resLoc = self.locationsByName.get(locationName)
+            if resLoc is None:
+                return []
+            
+            resTypes = self._getLocationTypes(resLoc)
+            changed = []
+            for filename in resLoc.refreshResources(paths):
+                for type in ResourcesTypes.getTypesOfFilename(filename, resTypes):
+                    self._reindexResource(type, filename)
+                    changed.append((type, filename))
+                    
+            if changed:
+                self._invalidateResources(locationName, [filename for type, filename in changed])
+            return changed
+        finally:
+            self.lock.release()
+
+
     def listResourceLocations(self):
         for loc in self.locationsByName.values():
             self.log.debug(loc)
@@ -480,6 +727,58 @@ class ResourceLoader(object):
                         self._storePreloaded(res, res.fullPath, locName)
 
 
+    def prefetchResource(self, resType, filename):
+        '''
+        Loads a resource, unless it is already available, and stores it in the preload store of the
+        resource location that contains it. The next request for the resource will then be served from
+        the preload store.
+        Contrary to the rest of the loading methods, this one is safe to be called from threads other 
+        than the main thread.
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The filename of the resource.
+        @return: A (resource, isNew) tuple, where resource is a pano.resources.Resource instance or None if the 
+        resource couldn't be loaded and isNew is True only if the resource was loaded by this call.
+        '''
+        self.lock.acquire()
+        try:
+            location, fullPath = self._resolveResource(resType, filename)
+            if fullPath is None:
+                return (None, False)
+            
+            resource = self._peekLoaded(resType, fullPath, location.name)
+            if resource is not None:
+                return (resource, False)
+        finally:
+            self.lock.release()
+            
+        resource = self._loadFromLocation(resType, filename, fullPath, location)
+        if resource is None:
+            return (None, False)
+        
+        self.lock.acquire()
+        try:
+            self._storePreloaded(resource, fullPath, location.name)
+        finally:
+            self.lock.release()
+        return (resource, True)
+    
+    
+    def evictPreloaded(self, filename, locationName):
+        '''
+        Removes a resource from the preload store without disposing it.
+        @param filename: The full path to the file that contains the resource.
+        @param locationName: The name of the resource location containing the resource.
+        @return: The removed pano.resources.Resource instance or None if the resource wasn't found in the preload store.
+        '''
+        self.lock.acquire()
+        try:
+            perLocation = self.preloadStore.get(locationName)
+            if perLocation is not None:
+                return perLocation.pop(filename, None)
+        finally:
+            self.lock.release()
+
+
     def _loadInternal(self, resType, filename, locationName = None, preloading = False):
         '''
         Manages the actual loading of a resource given the resource filename and the resource location
@@ -491,63 +790,233 @@ class ResourceLoader(object):
         @return: A pano.resources.Resource instance if preloading is True, or the actual resource instance
         if preloading is False or finally None if the resource couldn't be found.
         '''
+        if self.profiler is None:
+            return self._loadResource(resType, filename, locationName, preloading)
+        
+        timer = PanoConstants.PROFILE_LOAD_PREFIX + ResourcesTypes.resTypesNames.get(resType, str(resType))
+        with self.profiler.scope(timer):
+            return self._loadResource(resType, filename, locationName, preloading)
+        
+        
+    def _loadResource(self, resType, filename, locationName, preloading):
+        '''
+        Implements _loadInternal.
+        '''
+        # the lock protects the stores and the cache, it is released while loading from the resource location
+        # so that loads which happen in the background (see prefetchResource) don't block the main thread
+        self.lock.acquire()
+        try:
+            self.requests += 1
+    
+            location, fullPath = self._resolveResource(resType, filename, locationName)
+            if fullPath is None:
+                return None
+    
+            # resource locations can be sticky
+            if location.sticky:
+                resource = self._getStickyResource(fullPath, location.name)
+                if resource is not None:
+                    if self.log.isEnabledFor(logging.DEBUG):
+                        self.log.debug('Returning sticky resource %s' % fullPath)
+    
+                    self.stickyLoads += 1
+                    if not preloading:
+                        resource.requested = True
+                    return resource.data if not preloading else resource
+    
+            # if the location has a preload flag or has been the target of a prefetch, then search first in the preload store
+            if location.preload or self.preloadStore.get(location.name):
+                resource = self._fetchPreloaded(fullPath, location.name)
+                if resource is not None:
+                    self.preloadHits += 1
+                    if not preloading:
+                        resource.requested = True
+                    return resource.data if not preloading else resource
+                elif location.preload:
+                    self.preloadMisses += 1
+    
+            # then search in our cache        
+            resource = self._cacheLookup(resType, fullPath, location.name)
+            if resource is not None:
+                if self.log.isEnabledFor(logging.DEBUG):
+                    self.log.debug('Returning cached instance of resource %s' % fullPath)
+                self.cacheHits += 1
+                if not preloading:
+                    resource.requested = True
+                return resource.data if not preloading else resource
+            else:
+                self.cacheMisses += 1
+            
+            self.diskLoads += 1
+        finally:
+            self.lock.release()
 
-        self.requests += 1
+        # finally load it from the resource location        
+        resource = self._loadFromLocation(resType, filename, fullPath, location)
+        if resource is None:
+            return None
+        
+        if not preloading:
+            resource.requested = True
 
+        self.lock.acquire()
+        try:
+            # consider caching the resource
+            if not resource.sticky and not resource.preload:
+                self._cacheResource(resource)
+    
+            elif resource.sticky:
+                self._addStickyResource(fullPath, resource, location.name)
+        finally:
+            self.lock.release()
+                
+        # when we are preloading, return the Resource instance instead
+        return resource.data if not preloading else resource
+
+
+    def _resolveResource(self, resType, filename, locationName = None):
+        '''
+        Finds the resource location that contains the given resource and the full path to the resource.
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The filename of the resource.
+        @param locationName: The name of the resource location containing the resource. This is optional.
+        @return: A (location, fullPath) tuple, where any of the two can be None if the resource couldn't be located.
+        '''
+        fullPath = None
         if locationName is not None:
             location = self.locationsByName.get(locationName)
         else:
-            location = self.locateResource(resType, filename)
+            location, fullPath = self.resourcesIndex.get(resType, {}).get(filename, (None, None))
         if location is None:
             self.log.error('Failed to locate resource %s' % filename)
-            return None
+            return (None, None)
 
         # get the full path to query the cache, sticky and preload stores
-        fullPath = location.getResourceFullPath(filename)
+        if fullPath is None:
+            fullPath = location.getResourceFullPath(filename)
         if fullPath is None:
             self.log.error('Failed to get full path to resource %s' % filename)
-            return None
-
-        # resource locations can be sticky
-        if location.sticky:
-            resource = self._getStickyResource(fullPath, resType)
-            if resource is not None:
-                if self.log.isEnabledFor(logging.DEBUG):
-                    self.log.debug('Returning sticky resource %s' % fullPath)
-
-                self.stickyLoads += 1
-                if not preloading:
-                    resource.requested = True
-                return resource.data if not preloading else resource
-
-        # if the location has a preload flag, then search first in the preload store
-        if location.preload:
-            resource = self._fetchPreloaded(fullPath, location.name)
-            if resource is not None:
-                self.preloadHits += 1
-                if not preloading:
-                    resource.requested = True
-                return resource.data if not preloading else resource
-            else:
-                self.preloadMisses += 1
-
-        # then search in our cache        
-#        resource = self._cacheLookup(fullPath, location.name)
-#        if resource is not None:
-#            if self.log.isEnabledFor(logging.DEBUG):
-#                self.log.debug('Returning cached instance of resource %s' % fullPath)
-#            if not preloading:
-#                resource.requested = True
-#            return resource.data if not preloading else resource
-
-        # finally load it from the resource location        
+        return (location, fullPath)
+    
+    
+    def _getLocationTypes(self, resLoc):
+        '''
+        @return: The list of resource types supported by the given location, with RES_TYPE_ALL expanded to all types.
+        '''
+        resTypes = resLoc.getResourcesTypes()
+        if resTypes == PanoConstants.RES_TYPE_ALL:
+            return ResourcesTypes.listAllTypes()
+        return resTypes
+    
+    
+    def _listLocationResources(self, resLoc, resType):
+        '''
+        @return: A list of (filename, fullPath) tuples for all resources of the given type that exist in the location.
+        '''
+        return zip(resLoc.listResources(resType, False), resLoc.listResources(resType, True))
+    
+    
+    def _reindexTypes(self, resTypes):
+        '''
+        Rebuilds the entries of self.resourcesIndex for the given resource types by walking the registered
+        locations in order of priority. 
+        '''
+        for type in resTypes:
+            index = {}
+            for resLoc in self.resLocations.get(type, []):
+                for filename, fullPath in self._listLocationResources(resLoc, type):
+                    if not index.has_key(filename):
+                        index[filename] = (resLoc, fullPath)
+            
+            # replace the whole dictionary so that concurrent lookups never see a partial index
+            self.resourcesIndex[type] = index
+                
+    
+    def _reindexResource(self, resType, filename):
+        '''
+        Updates the entry of self.resourcesIndex for a single resource by walking the registered locations in order of priority.
+        '''
+        index = self.resourcesIndex.setdefault(resType, {})
+        for resLoc in self.resLocations.get(resType, []):
+            if resLoc.containsResource(filename):
+                index[filename] = (resLoc, resLoc.getResourceFullPath(filename))
+                return
+        index.pop(filename, None)
+        
+        
+    def _invalidateResources(self, locationName, filenames):
+        '''
+        Removes the loaded instances of the given resources from the cache, the preload and the sticky stores.
+        @param locationName: The name of the resource location containing the resources.
+        @param filenames: The filenames of the resources.
+        '''
+        def matches(fullPath):
+            return os.path.basename(fullPath) in filenames
+        
+        for key in self.cache.keys():
+            if key[1] == locationName and matches(key[2]):
+                self.cache.remove(key)
+                
+        perLocation = self.preloadStore.get(locationName)
+        if perLocation is not None:
+            for fullPath in perLocation.keys():
+                if matches(fullPath):
+                    del perLocation[fullPath]
+                    
+        for fullPath, stList in self.stickyResources.items():
+            if matches(fullPath):
+                stList = [(res, loc) for res, loc in stList if loc != locationName]
+                if stList:
+                    self.stickyResources[fullPath] = stList
+                else:
+                    del self.stickyResources[fullPath]
+                    
+        # Panda keeps its own pools of textures and models
+        for filename in filenames:
+            entry = self.resourcesIndex.get(PanoConstants.RES_TYPE_TEXTURES, {}).get(filename)
+            if entry is not None and entry[0].name == locationName:
+                tex = TexturePool.findTexture(entry[1])
+                if tex is not None:
+                    tex.reload()
+                    self.reloads += 1
+                    
+            entry = self.resourcesIndex.get(PanoConstants.RES_TYPE_MODELS, {}).get(filename)
+            if entry is not None and entry[0].name == locationName:
+                ModelPool.releaseModel(entry[1])
+            
+    
+    def _peekLoaded(self, resType, filename, locationName):
+        '''
+        Checks if a resource is available in the sticky or the preload stores or in the cache, without
+        affecting any statistics or the state of the stores.
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The full path to the file that contains the resource.
+        @param locationName: The name of the resource location containing the resource.
+        @return: A pano.resources.Resource instance or None if the resource isn't loaded.
+        '''
+        resource = self._getStickyResource(filename, locationName)
+        if resource is None:
+            resource = self.preloadStore.get(locationName, {}).get(filename)
+        if resource is None:
+            entry = self.cache.entries.get((resType, locationName, filename))
+            if entry is not None and entry.isAlive():
+                resource = entry.getData()
+                if not isinstance(resource, Resource):
+                    resource = Resource(self._getResourceName(resType, filename), resource, resType, filename, locationName)
+        return resource
+    
+    
+    def _loadFromLocation(self, resType, filename, fullPath, location):
+        '''
+        Loads a resource from its resource location, bypassing the sticky and preload stores and the cache.
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The filename of the resource.
+        @param fullPath: The full path to the file that contains the resource.
+        @param location: The resource location that contains the resource. 
+        @return: A pano.resources.Resource instance or None if the resource couldn't be loaded.
+        '''
         if ResourcesTypes.isParsedResource(resType):
-            # Convention: construct resource name from the basename of the filename and by dropping the extension.
-            resName = os.path.basename(filename)
-            extIndex = resName.rfind('.')
-            if extIndex >= 0:
-                resName = resName[:extIndex]
-
+            resName = self._getResourceName(resType, filename)
             resData = self._loadParsedResource(resType, resName, fullPath, location)            
 
         else:
@@ -558,7 +1027,14 @@ class ResourceLoader(object):
                     if resType == PanoConstants.RES_TYPE_MODELS:
                         resData = loader.loadModel(fullPath)
 
-                    elif resType == PanoConstants.RES_TYPE_TEXTURES or resType == PanoConstants.RES_TYPE_VIDEOS:
+                    elif resType == PanoConstants.RES_TYPE_TEXTURES:
+                        resData = None
+                        if self.bakedTextures is not None:
+                            resData = self._loadBakedTexture(fullPath, location)
+                        if resData is None:
+                            resData = loader.loadTexture(fullPath)
+                        
+                    elif resType == PanoConstants.RES_TYPE_VIDEOS:
                         resData = loader.loadTexture(fullPath)
                         
                     elif resType == PanoConstants.RES_TYPE_IMAGES:
@@ -603,20 +1079,45 @@ class ResourceLoader(object):
                 return None
 
         resource = Resource(resName, resData, resType, fullPath, location.name)
+        resource.size = self._estimateSize(resType, resData)
         resource.sticky = location.sticky
         resource.preload = location.preload
-        if not preloading:
-            resource.requested = True
+        return resource
 
-        # consider caching the resource
-        if not resource.sticky and not resource.preload:
-            self._cacheResource(fullPath, resource, location.name)
 
-        elif resource.sticky:
-            self._addStickyResource(fullPath, resource, location.name)
-                
-        # when we are preloading, return the Resource instance instead
-        return resource.data if not preloading else resource
+    def _loadBakedTexture(self, filename, location):
+        '''
+        Loads the baked version of a texture.
+        @param filename: The full path to the source file of the texture.
+        @param location: The resource location that contains the texture.
+        @return: A pandac.PandaModules.Texture or None if the texture hasn't been baked or its baked file is stale.
+        '''
+        bakedPath = self.bakedTextures.lookup(filename, location.getResourceStats(filename), 
+                                              lambda: location.getResourceAsByteArray(filename, True))
+        if bakedPath is None:
+            return None
+        
+        try:
+            return loader.loadTexture(Filename.fromOsSpecific(bakedPath))
+        except Exception:
+            self.log.exception('Failed to load baked texture %s, loading its source instead' % bakedPath)
+            return None
+    
+    
+    def _getResourceName(self, resType, filename):
+        '''
+        Constructs the name of a resource from its filename.
+        Convention: the name of parsed resources is the basename of the filename without the extension,
+        for any other resource type it is just the basename of the filename.
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The filename of the resource.
+        '''
+        resName = os.path.basename(filename)
+        if ResourcesTypes.isParsedResource(resType):
+            extIndex = resName.rfind('.')
+            if extIndex >= 0:
+                resName = resName[:extIndex]
+        return resName
 
 
     def _loadParsedResource(self, resType, resName, filename, location):
@@ -632,10 +1133,26 @@ class ResourceLoader(object):
         has been located. 
         '''
         assert resType is not None and resType != PanoConstants.RES_TYPE_ALL, 'invalid resource type in loadGeneric'
-                        
-        fileContents = location.getResourceAsString(filename, True)
+        
+        parser = self.parsers[resType]
+        fileContents = None
+        
+        # the compiled cache returns the contents of the file if it had to read them for validation
+        compiled = self.compiledCache
+        if compiled is not None:
+            stats = location.getResourceStats(filename)
+            version = getattr(parser, 'VERSION', 0)
+            resObj, fileContents = compiled.lookup(resType, filename, stats, version, lambda: location.getResourceAsString(filename, True))
+            if resObj is not None:
+                return resObj
+        
+        if fileContents is None:
+            fileContents = location.getResourceAsString(filename, True)
         resObj = ResourcesTypes.constructParsedResource(resType, resName)
-        resource = self.parsers[resType].parse(resObj, fileContents)
+        resource = parser.parse(resObj, fileContents)
+        
+        if compiled is not None and resource is not None:
+            compiled.store(resType, filename, stats, version, fileContents, resource)
         return resource                    
 
 
@@ -701,49 +1218,109 @@ class ResourceLoader(object):
                 # detect NodePath who have released their models or other previously attached
                 # resources. These are effectively invalid as they are useless, so pretend we
                 # didn't find them.
-                if type(res) == NodePath and res.isEmpty():
+                if isinstance(res.data, NodePath) and res.data.isEmpty():
                     if self.log.isEnabledFor(logging.INFO):
                         self.log.info('preloaded scenegraph resource was invalid, re-loading from file %s' % filename)
+                    del perLocation[filename]
                     return None
                 else:
                     # remove from preload but cache it
                     del perLocation[filename]
-                    self._cacheResource(filename, res, locationName)
-                    res.isRequested = True
+                    self._cacheResource(res)
+                    res.requested = True
                     return res
         else:
             return None
         
 
-    def _cacheResource(self, filename, resource, locationName):
+    def _cacheResource(self, resource):
         '''
-        @param filename: The full path to the file that contains the resource.
+        Caches the given resource according to the caching policy of its type.
         @param resource: The loaded resource, a pano.resources.Resource instance.
-        @param locationName: The name of the resource location containing the resource.
         '''
-        self.cache[filename] = (resource, locationName)
+        policy, ttl = self.getCachePolicy(resource.type)
+        if policy == PanoConstants.CACHE_POLICY_NONE:
+            return
+        
+        key = (resource.type, resource.location, resource.fullPath)
+        if policy == PanoConstants.CACHE_POLICY_WEAK:
+            # only the data can be weakly referenced as nobody else holds a reference to the Resource instance,
+            # the latter will be reconstructed by _cacheLookup
+            self.cache.put(key, resource.data, resource.size, weak = True)
+        elif policy == PanoConstants.CACHE_POLICY_TTL:
+            self.cache.put(key, resource, resource.size, maxAge = ttl)
+        else:
+            self.cache.put(key, resource, resource.size)
+
+
+    def _uncacheResource(self, resType, filename):
+        '''
+        Removes the given resource from the cache.
+        @param resType: A constant that identifies the type of the resource.
+        @param filename: The filename of the resource.
+        '''
+        self.lock.acquire()
+        try:
+            location, fullPath = self._resolveResource(resType, filename)
+            if fullPath is not None:
+                self.cache.remove((resType, location.name, fullPath))
+        finally:
+            self.lock.release()
 
 
-    def _cacheLookup(self, filename, locationName):
+    def _estimateSize(self, resType, data):
         '''
+        Estimates the memory footprint in bytes of the data of a loaded resource. The estimation 
+        is rough and only accounts for the largest consumers like images, textures and strings.
+        @param resType: A constant that identifies the type of the resource.
+        @param data: The loaded resource data.
+        @return: The estimated size in bytes.
+        '''
+        try:
+            if resType == PanoConstants.RES_TYPE_TEXTURES:
+                # baked textures keep their compressed images in memory 
+                if data.hasRamImage():
+                    return data.getRamImageSize()
+                return data.getExpectedRamImageSize()
+            elif resType == PanoConstants.RES_TYPE_IMAGES:
+                return data.getXSize() * data.getYSize() * data.getNumChannels()
+            elif isinstance(data, unicode):
+                return 2 * len(data)
+            elif isinstance(data, str):
+                return len(data)
+        except Exception:
+            self.log.exception('Failed to estimate size of resource data of type %s' % ResourcesTypes.typeToStr(resType))
+        return 0
+
+
+    def _cacheLookup(self, resType, filename, locationName):
+        '''
+        @param resType: A constant that identifies the type of the resource.
         @param filename: The full path to the file that contains the resource.
         @param locationName: The name of the resource location containing the resource.
         @return: A pano.resources.Resource instance or None if the resource couldn't be found.
         '''
-        if self.cache.has_key(filename):        
-            res, locName = self.cache.get(filename)            
-            if res is not None and locName == locationName:
-                # detect NodePath who have released their models or other previously attached
-                # resources. These are effectively invalid as they are useless, so pretend we
-                # didn't fint them.
-                if type(res.data) == NodePath and res.data.isEmpty():
-                    if self.log.isEnabledFor(logging.INFO):
-                        self.log.info('cached scenegraph resource was invalid, ignoring cached instance')
-                    return None
-                else:
-                    return res
-        else:
+        key = (resType, locationName, filename)
+        res = self.cache.get(key)
+        if res is None:
             return None
+        
+        if not isinstance(res, Resource):
+            # weakly cached data
+            data = res
+            res = Resource(self._getResourceName(resType, filename), data, resType, filename, locationName)
+            res.size = self.cache.entries[key].size
+            
+        # detect NodePath who have released their models or other previously attached
+        # resources. These are effectively invalid as they are useless, so pretend we
+        # didn't find them.
+        if isinstance(res.data, NodePath) and res.data.isEmpty():
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info('cached scenegraph resource was invalid, ignoring cached instance')
+            self.cache.remove(key)
+            return None
+        
+        return res
 
 
     def _addStickyResource(self, filename, resource, locationName):
@@ -760,6 +1337,7 @@ class ResourceLoader(object):
                 stList = []
 
             stList.append((resource, locationName))
+            self.stickyResources[filename] = stList
 
 
     def _getStickyResource(self, filename, locationName):
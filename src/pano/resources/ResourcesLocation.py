@@ -21,6 +21,8 @@ THE SOFTWARE.
 
 '''
 
+import os.path
+
 from pano.constants import PanoConstants
 
 class AbstractResourceLocation(object):
@@ -30,7 +32,7 @@ class AbstractResourceLocation(object):
     specific types of resource locations like filesystem folders,
     multifiles, archives, databases, network streams, etc.
     """
-    def __init__(self, name = '', descrption = '', resTypes = PanoConstants.RES_TYPE_ALL, hotswap = True, checkPeriod = 10):
+    def __init__(self, name = '', descrption = '', resTypes = PanoConstants.RES_TYPE_ALL, hotswap = False, checkPeriod = 10):
         self.name = name
         self.desc = descrption
 
@@ -48,7 +50,8 @@ class AbstractResourceLocation(object):
         # loaded during the lifetime of the application
         self.sticky = False
 
-        # if True then the location will be checked for any modified resources
+        # if True then the location will be checked for any modified resources, normally it is set
+        # through startWatching by the pano.resources.ResourcesWatcher when hot-swapping is enabled
         self.hotswap = hotswap
 
         # the period at which the location will be checked for any modifications.
@@ -125,6 +128,15 @@ class AbstractResourceLocation(object):
         """
         return None
 
+    def getResourceStats(self, filename):
+        """
+        Returns the modification time and the size of a resource, they are used for validating
+        compiled resources. Derived classes should implement this function.
+        @param filename: The full path to the resource.
+        @return: A (mtime, size) tuple or None if the information is not available.
+        """
+        return None
+
     def hasChanged(self):
         """
         Returns True if any resources have been modified.
@@ -132,6 +144,40 @@ class AbstractResourceLocation(object):
         to work.
         """
         return False
+    
+    def startWatching(self):
+        """
+        Starts tracking the changes of the resources so that pollChanges can report them.
+        Derived classes that need to acquire system resources for watching, e.g. file handles, should
+        do so here.
+        """
+        self.hotswap = True
+    
+    def stopWatching(self):
+        """
+        Stops tracking the changes of the resources and releases whatever startWatching acquired.
+        """
+        self.hotswap = False
+    
+    def pollChanges(self):
+        """
+        Detects the resources that have been modified, added or removed since the last call or since
+        the location was indexed. It doesn't update the index of the location, this is done by 
+        refreshResources, so that it is safe to call this function from a background thread.
+        Derived classes should implement this function in order for hot-swapping to work.
+        @return: A list with the full paths of the changed resources.
+        """
+        return []
+    
+    def refreshResources(self, paths):
+        """
+        Updates the index of the location for the given resources only, normally these are the paths
+        returned by pollChanges. The default implementation rebuilds the whole index.
+        @param paths: A list with the full paths of the changed resources.
+        @return: A list with the filenames of the resources that should be considered as changed.
+        """
+        self.indexResources()
+        return [os.path.basename(p) for p in paths]
 
     def dispose(self):
         """
@@ -36,12 +36,19 @@ class ResourcesLocationsFactory(object):
     log = logging.getLogger('ResourcesLocationsFactory')
         
         
+    # suffix of directory locations that should be indexed recursively, e.g. data/textures/**
+    RECURSIVE_SUFFIX = '/**'
+        
     def create(locationID, name, resTypes):
         if not type(locationID) == str:
             ResourcesLocationsFactory.log.error('Invalid location identifier, cannot create instance')
         
         if locationID.endswith('.mf'):
             return MultifileResourcesLocation(locationID, name, resTypes)
+        elif locationID.endswith(ResourcesLocationsFactory.RECURSIVE_SUFFIX):
+            directory = locationID[:-len(ResourcesLocationsFactory.RECURSIVE_SUFFIX)]
+            if os.path.exists(directory):
+                return DirectoryResourcesLocation(directory, name, '', resTypes, recursive = True)
         elif os.path.exists(locationID):
             return DirectoryResourcesLocation(locationID, name, '', resTypes)
     
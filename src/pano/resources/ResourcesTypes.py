@@ -39,24 +39,24 @@ class ResourcesTypes:
     A registry of all supported resource types.
     """
     resTypesExtensions = { 
-            PanoConstants.RES_TYPE_NODES : ('.node'),
+            PanoConstants.RES_TYPE_NODES : ('.node',),
             PanoConstants.RES_TYPE_MODELS : ('.egg', '.egg.pz', '.bam' ),
             PanoConstants.RES_TYPE_TEXTURES : ('.jpg', '.bmp', '.tga', '.tif', '.png', '.dds'),
-            PanoConstants.RES_TYPE_FONTS : ('.font'),
-            PanoConstants.RES_TYPE_SOUNDS_DEFS : ('.sound'),
+            PanoConstants.RES_TYPE_FONTS : ('.font',),
+            PanoConstants.RES_TYPE_SOUNDS_DEFS : ('.sound',),
             PanoConstants.RES_TYPE_SFX : ('.wav', '.ogg', '.midi', '.mp3', '.avi', '.mpg', '.mpeg', '.ogm'),
             PanoConstants.RES_TYPE_MUSIC : ('.wav', '.ogg', '.midi', '.mp3', '.avi', '.mpg', '.mpeg', '.ogm'),
-            PanoConstants.RES_TYPE_POINTERS : ('.pointer'),
-            PanoConstants.RES_TYPE_LANGS : ('.lang'),
-            PanoConstants.RES_TYPE_SPRITES : ('.spr'),
-            PanoConstants.RES_TYPE_PLAYLISTS : ('.mpl'),
+            PanoConstants.RES_TYPE_POINTERS : ('.pointer',),
+            PanoConstants.RES_TYPE_LANGS : ('.lang',),
+            PanoConstants.RES_TYPE_SPRITES : ('.spr',),
+            PanoConstants.RES_TYPE_PLAYLISTS : ('.mpl',),
             PanoConstants.RES_TYPE_VIDEOS : ('.wmv', '.flv', '.asf', '.avi', '.mpg', '.ogg', '.ogm', '.mov'),
-            PanoConstants.RES_TYPE_MAPPINGS : ('.mappings'),
-            PanoConstants.RES_TYPE_ITEMS : ('.item'),
-            PanoConstants.RES_TYPE_SCRIPTS : ('.py'),
+            PanoConstants.RES_TYPE_MAPPINGS : ('.mappings',),
+            PanoConstants.RES_TYPE_ITEMS : ('.item',),
+            PanoConstants.RES_TYPE_SCRIPTS : ('.py',),
             PanoConstants.RES_TYPE_TEXTS : ('.txt', '.py'),
-            PanoConstants.RES_TYPE_BINARIES : ('.bin'),
-            PanoConstants.RES_TYPE_SHADERS : ('.sha'),
+            PanoConstants.RES_TYPE_BINARIES : ('.bin',),
+            PanoConstants.RES_TYPE_SHADERS : ('.sha',),
             PanoConstants.RES_TYPE_HMAPS : ('.qmap', '.imap'),            
             PanoConstants.RES_TYPE_IMAGES : ('.jpg', '.bmp', '.tga', '.tif', '.png', '.dds')
     }
@@ -100,7 +100,7 @@ class ResourcesTypes:
         elif resType == PanoConstants.RES_TYPE_ALL:
             all = []
             for val in ResourcesTypes.resTypesExtensions.values():
-                all.append(list(val))
+                all.extend(val)
             return all
         else:
             return None
@@ -116,6 +116,19 @@ class ResourcesTypes:
         else:
             return False
 
+    def getTypesOfFilename(filename, resTypes = None):
+        '''
+        Returns the resource types whose extensions match the extension of the given filename.
+        @param filename: The filename to check.
+        @param resTypes: If not None, then only the resource types contained in this list will be considered.
+        @return: A list of resource types constants, which is empty if no type matched.
+        '''
+        types = []
+        for resType, exts in ResourcesTypes.resTypesExtensions.items():
+            if filename.endswith(exts) and (resTypes is None or resType in resTypes):
+                types.append(resType)
+        return types
+
     def isParsedResource(resType):
         '''
         @param resType: A constant that identifies the resource type.
@@ -211,6 +224,7 @@ class ResourcesTypes:
     typeToStr = staticmethod(typeToStr)
     getExtensions = staticmethod(getExtensions)
     isExtensionOfType = staticmethod(isExtensionOfType)
+    getTypesOfFilename = staticmethod(getTypesOfFilename)
     isPandaResource = staticmethod(isPandaResource)
     isStreamResource = staticmethod(isStreamResource)
     isParsedResource = staticmethod(isParsedResource)
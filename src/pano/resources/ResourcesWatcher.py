@@ -0,0 +1,214 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import time
+import logging
+
+from direct.stdpy import threading
+from direct.task.Task import Task
+from pandac.PandaModules import Thread
+
+from pano.constants import PanoConstants
+from pano.messaging import Messenger
+
+
+class ResourcesWatcher(object):
+    '''
+    Watches the resource locations for modified resources, so that changes to the game's data can be seen
+    without restarting the game. Locations are watched only while hot-swapping is enabled in the configuration,
+    the watcher turns their watching on during initialize and off during dispose.
+    
+    Each location is checked every checkPeriod seconds by calling its pollChanges method, this happens in 
+    a background thread or, if threads are not supported by the Panda build or are disabled, in a task.
+    The changes are then applied on the main thread: ResourceLoader.refreshResources updates the index of the
+    location and invalidates the loaded instances of the changed resources, finally an EVENT_RESOURCES_CHANGED
+    message is sent with the list of the changed resources.
+    '''
+    
+    # the interval in seconds at which the watcher thread wakes up to check if any location is due for a check
+    TICK = 0.5
+    
+    def __init__(self, game):
+        self.log = logging.getLogger('pano.resourcesWatcher')
+        
+        self.game = game
+        
+        self.msn = Messenger(self)
+        
+        self.enabled = False
+        self.running = False
+        self.thread = None
+        self.task = None
+        
+        # guards self.changes and self.running
+        self.cond = threading.Condition()
+        
+        # changes detected by the watcher thread that should be applied by the main thread, 
+        # in (location name, list of full paths) format
+        self.changes = []
+        
+        # the locations whose watching was started by us
+        self.watched = []
+        
+        # the time of the next check for each location, in { location name : time } format
+        self.nextChecks = {}
+        
+        # statistics
+        self.checks = 0
+        self.refreshes = 0
+        
+        
+    def initialize(self):
+        '''
+        Reads the hot-swapping options from the game's configuration and starts watching.
+        '''
+        cfg = self.game.getConfig()
+        self.enabled = cfg.getBool(PanoConstants.CVAR_HOTSWAP_ENABLED, False)
+        if not self.enabled:
+            return
+        
+        self._startWatching(self.game.getResources().locationsByName.values())
+        
+        self.running = True
+        self.task = taskMgr.add(self._hotswapTask, PanoConstants.TASK_HOTSWAP)
+        if cfg.getBool(PanoConstants.CVAR_HOTSWAP_THREADED, True) and Thread.isThreadingSupported():
+            self.thread = threading.Thread(target = self._watchLoop, name = 'resources-watcher')
+            # the thread must not keep the process alive when the game exits without disposing us
+            self.thread.setDaemon(True)
+            self.thread.start()
+            
+            
+    def dispose(self):
+        self.cond.acquire()
+        try:
+            self.running = False
+            self.changes = []
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+            
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+            
+        if self.task is not None:
+            taskMgr.remove(self.task)
+            self.task = None
+            
+        for loc in self.watched:
+            loc.stopWatching()
+        self.watched = []
+            
+            
+    def isEnabled(self):
+        return self.enabled
+    
+    
+    def getStats(self):
+        return {
+            'checks'    : self.checks,
+            'refreshes' : self.refreshes,
+            'pending'   : len(self.changes)
+        }
+        
+        
+    def _checkLocations(self):
+        '''
+        Polls the locations that are due for a check.
+        @return: A list of (location name, list of full paths) tuples for the locations that have changed.
+        '''
+        now = time.time()
+        changes = []
+        locations = self.game.getResources().locationsByName.values()
+        
+        # locations that were added after initialize have to start watching before they can report any changes
+        self._startWatching(locations)
+        
+        for loc in locations:
+            if not loc.hotswap or self.nextChecks.get(loc.name, 0) > now:
+                continue
+            
+            self.nextChecks[loc.name] = now + loc.checkPeriod
+            self.checks += 1
+            try:
+                paths = loc.pollChanges()
+            except Exception:
+                self.log.exception('Failed to check resource location %s for changes' % loc.name)
+                continue
+            
+            if paths:
+                changes.append((loc.name, paths))
+        return changes
+    
+    
+    def _startWatching(self, locations):
+        '''
+        Starts the watching of the given locations, unless we have started it already. 
+        '''
+        for loc in locations:
+            if loc not in self.watched:
+                loc.startWatching()
+                self.watched.append(loc)
+    
+    
+    def _watchLoop(self):
+        while self.running:
+            changes = self._checkLocations()
+            
+            self.cond.acquire()
+            try:
+                self.changes.extend(changes)
+                if self.running:
+                    self.cond.wait(ResourcesWatcher.TICK)
+            finally:
+                self.cond.release()
+                
+                
+    def _hotswapTask(self, task):
+        if self.thread is None:
+            changes = self._checkLocations()
+        else:
+            self.cond.acquire()
+            try:
+                changes = self.changes
+                self.changes = []
+            finally:
+                self.cond.release()
+            
+        for locName, paths in changes:
+            self._applyChanges(locName, paths)
+        return Task.cont
+    
+    
+    def _applyChanges(self, locName, paths):
+        try:
+            changed = self.game.getResources().refreshResources(locName, paths)
+        except Exception:
+            self.log.exception('Failed to refresh resources of location %s' % locName)
+            return
+        
+        if changed:
+            self.refreshes += 1
+            if self.log.isEnabledFor(logging.INFO):
+                self.log.info('Resources changed in location %s: %s' % (locName, ', '.join([f for t, f in changed])))
+            self.msn.sendMessage(PanoConstants.EVENT_RESOURCES_CHANGED, [changed])
@@ -0,0 +1,155 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Bakes the textures of a game into Panda's .txo format with mipmaps and DXT compressed images, which the 
+ResourceLoader then loads instead of the source images, see pano.resources.BakedTexturesCache.
+
+Usage: python -m pano.resources.bake [options] <game directory>
+
+The textures are found by walking the game directory and their paths are recorded relative to it, which 
+matches the paths used by the resource locations of the game as long as it runs from the same directory. 
+The baked textures are written to the directory given by the baked_textures option in the [resources] 
+section of game.cfg, unless overridden by the -o option. Textures whose sources haven't changed since they
+were baked are skipped.
+'''
+
+import os
+import sys
+import logging
+from optparse import OptionParser
+from ConfigParser import SafeConfigParser
+
+from pandac.PandaModules import TexturePool, Filename
+
+from pano.constants import PanoConstants
+from pano.resources.ResourcesTypes import ResourcesTypes
+from pano.resources.BakedTexturesCache import BakedTexturesCache
+
+
+def getBakedDirectory(gameDir):
+    '''
+    @return: The directory of the baked textures as configured in the game.cfg file of the game directory or
+    PanoConstants.DEFAULT_BAKED_TEXTURES_DIR if it is not configured.
+    '''
+    cfgFile = os.path.join(gameDir, 'game.cfg')
+    if os.path.exists(cfgFile):
+        cfg = SafeConfigParser()
+        cfg.read(cfgFile)
+        if cfg.has_option('resources', 'baked_textures'):
+            return cfg.get('resources', 'baked_textures')
+    return PanoConstants.DEFAULT_BAKED_TEXTURES_DIR
+
+
+def bake(gameDir, bakedDir, clean = False, compress = True):
+    '''
+    Bakes all textures found under the game directory.
+    @param gameDir: The game directory.
+    @param bakedDir: The directory of the baked textures, relative to the game directory.
+    @param clean: If True then existing baked textures will be deleted first.
+    @param compress: If False then the baked textures will only contain mipmaps and no compressed images.
+    @return: A (baked, skipped, failed) tuple with the counts of textures.
+    '''
+    log = logging.getLogger('pano.bake')
+    
+    cwd = os.getcwd()
+    os.chdir(gameDir)
+    try:
+        cache = BakedTexturesCache(bakedDir)
+        if clean:
+            cache.clear()
+        
+        baked = 0
+        skipped = 0
+        failed = 0
+        for dirPath, dirNames, filenames in os.walk(os.curdir):
+            # don't descend into the baked textures themselves
+            dirNames[:] = [d for d in dirNames if os.path.normpath(os.path.join(dirPath, d)) != os.path.normpath(bakedDir)]
+            
+            for filename in filenames:
+                if not ResourcesTypes.getTypesOfFilename(filename, [PanoConstants.RES_TYPE_TEXTURES]):
+                    continue
+                
+                path = os.path.normpath(os.path.join(dirPath, filename))
+                try:
+                    if _bakeTexture(cache, path, compress):
+                        baked += 1
+                    else:
+                        skipped += 1
+                except Exception:
+                    log.exception('Failed to bake %s' % path)
+                    failed += 1
+        
+        if not cache.writeIndex():
+            failed += baked
+            baked = 0
+        return (baked, skipped, failed)
+    finally:
+        os.chdir(cwd)
+
+
+def _bakeTexture(cache, path, compress):
+    '''
+    @return: True if the texture was baked or False if its baked file is up to date.
+    '''
+    st = os.stat(path)
+    stats = (st.st_mtime, st.st_size)
+    
+    fp = open(path, 'rb')
+    try:
+        source = fp.read()
+    finally:
+        fp.close()
+        
+    if cache.lookup(path, stats, lambda: source) is not None:
+        return False
+    
+    tex = TexturePool.loadTexture(Filename.fromOsSpecific(path))
+    if tex is None:
+        raise IOError('Panda failed to load the texture')
+    
+    # the baked texture must not be shared with later loads of the source through the pool
+    TexturePool.releaseTexture(tex)
+    if not cache.store(path, stats, source, tex, compress):
+        raise IOError('failed to store the baked texture')
+    return True
+
+
+def main(argv = None):
+    optParser = OptionParser(usage = 'usage: %prog [options] <game directory>')
+    optParser.add_option('-o', '--output', dest = 'bakedDir', help = 'directory for the baked textures, relative to the game directory')
+    optParser.add_option('-c', '--clean', dest = 'clean', action = 'store_true', default = False, help = 'delete existing baked textures first')
+    optParser.add_option('-u', '--uncompressed', dest = 'compress', action = 'store_false', default = True, help = 'generate mipmaps but do not compress the images')
+    options, args = optParser.parse_args(argv)
+    if len(args) != 1 or not os.path.isdir(args[0]):
+        optParser.error('a game directory is required')
+        
+    logging.basicConfig(level = logging.WARNING, format = '%(levelname)s %(message)s')
+    
+    gameDir = args[0]
+    bakedDir = options.bakedDir or getBakedDirectory(gameDir)
+    baked, skipped, failed = bake(gameDir, bakedDir, options.clean, options.compress)
+    print 'Baked %d textures into %s, %d were up to date, %d failed' % (baked, os.path.join(gameDir, bakedDir), skipped, failed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
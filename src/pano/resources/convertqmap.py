@@ -0,0 +1,131 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Converts hotspots maps from the first version of the .qmap format, which held pickled QuadTreeMap instances,
+to the binary format described in pano.model.HotspotsMaps.QuadTreeMap.
+
+Usage: python -m pano.resources.convertqmap [options] <.qmap file or directory>...
+
+Directories are searched recursively for .qmap files. The files are converted in place unless the -o option 
+is given, files that already use the binary format are skipped.
+'''
+
+import os
+import sys
+import shutil
+import logging
+from optparse import OptionParser
+
+from pano.model.HotspotsMaps import QuadTreeMap
+
+
+def isConverted(filename):
+    '''
+    @return: True if the given .qmap file already uses the binary format.
+    '''
+    fp = open(filename, 'rb')
+    try:
+        return fp.read(len(QuadTreeMap.MAGIC)) == QuadTreeMap.MAGIC
+    finally:
+        fp.close()
+        
+
+def convert(filename, output = None, backup = False):
+    '''
+    Converts a .qmap file to the binary format.
+    @param filename: The path of the .qmap file.
+    @param output: The path of the converted file, if None then the file is converted in place.
+    @param backup: If True and the file is converted in place, then the original is kept with a .bak extension.
+    '''
+    name = os.path.splitext(os.path.basename(filename))[0]
+    hmap = QuadTreeMap(name)
+    fp = open(filename, 'rb')
+    try:
+        hmap.read(fp)
+    finally:
+        fp.close()
+        
+    if output is None:
+        output = filename
+        if backup:
+            shutil.copyfile(filename, filename + '.bak')
+            
+    # write to a temporary file first so that a failure doesn't leave a partially written map
+    tmpFile = output + '.tmp'
+    fp = open(tmpFile, 'wb')
+    try:
+        hmap.write(fp)
+    finally:
+        fp.close()
+        
+    if os.path.exists(output):
+        os.remove(output)
+    os.rename(tmpFile, output)
+    
+    
+def findMaps(paths):
+    '''
+    @return: A list of the .qmap files found in the given paths.
+    '''
+    maps = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirPath, dirNames, filenames in os.walk(path):
+                maps.extend([os.path.join(dirPath, f) for f in filenames if f.endswith('.qmap')])
+        else:
+            maps.append(path)
+    return maps
+
+
+def main(argv = None):
+    optParser = OptionParser(usage = 'usage: %prog [options] <.qmap file or directory>...')
+    optParser.add_option('-o', '--output', dest = 'output', help = 'path of the converted file, requires a single input file')
+    optParser.add_option('-b', '--backup', dest = 'backup', action = 'store_true', default = False, help = 'keep the original files with a .bak extension')
+    options, args = optParser.parse_args(argv)
+    if len(args) == 0:
+        optParser.error('at least one .qmap file or directory is required')
+        
+    maps = findMaps(args)
+    if options.output is not None and len(maps) != 1:
+        optParser.error('the -o option requires a single .qmap file')
+        
+    logging.basicConfig(level = logging.WARNING, format = '%(levelname)s %(message)s')
+    log = logging.getLogger('pano.convertqmap')
+    
+    converted = 0
+    failed = 0
+    for filename in maps:
+        try:
+            if options.output is None and isConverted(filename):
+                continue
+            convert(filename, options.output, options.backup)
+            converted += 1
+        except Exception:
+            log.exception('Failed to convert %s' % filename)
+            failed += 1
+            
+    print 'Converted %d hotspots maps, %d failed' % (converted, failed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
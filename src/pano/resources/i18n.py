@@ -54,16 +54,20 @@ class i18n:
         self.setLanguage(self.game.getConfig().get(PanoConstants.CVAR_I18N_LANG))
         res = self.game.getResources()
         
-        translations = res.loadAllLangFiles()
+        self.addTranslations(res.loadAllLangFiles())
+        self.fonts = res.loadAllFonts()        
         
+    def addTranslations(self, translations):
+        '''
+        Adds message bundles to the supported languages.
+        @param translations: A list of LangFile instances.
+        '''
         for t in translations:
             self.supportedLanguages.add(t.getLanguage())
             if not self.messageBundles.has_key(t.getLanguage()):
                 self.messageBundles[t.getLanguage()] = {}
                 
             self.messageBundles[t.getLanguage()][t.getName()] = t
-                
-        self.fonts = res.loadAllFonts()        
 
     def getLanguage(self):
         return self.__language
@@ -30,6 +30,7 @@ from pano.constants import PanoConstants
 from pano.errors.ParseException import ParseException
 
 class ActionMappingsParser():
+    VERSION = 1
     
     def __init__(self):
         self.log = logging.getLogger('pano.mappingsParser')
@@ -29,6 +29,8 @@ from pano.constants import PanoConstants
 from pano.errors.ParseException import ParseException
 
 class FontParser:
+    VERSION = 1
+    
     def __init__(self):
         self.log = logging.getLogger('pano.fontParser')
     
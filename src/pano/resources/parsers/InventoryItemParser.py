@@ -33,6 +33,8 @@ class InventoryItemParser:
     Parses .item resources which describe the properties of inventory items.
     """
     
+    VERSION = 1
+    
     # constants for the section and options names
     ITEM_SECTION = "item"
     SOUND_OPTION = "sound"
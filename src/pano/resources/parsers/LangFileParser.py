@@ -29,6 +29,7 @@ from pano.constants import PanoConstants
 from pano.errors.ParseException import ParseException
 
 class LangFileParser():
+    VERSION = 1
     
     def __init__(self):
         self.log = logging.getLogger('pano.langParser')
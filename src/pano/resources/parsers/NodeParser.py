@@ -31,6 +31,7 @@ from pano.model.Node import Node
 from pano.model.Hotspot import Hotspot
 
 class NodeParser:
+    VERSION = 2
     
     NODE_SECTION            = 'Node'
     NODE_OPT_DESC           = 'description'
@@ -38,6 +39,7 @@ class NodeParser:
     NODE_OPT_IMAGE          = 'image'
     NODE_OPT_BGCOLOR        = 'bg_color'
     NODE_OPT_EXTENSION      = 'extension'
+    NODE_OPT_TILE_LEVELS    = 'tile_levels'
     NODE_OPT_SCRIPT         = 'script'
     NODE_OPT_LOOKAT         = 'lookat'
     NODE_OPT_PARENT         = 'parent2d'
@@ -105,6 +107,10 @@ class NodeParser:
                 
             if cfg.has_option(NodeParser.NODE_SECTION, NodeParser.NODE_OPT_EXTENSION):
                 node.extension = cfg.get(NodeParser.NODE_SECTION, NodeParser.NODE_OPT_EXTENSION)
+                
+            if cfg.has_option(NodeParser.NODE_SECTION, NodeParser.NODE_OPT_TILE_LEVELS):
+                node.tileLevels = cfg.getint(NodeParser.NODE_SECTION, NodeParser.NODE_OPT_TILE_LEVELS)
+                assert node.tileLevels > 0, 'tile_levels must be positive'
 
             if cfg.has_option(NodeParser.NODE_SECTION, NodeParser.NODE_OPT_PARENT):
                 parent = cfg.get(NodeParser.NODE_SECTION, NodeParser.NODE_OPT_PARENT)
@@ -29,6 +29,7 @@ from pano.constants import PanoConstants
 from pano.errors.ParseException import ParseException
 
 class PlaylistParser:
+    VERSION = 1
     
     TRACKS_SECTIONS = "tracks"
     OPTIONS_SECTIONS = "options"
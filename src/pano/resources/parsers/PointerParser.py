@@ -42,6 +42,8 @@ class PointerParser:
     should be enabled. Boolean value that specifies if alpha should be enabled.
     """
     
+    VERSION = 1
+    
     MODEL_FILE_OPTION = 'model_file'
     TEXTURE_OPTION = 'texture'
     ALPHA_OPTION = 'enable_alpha'
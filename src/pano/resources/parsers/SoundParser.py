@@ -31,6 +31,7 @@ from pano.model.Sound import *
 
 
 class SoundParser:
+    VERSION = 1
     
     SOUND_SECTION      = 'sound'
     SOUND_OPT_FILENAME = 'filename'
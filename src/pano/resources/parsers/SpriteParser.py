@@ -29,6 +29,7 @@ from pano.constants import PanoConstants
 from pano.errors.ParseException import ParseException
 
 class SpriteParser:
+    VERSION = 1
     
     SPRITE_SECTION      = 'sprite'
     SPRITE_OPT_EGGFILE  = 'egg_file'
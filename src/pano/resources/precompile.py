@@ -0,0 +1,136 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+
+Compiles the parsed resources of a game (nodes, items, sprites, pointers, etc.) in order to skip their parsing
+when the game starts, see pano.resources.CompiledResourcesCache.
+
+Usage: python -m pano.resources.precompile [options] <game directory>
+
+The resources are found by walking the game directory and their paths are recorded relative to it, which 
+matches the paths used by the resource locations of the game as long as it runs from the same directory. 
+The compiled resources are written to the directory given by the compiled_cache option in the [resources] 
+section of game.cfg, unless overridden by the -o option.
+'''
+
+import os
+import sys
+import codecs
+import logging
+from optparse import OptionParser
+from ConfigParser import SafeConfigParser
+
+from pano.constants import PanoConstants
+from pano.resources.ResourceLoader import ResourceLoader
+from pano.resources.ResourcesTypes import ResourcesTypes
+
+
+def getCacheDirectory(gameDir):
+    '''
+    @return: The directory of the compiled cache as configured in the game.cfg file of the game directory or
+    PanoConstants.DEFAULT_COMPILED_CACHE_DIR if it is not configured.
+    '''
+    cfgFile = os.path.join(gameDir, 'game.cfg')
+    if os.path.exists(cfgFile):
+        cfg = SafeConfigParser()
+        cfg.read(cfgFile)
+        if cfg.has_option('resources', 'compiled_cache'):
+            return cfg.get('resources', 'compiled_cache')
+    return PanoConstants.DEFAULT_COMPILED_CACHE_DIR
+
+
+def precompile(gameDir, cacheDir, clean = False):
+    '''
+    Compiles all parsed resources found under the game directory.
+    @param gameDir: The game directory.
+    @param cacheDir: The directory of the compiled cache, relative to the game directory.
+    @param clean: If True then existing compiled resources will be deleted first.
+    @return: A (compiled, failed) tuple with the counts of resources.
+    '''
+    log = logging.getLogger('pano.precompile')
+    
+    cwd = os.getcwd()
+    os.chdir(gameDir)
+    try:
+        loader = ResourceLoader()
+        loader.enableCompiledCache(cacheDir)
+        cache = loader.getCompiledCache()
+        if clean:
+            cache.clear()
+        
+        parsedTypes = [t for t in ResourcesTypes.listAllTypes() if ResourcesTypes.isParsedResource(t)]
+        compiled = 0
+        failed = 0
+        for dirPath, dirNames, filenames in os.walk(os.curdir):
+            # don't descend into the cache itself
+            dirNames[:] = [d for d in dirNames if os.path.normpath(os.path.join(dirPath, d)) != os.path.normpath(cacheDir)]
+            
+            for filename in filenames:
+                for resType in ResourcesTypes.getTypesOfFilename(filename, parsedTypes):
+                    path = os.path.normpath(os.path.join(dirPath, filename))
+                    try:
+                        _compileResource(loader, resType, path)
+                        compiled += 1
+                    except Exception:
+                        log.exception('Failed to compile %s' % path)
+                        failed += 1
+        return (compiled, failed)
+    finally:
+        os.chdir(cwd)
+
+
+def _compileResource(loader, resType, path):
+    fp = codecs.open(path, 'r', 'utf-8')
+    try:
+        contents = fp.read()
+    finally:
+        fp.close()
+    
+    st = os.stat(path)
+    parser = loader.getParser(resType)
+    resName = os.path.splitext(os.path.basename(path))[0]
+    resObj = parser.parse(ResourcesTypes.constructParsedResource(resType, resName), contents)
+    if resObj is None:
+        raise ValueError('parser returned no resource')
+    
+    if not loader.getCompiledCache().store(resType, path, (st.st_mtime, st.st_size), getattr(parser, 'VERSION', 0), contents, resObj):
+        raise IOError('failed to store the compiled resource')
+
+
+def main(argv = None):
+    optParser = OptionParser(usage = 'usage: %prog [options] <game directory>')
+    optParser.add_option('-o', '--output', dest = 'cacheDir', help = 'directory for the compiled resources, relative to the game directory')
+    optParser.add_option('-c', '--clean', dest = 'clean', action = 'store_true', default = False, help = 'delete existing compiled resources first')
+    options, args = optParser.parse_args(argv)
+    if len(args) != 1 or not os.path.isdir(args[0]):
+        optParser.error('a game directory is required')
+        
+    logging.basicConfig(level = logging.WARNING, format = '%(levelname)s %(message)s')
+    
+    gameDir = args[0]
+    cacheDir = options.cacheDir or getCacheDirectory(gameDir)
+    compiled, failed = precompile(gameDir, cacheDir, options.clean)
+    print 'Compiled %d resources into %s, %d failed' % (compiled, os.path.join(gameDir, cacheDir), failed)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
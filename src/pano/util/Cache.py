@@ -22,59 +22,109 @@ THE SOFTWARE.
 '''
 
 import time
-import math
 import weakref
 
-# This cache implementation is heavily based on the cache implementation found in PyQLogger's Cache.py module.
+# This cache implementation was originally based on the cache implementation found in PyQLogger's Cache.py module.
 # For more info: http://pyqlogger.berlios.de/
+# It has since been rewritten around a doubly linked recency list which makes lookups, insertions and evictions
+# constant time operations.
 
 class CacheItem(object):
     '''
-    Represents a cached item. It is linked to the actual data through a weak reference.
+    Represents a cached item. Items are chained in a circular doubly linked list that keeps them ordered
+    by recency of use, see Cache for details.
     '''
-    def __init__(self, name, data):
+    def __init__(self, name, data, size = 0, weak = False, maxAge = None):
         '''
         @param name: The name of the item matches the respective key in the cache.
         @param data: The actual data.
+        @param size: The estimated size of the data in bytes.
+        @param weak: If True the data will be linked through a weak reference, if possible.
+        @param maxAge: Time in seconds before this item expires, if None the cache's maxAge applies.
         '''
         self.name = name
-        self.setData(data)        
+        self.size = size
+        self.maxAge = maxAge
+        self.prev = None
+        self.next = None
         self.accessTime = 0
-        self.modTime = time.time()
+        self.setData(data, weak)
 
     def getData(self):
         self.accessTime = time.time()
-        return self.data() if type(self.data) == weakref else self.data
+        return self.data() if self.weak else self.data
 
-    def setData(self, data):
+    def setData(self, data, weak = False):
         self.modTime = time.time()
-        try:
-            # try to link through a weak reference, if it fails then link directly
-            self.data = weakref.ref(data)
-        except TypeError:
-            self.data = data
+        self.weak = False
+        if weak:
+            try:
+                # try to link through a weak reference, if it fails then link directly
+                self.data = weakref.ref(data)
+                self.weak = True
+                return
+            except TypeError:
+                pass
+        self.data = data
+
+    def isAlive(self):
+        '''
+        @return: False if the data were weakly referenced and have since been garbage collected.
+        '''
+        return not self.weak or self.data() is not None
 
 
-class Cache(dict):
+class Cache(object):
     '''
     Implements a cache that incorporates the LRU eviction strategy.
 
-    Note: the data inserted in the cache are only weakly referenced therefore you must be prepared
-    to deal with None return values.
+    Items are kept in a circular doubly linked list ordered by recency of use, the item that follows the
+    sentinel is the most recently used and the one that precedes it is the least recently used. Together with
+    a dictionary that maps keys to list items, this allows get and put operations to run in constant time.
+
+    The cache is bounded by both the number of items it contains and, optionally, by the total estimated size
+    in bytes of the items. When any of the two limits is exceeded, the least recently used items are evicted
+    one at a time until the cache fits again.
+
+    Note: if the cache has been created with weakRefs=True then the data are only weakly referenced (if that is
+    possible for their type), in which case the data can be garbage collected at any time and lookups will
+    simply miss.
     '''
-    def __init__(self, name, size=128, maxAge = 60*60):
+    def __init__(self, name, size=128, maxAge = 60*60, maxBytes = 0, sizeOf = None, weakRefs = False):
         '''
         @param name: A name that identifies this cache instance.
         @param size: Defines the size of the cache, i.e. the maximum count of items that it can contain.
-        @param maxAge: Time in seconds before an item expires.
+        A value of 0 means that the count of items is not bounded.
+        @param maxAge: Time in seconds before an item expires. A value of 0 or None means that items never expire.
+        @param maxBytes: The maximum total size in bytes of all cached items. A value of 0 means that the
+        size in bytes is not bounded.
+        @param sizeOf: A callable that returns the estimated size in bytes of a value, it is used whenever
+        an item is inserted without an explicit size. If it is None, such items are considered to have a zero size.
+        @param weakRefs: If True then the cached data will be stored through weak references.
         '''
-        self.items = {}
+        self.name = name
         self.size = size
         self.maxAge = maxAge
+        self.maxBytes = maxBytes
+        self.sizeOf = sizeOf
+        self.weakRefs = weakRefs
+
+        # maps keys to CacheItem instances
+        self.entries = {}
+
+        # sentinel of the recency list, head.next is the most recently used item and head.prev the least recently used
+        self.head = CacheItem(None, None)
+        self.head.prev = self.head
+        self.head.next = self.head
+
+        # the total size in bytes of all cached items
+        self.bytes = 0
 
         self.insertions = 0
         self.requests = 0
         self.hits = 0
+        self.evictions = 0
+        self.expirations = 0
         self.purges = 0
 
 
@@ -86,36 +136,93 @@ class Cache(dict):
         self.name = value
 
 
-    def __setitem__(self, key, value):
-        self.insertions += 1
+    def __len__(self):
+        return len(self.entries)
 
-        if (key not in self and self.size and len(self) >= self.size):
-            self._evictLRU()
 
-        dict.__setitem__(self, key, CacheItem(key, value))
+    def __contains__(self, key):
+        return self.has_key(key)
+
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
 
 
     def __getitem__(self, key):
         self.requests += 1
-        item = dict.__getitem__(self, key)
+        item = self.entries[key]
         if self._hasExpired(item):
-            del self[key]
-            return None
-        else:
-            self.hits = self.hits + 1
-            return item.getData()
+            self.expirations += 1
+            self._removeItem(item)
+            raise KeyError(key)
 
+        data = item.getData()
+        if data is None and item.weak:
+            # the data were garbage collected
+            self._removeItem(item)
+            raise KeyError(key)
 
-    def has_key(self, key):
-        try:
-            item = dict.__getitem__(self, key)
-        except (KeyError):
-            return False
+        self.hits += 1
+        self._moveToFront(item)
+        return data
 
-        if self._hasExpired(item):
+
+    def __delitem__(self, key):
+        self._removeItem(self.entries[key])
+
+
+    def put(self, key, value, size = None, weak = None, maxAge = None):
+        '''
+        Inserts or replaces an item in the cache and marks it as the most recently used item.
+        If the item on its own exceeds the byte budget of the cache, then it won't be cached at all.
+        @param key: The key of the item.
+        @param value: The data to cache.
+        @param size: The estimated size of the data in bytes, if it is None then the sizeOf callable
+        provided at construction time will be used to calculate it.
+        @param weak: Overrides the weakRefs setting of the cache for this item. 
+        @param maxAge: Overrides the maxAge setting of the cache for this item.
+        @return: True if the item was cached and False otherwise.
+        '''
+        if size is None:
+            size = self.sizeOf(value) if self.sizeOf is not None else 0
+
+        old = self.entries.get(key)
+        if old is not None:
+            self._removeItem(old)
+
+        if self.maxBytes and size > self.maxBytes:
             return False
-        else:
+
+        self.insertions += 1
+        item = CacheItem(key, value, size, self.weakRefs if weak is None else weak, maxAge)
+        self.entries[key] = item
+        self.bytes += size
+        self._linkFront(item)
+        self._evictLRU()
+        return True
+
+
+    def remove(self, key):
+        '''
+        Removes the item with the given key from the cache, if it exists.
+        @return: True if an item was removed and False otherwise.
+        '''
+        item = self.entries.get(key)
+        if item is not None:
+            self._removeItem(item)
             return True
+        return False
+
+
+    def has_key(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            return False
+        return not self._hasExpired(item) and item.isAlive()
 
 
     def get(self, key, default=None):
@@ -125,51 +232,108 @@ class Cache(dict):
             return default
 
 
+    def keys(self):
+        '''
+        @return: A list of all keys in the cache, ordered from the most to the least recently used.
+        '''
+        keys = []
+        item = self.head.next
+        while item is not self.head:
+            keys.append(item.name)
+            item = item.next
+        return keys
+
+
     def values(self):
         '''
-        @return: A list of all the data stored in the cache.
+        @return: A list of all the data stored in the cache, ordered from the most to the least recently used.
+        Note that the recency of the items is not affected.
         '''
-        return [dict.__getitem__(self, key).getData() for key in self]
+        return [v for k, v in self.items()]
 
 
     def items(self):
         '''
         @return: A list of tuples, where each tuple contains a key and its respective value in the cache.
+        Note that the recency of the items is not affected.
         '''
-        return map(None, self.keys(), self.values())
+        items = []
+        item = self.head.next
+        while item is not self.head:
+            items.append((item.name, item.data() if item.weak else item.data))
+            item = item.next
+        return items
+
 
     def purge(self):
         '''
         Clears the cache.
         '''
         self.purges += 1
-        dict.clear()
+        self.entries.clear()
+        self.head.prev = self.head
+        self.head.next = self.head
+        self.bytes = 0
+
 
     def getStats(self):
         '''
         @return: A dictionary filled with statistics about the usage of this cache.
         '''
         return {
-            'maxSize'    : self.size,
-            'size'       : len(self),
-            'insertions' : self.insertions,
-            'requests'   : self.requests,
-            'hits'       : self.hits,
-            'misses'     : self.requests - self.hits,
-            'purges'     : self.purges
+            'maxSize'     : self.size,
+            'size'        : len(self),
+            'maxBytes'    : self.maxBytes,
+            'bytes'       : self.bytes,
+            'insertions'  : self.insertions,
+            'requests'    : self.requests,
+            'hits'        : self.hits,
+            'misses'      : self.requests - self.hits,
+            'evictions'   : self.evictions,
+            'expirations' : self.expirations,
+            'purges'      : self.purges
         }
 
+
     def _hasExpired(self, item):
-        return (time.time() - item.modTime) > self.maxAge
+        maxAge = item.maxAge if item.maxAge is not None else self.maxAge
+        return maxAge and (time.time() - item.modTime) > maxAge
+
 
+    def _isOverBudget(self):
+        return (self.size and len(self.entries) > self.size) or (self.maxBytes and self.bytes > self.maxBytes)
 
-    def _getEvictSize(self):
-        return math.floor(0.9*self.size)
 
     def _evictLRU(self):
-        l = [(item.accessTime, item) for item in self.values()]
-        l.sort()   # lru items appear first in the list
-        for i in xrange(self._getEvictSize()):
-            del self[ l[i][1].name ]
+        '''
+        Evicts the least recently used items, one at a time, until the cache is within its budget again.
+        '''
+        while self._isOverBudget() and self.head.prev is not self.head:
+            self.evictions += 1
+            self._removeItem(self.head.prev)
+
+
+    def _linkFront(self, item):
+        item.prev = self.head
+        item.next = self.head.next
+        self.head.next.prev = item
+        self.head.next = item
+
+
+    def _unlink(self, item):
+        item.prev.next = item.next
+        item.next.prev = item.prev
+        item.prev = None
+        item.next = None
+
+
+    def _moveToFront(self, item):
+        if self.head.next is not item:
+            self._unlink(item)
+            self._linkFront(item)
 
 
+    def _removeItem(self, item):
+        self._unlink(item)
+        del self.entries[item.name]
+        self.bytes -= item.size
@@ -0,0 +1,152 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import os
+import sys
+import struct
+import select
+import logging
+
+try:
+    import ctypes
+    import ctypes.util
+except ImportError:
+    ctypes = None
+
+
+class INotify(object):
+    '''
+    A minimal wrapper around the inotify API of the Linux kernel, it is accessed through ctypes so that no
+    extension modules are required.
+    
+    Events are read without blocking by readEvents, which returns them as (watch descriptor, mask, name) tuples.
+    Use INotify.isSupported to test if inotify is available on this platform before creating instances.
+    '''
+    
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW  = 0x00004000
+    IN_IGNORED     = 0x00008000
+    IN_ISDIR       = 0x40000000
+    
+    # events that indicate that the contents of a directory have changed
+    CHANGE_EVENTS = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    
+    # struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+    EVENT_HEADER = 'iIII'
+    EVENT_HEADER_SIZE = struct.calcsize(EVENT_HEADER)
+    
+    READ_SIZE = 64 * 1024
+    
+    _libc = None
+    
+    def __init__(self):
+        self.log = logging.getLogger('pano.inotify')
+        
+        libc = INotify._getLibc()
+        if libc is None:
+            raise OSError('inotify is not supported on this platform')
+        
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError('inotify_init failed')
+        
+        
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            
+            
+    def addWatch(self, path, mask = CHANGE_EVENTS):
+        '''
+        Starts watching the given path for events.
+        @param path: The path of a file or directory.
+        @param mask: The events to watch for, defaults to INotify.CHANGE_EVENTS.
+        @return: The watch descriptor or -1 if the watch couldn't be added.
+        '''
+        if isinstance(path, unicode):
+            path = path.encode(sys.getfilesystemencoding() or 'utf-8')
+        wd = INotify._getLibc().inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            self.log.warning('Failed to watch %s' % path)
+        return wd
+    
+    
+    def removeWatch(self, wd):
+        INotify._getLibc().inotify_rm_watch(self.fd, wd)
+        
+        
+    def readEvents(self):
+        '''
+        Reads all pending events without blocking.
+        @return: A list of (watch descriptor, mask, name) tuples, name is empty for events that concern the 
+        watched path itself.
+        '''
+        events = []
+        while self.fd >= 0:
+            readable = select.select([self.fd], [], [], 0)[0]
+            if not readable:
+                break
+            
+            buf = os.read(self.fd, INotify.READ_SIZE)
+            if not buf:
+                break
+            
+            offset = 0
+            while offset + INotify.EVENT_HEADER_SIZE <= len(buf):
+                wd, mask, cookie, nameLen = struct.unpack_from(INotify.EVENT_HEADER, buf, offset)
+                offset += INotify.EVENT_HEADER_SIZE
+                name = buf[offset : offset + nameLen].rstrip('\0')
+                offset += nameLen
+                events.append((wd, mask, name))
+        return events
+    
+    
+    def isSupported():
+        '''
+        @return: True if inotify can be used on this platform.
+        '''
+        return INotify._getLibc() is not None
+    
+    
+    def _getLibc():
+        if INotify._libc is None:
+            INotify._libc = False
+            if ctypes is not None and sys.platform.startswith('linux'):
+                try:
+                    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+                    if hasattr(libc, 'inotify_init') and hasattr(libc, 'inotify_add_watch'):
+                        INotify._libc = libc
+                except OSError:
+                    pass
+        return INotify._libc or None
+    
+    isSupported = staticmethod(isSupported)
+    _getLibc = staticmethod(_getLibc)
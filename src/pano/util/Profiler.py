@@ -0,0 +1,218 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+from pandac.PandaModules import ClockObject
+from direct.stdpy import threading
+
+
+class ProfilerTimer(object):
+    '''
+    Keeps the most recent samples of a timer in a ring buffer along with counters over all samples.
+    '''
+    def __init__(self, name, window):
+        self.name = name
+        self.window = window
+        
+        # the samples in milliseconds, once full the oldest sample is overwritten
+        self.samples = []
+        self.next = 0
+        
+        # totals since the last reset
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        
+        
+    def add(self, ms):
+        if len(self.samples) < self.window:
+            self.samples.append(ms)
+        else:
+            self.samples[self.next] = ms
+            self.next = (self.next + 1) % self.window
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+            
+            
+    def getPercentile(self, sortedSamples, p):
+        if not sortedSamples:
+            return 0.0
+        i = int(round(p / 100.0 * (len(sortedSamples) - 1)))
+        return sortedSamples[i]
+    
+    
+    def getStats(self):
+        '''
+        @return: A dictionary with the percentiles 50, 95 and 99 and the mean of the recent samples and with 
+        the number of samples and the maximum since the last reset.
+        '''
+        s = sorted(self.samples)
+        return {
+            'count' : self.count,
+            'mean'  : sum(s) / len(s) if s else 0.0,
+            'p50'   : self.getPercentile(s, 50),
+            'p95'   : self.getPercentile(s, 95),
+            'p99'   : self.getPercentile(s, 99),
+            'max'   : self.max
+        }
+        
+        
+class _ProfilerScope(object):
+    '''
+    Times the block of a with statement.
+    '''
+    __slots__ = ('profiler', 'name', 'start')
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+        
+    def __enter__(self):
+        self.start = self.profiler.clock.getRealTime()
+        return self
+    
+    def __exit__(self, excType, excValue, tb):
+        self.profiler.addSample(self.name, (self.profiler.clock.getRealTime() - self.start) * 1000.0)
+        return False
+    
+    
+class _NullScope(object):
+    '''
+    The scope that is used while the profiler is disabled.
+    '''
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, excType, excValue, tb):
+        return False
+    
+    
+class FrameProfiler(object):
+    '''
+    Collects timings of the subsystems of the game, e.g. the update of the game states or the loading of resources, 
+    in order to find out which ones exceed the frame budget. 
+    
+    Code is timed by wrapping it in a with statement:
+        with profiler.scope('fsm'):
+            self.fsm.update(millis)
+            
+    Each timer keeps a window of its most recent samples from which percentiles are calculated, see ProfilerTimer. 
+    Samples can be added from any thread. While the profiler is disabled, scope() returns a scope that does nothing.
+    '''
+    
+    def __init__(self, window = 300):
+        '''
+        @param window: The number of recent samples of each timer that are used to calculate the percentiles. 
+        '''
+        self.enabled = False
+        self.window = window
+        self.clock = ClockObject.getGlobalClock()
+        
+        # ProfilerTimer instances indexed by name
+        self.timers = {}
+        
+        # samples can be added by the threads that load resources in the background
+        self.lock = threading.Lock()
+        
+        self.nullScope = _NullScope()
+        
+        
+    def enable(self):
+        self.enabled = True
+        
+        
+    def disable(self):
+        self.enabled = False
+        
+        
+    def isEnabled(self):
+        return self.enabled
+    
+    
+    def scope(self, name):
+        '''
+        @return: An object to use in a with statement which times the statement's block under the given timer name.
+        '''
+        if self.enabled:
+            return _ProfilerScope(self, name)
+        return self.nullScope
+    
+    
+    def addSample(self, name, ms):
+        '''
+        Adds a sample to a timer, the timer is created if it doesn't exist.
+        @param name: The name of the timer.
+        @param ms: The sample in milliseconds.
+        '''
+        if not self.enabled:
+            return
+        self.lock.acquire()
+        try:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = ProfilerTimer(name, self.window)
+                self.timers[name] = timer
+            timer.add(ms)
+        finally:
+            self.lock.release()
+            
+            
+    def reset(self):
+        '''
+        Discards all samples.
+        '''
+        self.lock.acquire()
+        try:
+            self.timers = {}
+        finally:
+            self.lock.release()
+            
+            
+    def getStats(self):
+        '''
+        @return: A dictionary with the statistics of each timer indexed by the timer's name, see ProfilerTimer.getStats.
+        '''
+        self.lock.acquire()
+        try:
+            timers = self.timers.values()
+        finally:
+            self.lock.release()
+        stats = {}
+        for t in timers:
+            stats[t.name] = t.getStats()
+        return stats
+    
+    
+    def dump(self):
+        '''
+        @return: A text table with the statistics of the timers sorted by name.
+        '''
+        lines = ['%-24s %8s %8s %8s %8s %8s %8s' % ('timer', 'count', 'mean', 'p50', 'p95', 'p99', 'max')]
+        stats = self.getStats()
+        for name in sorted(stats.keys()):
+            s = stats[name]
+            lines.append('%-24s %8i %8.2f %8.2f %8.2f %8.2f %8.2f' % 
+                         (name, s['count'], s['mean'], s['p50'], s['p95'], s['p99'], s['max']))
+        return '\n'.join(lines)
@@ -0,0 +1,170 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+import logging
+
+from pandac.PandaModules import Texture, PNMImage, CardMaker
+from pandac.PandaModules import Point2
+
+# textures can opt out of the power of 2 rescaling only since Panda 1.8
+try:
+    from pandac.PandaModules import ATSNone
+except ImportError:
+    ATSNone = None
+
+from pano.constants import PanoConstants
+
+
+class CubemapAtlas:
+    '''
+    Renders the six faces of a cubemap with a single geom that is textured with a 4x2 atlas of the faces' images,
+    instead of six geoms with a texture each. This takes one draw call and one texture bind per frame instead of six.
+    
+    The atlas holds the front, right and back faces in its top row and the left, top and bottom faces in its bottom
+    row, while the last column is left empty so that the atlas has power of 2 dimensions when the faces do, otherwise
+    the atlas would be rescaled and the faces would lose resolution. All faces must have the same dimensions. 
+    Mipmapping is disabled and the texture coordinates are inset by half a texel so that the faces don't bleed into 
+    their neighbours in the atlas.
+    '''
+    
+    # the dimensions of the atlas in faces
+    COLUMNS = 4
+    ROWS = 2
+    
+    # the column and row of each face in the atlas, indexed by the face constant
+    LAYOUT = {
+              PanoConstants.CBM_FRONT_FACE  : (0, 0),
+              PanoConstants.CBM_RIGHT_FACE  : (1, 0),
+              PanoConstants.CBM_BACK_FACE   : (2, 0),
+              PanoConstants.CBM_LEFT_FACE   : (0, 1),
+              PanoConstants.CBM_TOP_FACE    : (1, 1),
+              PanoConstants.CBM_BOTTOM_FACE : (2, 1)
+    }
+    
+    def __init__(self, renderer):
+        '''
+        @param renderer: The pano.view.NodeRenderer that displays the cubemap.
+        '''
+        self.log = logging.getLogger('pano.cubemapAtlas')
+        
+        self.renderer = renderer
+        
+        # the geom of the cube, None if the atlas isn't used for the current node
+        self.cube = None
+        
+        # the texture of the atlas
+        self.texture = None
+        
+        # the dimensions of each face in the atlas
+        self.faceDims = (0, 0)
+        
+        
+    def isActive(self):
+        return self.cube is not None
+    
+    
+    def getFaceDimensions(self, face):
+        '''
+        @return: A (width, height) tuple with the dimensions of the faces in the atlas texture.
+        '''
+        return self.faceDims
+    
+    
+    def build(self, textures):
+        '''
+        Copies the images of the faces in an atlas and creates the cube's geom that displays it.
+        @param textures: A dictionary with the texture of each face, indexed by the face constant.
+        @return: True if the atlas was built or False if the faces can't be packed in an atlas, in which case they 
+        have to be displayed separately.
+        '''
+        self.clear()
+        
+        front = textures[PanoConstants.CBM_FRONT_FACE]
+        w, h = front.getXSize(), front.getYSize()
+        atlasImg = PNMImage(CubemapAtlas.COLUMNS * w, CubemapAtlas.ROWS * h)
+        img = PNMImage()
+        for face, tex in textures.items():
+            if tex.getXSize() != w or tex.getYSize() != h:
+                self.log.warning('The faces of the cubemap have different dimensions, the atlas will not be used')
+                return False
+            if not tex.store(img):
+                self.log.error('Failed to read the image of texture %s' % tex.getName())
+                return False
+            col, row = CubemapAtlas.LAYOUT[face]
+            atlasImg.copySubImage(img, col * w, row * h, 0, 0, w, h)
+            
+        self.texture = Texture('cubemap_atlas')
+        if ATSNone is not None:
+            self.texture.setAutoTextureScale(ATSNone)
+        if not self.texture.load(atlasImg):
+            self.log.error('Failed to load the atlas of the cubemap')
+            self.texture = None
+            return False
+        self.texture.setMinfilter(Texture.FTLinear)
+        self.texture.setMagfilter(Texture.FTLinear)
+        self.texture.setWrapU(Texture.WMClamp)
+        self.texture.setWrapV(Texture.WMClamp)
+        
+        # older versions of Panda will still rescale atlases of faces that don't have power of 2 dimensions
+        self.faceDims = (self.texture.getXSize() / CubemapAtlas.COLUMNS, self.texture.getYSize() / CubemapAtlas.ROWS)
+        if self.faceDims != (w, h):
+            self.log.warning('The atlas of the cubemap was rescaled, its faces are %dx%d instead of %dx%d' % (self.faceDims + (w, h)))
+        
+        self.cube = self.renderer.getSceneRoot().attachNewNode('cubemap_atlas')
+        self.cube.setDepthWrite(False)
+        self.cube.setDepthTest(False)
+        self.cube.setTwoSided(True)
+        self.cube.setBin('fixed', PanoConstants.RENDER_ORDER_CUBEMAP)
+        
+        # creates a card for each face, the cards are then flattened into a single geom since they share their state 
+        du, dv = 0.5 / self.faceDims[0], 0.5 / self.faceDims[1]
+        cols, rows = float(CubemapAtlas.COLUMNS), float(CubemapAtlas.ROWS)
+        cm = CardMaker('atlas_face')
+        for face, (col, row) in CubemapAtlas.LAYOUT.items():
+            toWorld = self.renderer.getWorldPointFromFacePoint
+            cm.setFrame(toWorld(face, (0.0, 1.0)), toWorld(face, (1.0, 1.0)), toWorld(face, (1.0, 0.0)), toWorld(face, (0.0, 0.0)))
+            
+            # rows of the atlas are counted from the top of the image while v runs from its bottom
+            cm.setUvRange(Point2((col + du) / cols, 1.0 - (row + 1 - dv) / rows), 
+                          Point2((col + 1 - du) / cols, 1.0 - (row + dv) / rows))
+            self.cube.attachNewNode(cm.generate())
+        
+        self.cube.setTexture(self.texture, 1)
+        self.cube.flattenStrong()
+        
+        for face in CubemapAtlas.LAYOUT.keys():
+            self.renderer.getFaceNodePath(face).hide()
+        return True
+    
+    
+    def clear(self):
+        '''
+        Removes the geom of the atlas and displays the faces of the cube model again.
+        '''
+        if self.cube is not None:
+            self.cube.removeNode()
+            self.cube = None
+            for face in CubemapAtlas.LAYOUT.keys():
+                self.renderer.getFaceNodePath(face).show()
+                
+        self.texture = None
+        self.faceDims = (0, 0)
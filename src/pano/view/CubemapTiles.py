@@ -0,0 +1,295 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+import math
+import logging
+
+from pandac.PandaModules import Texture, CardMaker, TextureStage
+from pandac.PandaModules import Vec3
+
+from pano.constants import PanoConstants
+
+
+class CubemapTiles:
+    '''
+    Renders the faces of a cubemap as pyramids of tiles, in order to display cubemaps whose faces are too large
+    to fit in a single texture.
+    
+    Level 0 of the pyramid holds a single tile per face, which is applied to the face of the cube model by the 
+    NodeRenderer and is always loaded. Level L splits the face into 2^L x 2^L tiles of the same size in pixels as 
+    the level 0 tile, so the full resolution of a face is the size of the level 0 tile multiplied by 2^(levels-1). 
+    The filenames of the tiles are <cubemap><face suffix>_<level>_<row>_<column>.<extension>, e.g. 
+    hall_fr_2_0_3.jpg, where the rows are counted from the top of the face.
+    
+    The level is selected from the vertical field of view of the camera and the height of the window, so that 
+    a texel is never stretched over more than a pixel. Only the tiles of the visible faces which intersect the 
+    view cone are loaded and until then they display the region of their closest loaded ancestor.
+    '''
+    
+    FACE_SUFFIXES = { 
+                     PanoConstants.CBM_FRONT_FACE  : '_fr',
+                     PanoConstants.CBM_BACK_FACE   : '_bk',
+                     PanoConstants.CBM_LEFT_FACE   : '_lt',
+                     PanoConstants.CBM_RIGHT_FACE  : '_rt',
+                     PanoConstants.CBM_TOP_FACE    : '_top',
+                     PanoConstants.CBM_BOTTOM_FACE : '_bt'
+    }
+    
+    def __init__(self, renderer):
+        '''
+        @param renderer: The pano.view.NodeRenderer that displays the cubemap.
+        '''
+        self.log = logging.getLogger('pano.cubemapTiles')
+        
+        self.renderer = renderer
+        
+        # the Node whose cubemap is tiled or None if no tiled node is displayed
+        self.node = None
+        
+        # the number of levels of the pyramid
+        self.levels = 0
+        
+        # the full resolution dimensions of each face, indexed by the face constant
+        self.facesDims = {}
+        
+        # parents the cards of the tiles
+        self.tilesParent = None
+        
+        # the level of each face, the cube model's face is rendered for level 0 instead of tiles
+        self.facesLevels = {}
+        
+        # the tiles of the current level of each face, as a list of 
+        # (row, column, card nodepath, direction of the centre, angular radius) tuples 
+        self.facesTiles = {}
+        
+        # the loaded textures indexed by (face, level, row, column) 
+        self.textures = {}
+        
+        # the orientation and field of view of the camera during the last update
+        self.lastView = None
+        
+        # True if visible tiles were left unloaded during the last update
+        self.incomplete = False
+        
+        
+    def isActive(self):
+        return self.node is not None
+    
+    
+    def getTileFilename(self, face, level, row, col, node = None):
+        '''
+        @param node: The tiled Node, if None then the node that is being rendered is assumed.
+        @return: The filename of the texture of the specified tile.
+        '''
+        if node is None:
+            node = self.node
+        ext = node.getExtension() if node.getExtension() is not None else 'png'
+        return '%s%s_%d_%d_%d.%s' % (node.getCubemap(), CubemapTiles.FACE_SUFFIXES[face], level, row, col, ext)
+    
+    
+    def load(self, node):
+        '''
+        Starts rendering the tiles of the given node. The level 0 tiles must have been applied to the cube model
+        already.
+        @param node: A pano.model.Node whose cubemap is tiled.
+        '''
+        self.clear()
+        self.node = node
+        self.levels = max(1, node.getTileLevels())
+        
+        self.tilesParent = self.renderer.getSceneRoot().attachNewNode('cubemap_tiles')
+        self.tilesParent.setDepthWrite(False)
+        self.tilesParent.setDepthTest(False)
+        self.tilesParent.setTwoSided(True)
+        self.tilesParent.setBin('fixed', PanoConstants.RENDER_ORDER_CUBEMAP)
+        
+        scale = 1 << (self.levels - 1)
+        for face in CubemapTiles.FACE_SUFFIXES.keys():
+            filename = self.getTileFilename(face, 0, 0, 0)
+            header = self.renderer.resources.loadImageHeader(filename)
+            if header is not None:
+                self.facesDims[face] = (header.getXSize() * scale, header.getYSize() * scale)
+            else:
+                self.log.error('Failed to read the header of tile %s' % filename)
+                self.facesDims[face] = (0, 0)
+            self.facesLevels[face] = 0
+            
+            
+    def clear(self):
+        '''
+        Stops rendering tiles and releases their textures.
+        '''
+        for face in self.facesLevels.keys():
+            self.renderer.getFaceNodePath(face).show()
+        
+        if self.tilesParent is not None:
+            self.tilesParent.removeNode()
+            self.tilesParent = None
+            
+        self.node = None
+        self.levels = 0
+        self.facesDims = {}
+        self.facesLevels = {}
+        self.facesTiles = {}
+        self.textures = {}
+        self.lastView = None
+        self.incomplete = False
+    
+    
+    def getFaceDimensions(self, face):
+        '''
+        @return: A (width, height) tuple with the full resolution dimensions of the given face.
+        '''
+        return self.facesDims.get(face, (0, 0))
+    
+    
+    def update(self, budget):
+        '''
+        Selects the level of the visible faces and loads their visible tiles, nearest to the centre of the view 
+        first. 
+        @param budget: The maximum number of tiles to load.
+        '''
+        cam = self.renderer.getCamera()
+        lens = cam.node().getLens()
+        fov = lens.getFov()
+        view = (cam.getH(), cam.getP(), cam.getR(), fov[0], fov[1], base.win.getYSize())
+        if view == self.lastView and not self.incomplete:
+            return
+        self.lastView = view
+        
+        level = self.selectLevel(fov[1], base.win.getYSize())
+        camDir = self.renderer.getSceneRoot().getRelativeVector(cam, Vec3.forward())
+        camDir.normalize()
+        
+        # the angle between the direction of the camera and the corners of the view 
+        halfTanX = math.tan(math.radians(fov[0]) * 0.5)
+        halfTanY = math.tan(math.radians(fov[1]) * 0.5)
+        viewAngle = math.atan(math.sqrt(halfTanX * halfTanX + halfTanY * halfTanY))
+        
+        wanted = []
+        for face in CubemapTiles.FACE_SUFFIXES.keys():
+            if not self.renderer.isFaceInFrustum(face):
+                continue
+            
+            if self.facesLevels[face] != level:
+                self._setFaceLevel(face, level)
+                
+            for row, col, card, centreDir, radius in self.facesTiles.get(face, ()):
+                key = (face, level, row, col)
+                if self.textures.has_key(key):
+                    continue
+                angle = math.acos(max(-1.0, min(1.0, camDir.dot(centreDir))))
+                if angle - radius <= viewAngle:
+                    wanted.append((angle, key, card))
+                    
+        wanted.sort()
+        for angle, key, card in wanted[:budget]:
+            filename = self.getTileFilename(*key)
+            tex = self.renderer.resources.loadTexture(filename)
+            if tex is None:
+                self.log.error('Failed to load tile %s' % filename)
+                continue
+            tex.setWrapU(Texture.WMClamp)
+            tex.setWrapV(Texture.WMClamp)
+            self.textures[key] = tex
+            self._applyTileTexture(card, key)
+            
+        self.incomplete = len(wanted) > budget
+        
+        
+    def selectLevel(self, vfov, winHeight):
+        '''
+        @param vfov: The vertical field of view of the camera in degrees.
+        @param winHeight: The height of the window in pixels.
+        @return: The lowest level whose texels aren't magnified at the centre of the view.
+        '''
+        tileHeight = self.facesDims.get(PanoConstants.CBM_FRONT_FACE, (0, 0))[1] >> (self.levels - 1)
+        if tileHeight <= 0:
+            return 0
+        
+        # the number of pixels that a face spans when looking at its centre 
+        pixels = winHeight / math.tan(math.radians(vfov) * 0.5)
+        level = 0
+        while level < self.levels - 1 and (tileHeight << level) < pixels:
+            level += 1
+        return level
+    
+    
+    def _setFaceLevel(self, face, level):
+        '''
+        Replaces the tiles of the given face with the tiles of the specified level.
+        '''
+        for row, col, card, centreDir, radius in self.facesTiles.get(face, ()):
+            card.removeNode()
+        self.facesTiles[face] = []
+        
+        # release the textures of the finer levels, the coarser ones are displayed until the new tiles are loaded 
+        for key in self.textures.keys():
+            if key[0] == face and key[1] > level:
+                del self.textures[key]
+        
+        self.facesLevels[face] = level
+        faceNp = self.renderer.getFaceNodePath(face)
+        if level == 0:
+            faceNp.show()
+            return
+        
+        n = 1 << level
+        cm = CardMaker('tile')
+        for row in xrange(n):
+            for col in xrange(n):
+                ul = self.renderer.getWorldPointFromFacePoint(face, (float(col) / n, float(row) / n))
+                ur = self.renderer.getWorldPointFromFacePoint(face, (float(col + 1) / n, float(row) / n))
+                lr = self.renderer.getWorldPointFromFacePoint(face, (float(col + 1) / n, float(row + 1) / n))
+                ll = self.renderer.getWorldPointFromFacePoint(face, (float(col) / n, float(row + 1) / n))
+                cm.setName('tile_%d_%d_%d_%d' % (face, level, row, col))
+                cm.setFrame(ll, lr, ur, ul)
+                card = self.tilesParent.attachNewNode(cm.generate())
+                
+                centre = Vec3(ul + lr) * 0.5
+                radius = Vec3(ul - centre).length()
+                dist = centre.length()
+                centre.normalize()
+                self.facesTiles[face].append((row, col, card, centre, math.atan(radius / dist)))
+                self._applyTileTexture(card, (face, level, row, col))
+                
+        faceNp.hide()
+        
+        
+    def _applyTileTexture(self, card, key):
+        '''
+        Applies the texture of the given tile to its card or, if it isn't loaded yet, the region of the closest
+        loaded ancestor that covers the tile.
+        '''
+        face, level, row, col = key
+        for k in xrange(level + 1):
+            tex = self.textures.get((face, level - k, row >> k, col >> k))
+            if tex is None and k == level:
+                tex = self.renderer.getFaceTexture(face)
+            if tex is not None:
+                card.setTexture(tex, 1)
+                n = 1 << k
+                ts = TextureStage.getDefault()
+                card.setTexScale(ts, 1.0 / n, 1.0 / n)
+                # rows are counted from the top of the image while v runs from its bottom
+                card.setTexOffset(ts, float(col % n) / n, 1.0 - float(row % n + 1) / n)
+                return
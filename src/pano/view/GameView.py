@@ -21,6 +21,8 @@ THE SOFTWARE.
 
 '''
 
+from __future__ import with_statement
+
 import logging
 
 from pandac.PandaModules import WindowProperties
@@ -43,6 +45,8 @@ from pano.view.inventoryView import InventoryView
 from pano.view.sprites import SpritesEngine
 from pano.view.VideoPlayer import VideoPlayer
 from pano.view.PostProcessManager import PostProcessManager
+from pano.view.HotspotPicker import HotspotPicker
+from pano.view.ProfilerOverlay import ProfilerOverlay
 
 class GameView:    
     def __init__(self, gameRef = None, title = ''):
@@ -80,6 +84,9 @@ class GameView:
         
         # for post processing effects
         self.postProcess = PostProcessManager(self.game)
+        
+        # finds the hotspots under the mouse pointer
+        self.picker = HotspotPicker(self)
 
         # renders the mouse pointer and updates its position according to the mouse        
         self.mousePointer = MousePointerDisplay(gameRef)
@@ -91,6 +98,9 @@ class GameView:
         self.inventory = InventoryView(gameRef)
         
         self.talkBox = TalkBox(gameRef)
+        
+        # displays the statistics of the game's profiler
+        self.profilerOverlay = ProfilerOverlay(gameRef)
       
         
     def initialize(self):
@@ -104,7 +114,14 @@ class GameView:
         base.setFrameRateMeter(self.game.getConfig().getBool(PanoConstants.CVAR_DEBUG_FPS))
         
         self.panoRenderer.initialize()
+        self._configureRenderer()
         self.spritesEngine.initialize(self.game.getResources())
+        cfg = self.game.getConfig()
+        self.spritesEngine.getPool().setCapacity(cfg.getInt(PanoConstants.CVAR_SPRITES_POOL_CAPACITY, 32))
+        self.spritesEngine.getVideos().setMaxDecoders(cfg.getInt(PanoConstants.CVAR_SPRITES_MAX_VIDEO_DECODERS, 4))
+        if cfg.getBool(PanoConstants.CVAR_SPRITES_ATLAS, False):
+            self.spritesEngine.enableAtlas(cfg.getInt(PanoConstants.CVAR_SPRITES_ATLAS_PAGE_SIZE, 1024), 
+                                           cfg.getInt(PanoConstants.CVAR_SPRITES_ATLAS_MAX_PAGES, 4))
         self.mousePointer.initialize()
         self.postProcess.initialize()
         
@@ -116,8 +133,22 @@ class GameView:
         self.talkBox.initialize()
         self.inventory.initialize(self.game.getInventory())
         self.transition = Transitions(loader)                                
+        
+        cfg = self.game.getConfig()
+        self.profilerOverlay.setBudget(cfg.getFloat(PanoConstants.CVAR_DEBUG_PROFILER_BUDGET, 1000.0 / 60.0))
+        if cfg.getBool(PanoConstants.CVAR_DEBUG_PROFILER_OVERLAY, False):
+            self.profilerOverlay.show()
                 
                 
+    def dispose(self):
+        '''
+        Releases the renderer and the sprites, it is called when the game quits.
+        '''
+        # the renderer parks the nodes of its sprites in the pool, so it must go first
+        self.panoRenderer.dispose()
+        self.spritesEngine.dispose()
+        
+                
     def update(self, millis):
         if millis == 0.0 and self.camQuatInterval is not None:
             self.camQuatInterval.pause()
@@ -132,11 +163,19 @@ class GameView:
             if self.videoPlayer.hasFinished():
                 self.stopVideo()
                 
-        self.cameraControl.update(millis)
-        self.panoRenderer.render(millis)
+        prof = self.game.getProfiler()
+        with prof.scope(PanoConstants.PROFILE_VIEW_CAMERA):
+            self.cameraControl.update(millis)
+        with prof.scope(PanoConstants.PROFILE_VIEW_RENDERER):
+            self.panoRenderer.render(millis)
         self.talkBox.update(millis)
-        self.inventory.update(millis)
-        self.postProcess.update(millis)
+        with prof.scope(PanoConstants.PROFILE_VIEW_INVENTORY):
+            self.inventory.update(millis)
+        with prof.scope(PanoConstants.PROFILE_VIEW_SPRITES):
+            self.spritesEngine.update(millis)
+        with prof.scope(PanoConstants.PROFILE_VIEW_POSTPROCESS):
+            self.postProcess.update(millis)
+        self.profilerOverlay.update(millis)
 
     def getTalkBox(self):
         return self.talkBox
@@ -144,6 +183,9 @@ class GameView:
 
     def getInventoryView(self):
         return self.inventory
+    
+    def getProfilerOverlay(self):
+        return self.profilerOverlay
         
     def displayNode(self, node):        
         self.activeNode = node
@@ -154,6 +196,7 @@ class GameView:
             self.panoRenderer.dispose()
             self.panoRenderer = NodeRenderer(self.game.resources, self.spritesEngine)
             self.panoRenderer.initialize()            
+            self._configureRenderer()
             if self.log.isEnabledFor(logging.DEBUG):
                 self.log.debug('Choosed NodeRenderer')
 
@@ -161,6 +204,7 @@ class GameView:
             self.panoRenderer.dispose()
             self.panoRenderer = Node2DRenderer(self.game.resources, self.spritesEngine)
             self.panoRenderer.initialize()            
+            self._configureRenderer()
             if self.log.isEnabledFor(logging.DEBUG):
                 self.log.debug('Choosed Node2DRenderer')            
         
@@ -169,20 +213,32 @@ class GameView:
 
     def clearScene(self):
         self.panoRenderer.clearScene()
+        
+        
+    def _configureRenderer(self):
+        '''
+        Applies the rendering options of the game's configuration to the active renderer.
+        '''
+        cfg = self.game.getConfig()
+        self.panoRenderer.setSpritesBatching(cfg.getBool(PanoConstants.CVAR_SPRITES_BATCHING, False))
+        if isinstance(self.panoRenderer, NodeRenderer):
+            self.panoRenderer.setStreaming(cfg.getBool(PanoConstants.CVAR_CUBEMAP_STREAMING, False), 
+                                           cfg.getInt(PanoConstants.CVAR_CUBEMAP_STREAMING_BUDGET, 1))
+            self.panoRenderer.setTilesBudget(cfg.getInt(PanoConstants.CVAR_CUBEMAP_TILES_BUDGET, 2))
+            self.panoRenderer.setAtlas(cfg.getBool(PanoConstants.CVAR_CUBEMAP_ATLAS, False))
 
         
     def raycastNodeAtMouse(self):
         '''
-        Performs a raycasting from the current mouse position and returns the hotspot found
-        at that location.
-        @return: A Hotspot instance if a hotspot was found or None.
+        Performs a raycasting from the current mouse position and returns the hotspots found
+        at that location. The raycasting is skipped if neither the mouse nor the camera have moved, see HotspotPicker.
+        @return: A list of Hotspot instances or None if the mouse is outside of the window.
         '''
-        #This gives up the window coordinates of the mouse in render2d space
-        if base.mouseWatcherNode.hasMouse():
-            mpos = base.mouseWatcherNode.getMouse()            
-            return self.panoRenderer.raycastHotspots(mpos.getX(), mpos.getY())
-        else:
-            return None
+        return self.picker.pick()
+
+
+    def getPicker(self):
+        return self.picker
 
 
     def getActiveNode(self):
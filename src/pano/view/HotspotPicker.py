@@ -0,0 +1,97 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import time
+import logging
+
+
+class HotspotPicker:
+    '''
+    Finds the hotspots under the mouse pointer using the active renderer of the view.
+    
+    The result of the last raycast is kept along with the mouse position, the orientation of the camera and the 
+    version of the renderer's hotspots. A new raycast takes place only when any of them has changed, so picking 
+    costs nothing while both the mouse and the camera are idle.
+    '''
+    def __init__(self, view):
+        '''
+        @param view: The GameView instance whose renderer will be used for raycasting.
+        '''
+        self.log = logging.getLogger('pano.picker')
+        self.view = view
+        
+        # the (renderer, hotspots version, mouse x, mouse y, camera hpr) tuple of the last raycast and its result
+        self.lastKey = None
+        self.lastResult = None
+        
+        # statistics
+        self.requests = 0
+        self.hits = 0
+        self.raycasts = 0
+        self.raycastTime = 0.0
+        
+        
+    def pick(self):
+        '''
+        @return: A list of the Hotspot instances found under the mouse pointer, ordered by their depth from the 
+        camera, or None if the mouse is outside of the window.
+        '''
+        if not base.mouseWatcherNode.hasMouse():
+            return None
+        
+        self.requests += 1
+        mpos = base.mouseWatcherNode.getMouse()
+        renderer = self.view.panoRenderer
+        hpr = renderer.getCamera().getHpr()
+        key = (renderer, renderer.getHotspotsVersion(), mpos.getX(), mpos.getY(), hpr.getX(), hpr.getY(), hpr.getZ())
+        if key == self.lastKey:
+            self.hits += 1
+            return self.lastResult
+        
+        t = time.time()
+        self.lastResult = renderer.raycastHotspots(mpos.getX(), mpos.getY())
+        self.raycastTime += time.time() - t
+        self.raycasts += 1
+        self.lastKey = key
+        return self.lastResult
+    
+    
+    def invalidate(self):
+        '''
+        Forgets the last result so that the next pick will raycast again.
+        '''
+        self.lastKey = None
+        self.lastResult = None
+        
+        
+    def getStats(self):
+        '''
+        @return: A dictionary with statistics about the number of pick requests, the requests answered from the last
+        result, the raycasts performed and the total time spent on them in seconds.
+        '''
+        return {
+            'requests'    : self.requests,
+            'hits'        : self.hits,
+            'raycasts'    : self.raycasts,
+            'raycastTime' : self.raycastTime
+        }
@@ -0,0 +1,107 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+
+class HotspotsGrid:
+    '''
+    Indexes the rectangles of the hotspots that lie on a face of the cubemap using a uniform grid over the 
+    face's local space, which extends in [0..1] in both axes. Finding the hotspots that contain a point only
+    has to test the hotspots that overlap the point's cell. 
+    
+    All hotspots of a face lie at the same depth from the camera, so hotspots that contain the same point are 
+    returned in the order they were added.
+    '''
+    def __init__(self, size = 8):
+        '''
+        @param size: The number of cells along each axis of the grid.
+        '''
+        self.size = size
+        
+        # the names of the hotspots that overlap each cell, in row major order
+        self.cells = [[] for i in xrange(size * size)]
+        
+        # the bounds of each hotspot as a (left, top, right, bottom) tuple, indexed by the hotspot's name
+        self.bounds = {}
+        
+        
+    def add(self, name, bounds):
+        '''
+        Adds a hotspot to the grid, replacing any previous hotspot with the same name.
+        @param name: The name of the hotspot.
+        @param bounds: The bounds of the hotspot in the face's local space as a (left, top, right, bottom) tuple. 
+        '''
+        if self.bounds.has_key(name):
+            self.remove(name)
+            
+        x0, y0, x1, y1 = bounds
+        bounds = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        self.bounds[name] = bounds
+        for idx in self._getCells(bounds):
+            self.cells[idx].append(name)
+            
+            
+    def remove(self, name):
+        '''
+        Removes a hotspot from the grid.
+        @param name: The name of the hotspot.
+        '''
+        bounds = self.bounds.get(name)
+        if bounds is not None:
+            del self.bounds[name]
+            for idx in self._getCells(bounds):
+                self.cells[idx].remove(name)
+                
+                
+    def query(self, x, y):
+        '''
+        @param x: The x coordinate of the point in the face's local space.
+        @param y: The y coordinate of the point in the face's local space.
+        @return: A list with the names of the hotspots that contain the given point.
+        '''
+        if x < 0.0 or y < 0.0 or x > 1.0 or y > 1.0:
+            return []
+        
+        found = []
+        for name in self.cells[self._getCell(x, y)]:
+            b = self.bounds[name]
+            if b[0] <= x <= b[2] and b[1] <= y <= b[3]:
+                found.append(name)
+        return found
+    
+    
+    def isEmpty(self):
+        return len(self.bounds) == 0
+    
+    
+    def _getCell(self, x, y):
+        n = self.size
+        return min(int(y * n), n - 1) * n + min(int(x * n), n - 1)
+    
+    
+    def _getCells(self, bounds):
+        n = self.size
+        i0 = max(0, min(int(bounds[0] * n), n - 1))
+        j0 = max(0, min(int(bounds[1] * n), n - 1))
+        i1 = max(0, min(int(bounds[2] * n), n - 1))
+        j1 = max(0, min(int(bounds[3] * n), n - 1))
+        return [j * n + i for j in xrange(j0, j1 + 1) for i in xrange(i0, i1 + 1)]
@@ -40,6 +40,7 @@ from pano.constants import PanoConstants
 from pano.model.Node import Node
 from pano.model.Sprite import Sprite
 from pano.view.NodeRaycaster import NodeRaycaster
+from pano.view.sprites import SpriteBatch
 
 
 class Node2DRenderer:
@@ -68,10 +69,22 @@ class Node2DRenderer:
         # used for detecting the hotspot under a window coordinate
         self.raycaster = None
         
+        # incremented whenever the hotspots that can be raycasted change, see getHotspotsVersion
+        self.hotspotsVersion = 0
+        
         # this caches the node's hotspot map, if any
         self.hotspotsMap = None
         
+        # the ClickMask of each hotspot that has declared one, places where the mask's image is black are not interactive
+        self.hotspotsClickMasks = {}
+        
         self.spritesEngine = spriteEngine
+        
+        # if True then the static sprites are rendered through self.spritesBatch, see setSpritesBatching
+        self.spritesBatching = False
+        
+        # created along with the first batched sprite, since the sprites' parent is created by the sprites engine
+        self.spritesBatch = None
 
 
     def initialize(self):
@@ -108,6 +121,7 @@ class Node2DRenderer:
         '''
         Clears the scenegraph effectively removing all nodes from rendering.
         '''        
+        self.hotspotsVersion += 1
         if self.bgCard is not None and not self.bgCard.empty():
             self.bgCard.removeNode()
             
@@ -117,9 +131,13 @@ class Node2DRenderer:
         for dbgSpr in self.debugSprites.values():
             dbgSpr.remove()
 
+        if self.spritesBatch is not None:
+            self.spritesBatch.clear()
+            
         self.spritesByHotspot = {}
         self.debugSprites = {}
         self.hotspotsMap = None
+        self.hotspotsClickMasks = {}
         
 
     def displayNode(self, node):
@@ -153,10 +171,20 @@ class Node2DRenderer:
                 self.hotspotsMap = self.resources.loadHotspotsMap(self.node.hotspotsMapFilename)
 
         self._createHotspotsGeoms()
+        self.hotspotsVersion += 1
 
 
     def render(self, millis):
-        pass
+        if self.spritesBatch is not None:
+            self.spritesBatch.flush()
+            
+            
+    def setSpritesBatching(self, enabled):
+        '''
+        Enables or disables rendering the static sprites of hotspots through a SpriteBatch, which merges the sprites 
+        that share the same texture into a single geom. It affects the sprites of the nodes displayed afterwards.
+        '''
+        self.spritesBatching = enabled
 
     def getNode(self):
         """
@@ -172,6 +200,14 @@ class Node2DRenderer:
         return self.sceneRoot
 
 
+    def getHotspotsVersion(self):
+        '''
+        Returns a counter that changes whenever hotspots are added, removed, hidden or shown, so that
+        the results of raycastHotspots can be reused while it remains the same.
+        '''
+        return self.hotspotsVersion
+    
+    
     def getCamera(self):        
         return base.cam2d        
     
@@ -205,6 +241,11 @@ class Node2DRenderer:
         for hp in self.node.getHotspots():
             self.renderHotspot(hp)
             self.renderHotspotDebugGeom(hp)
+            
+            if hp.clickMask is not None:
+                mask = self.resources.loadClickMask(hp.clickMask)
+                if mask is not None:
+                    self.hotspotsClickMasks[hp.name] = mask
 
 
     def renderHotspot(self, hp, spriteOverride = None):
@@ -225,6 +266,11 @@ class Node2DRenderer:
             if not hp.active:
                 sri.hide()
                 
+            if self.spritesBatching and sri.isBatchable():
+                if self.spritesBatch is None:
+                    self.spritesBatch = SpriteBatch(sri.nodepath.getParent())
+                sri.setBatch(self.spritesBatch)
+                
             self.spritesByHotspot[hp.name] = sri
     
     
@@ -261,6 +307,7 @@ class Node2DRenderer:
         '''
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('Removing hotspot %s' % hotspot.name)
+        self.hotspotsVersion += 1
             
         spr = self.getHotspotSprite(hotspot)
         if spr is not None:
@@ -281,6 +328,7 @@ class Node2DRenderer:
         '''
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('Hiding hotspot %s' % hp.name)
+        self.hotspotsVersion += 1
                 
         sri = self.getHotspotSprite(hp)
         if sri is not None:
@@ -294,6 +342,7 @@ class Node2DRenderer:
         '''
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('Showing hotspot %s' % hp.name)
+        self.hotspotsVersion += 1
         
         sri = self.getHotspotSprite(hp)
         if sri is not None:
@@ -363,13 +412,9 @@ class Node2DRenderer:
             # check through bounds
             for hp in self.node.getHotspots():                
                 if sx >= hp.xo and sx <= hp.xe and sy >= hp.yo and sy <= hp.ye:
-                    maskImg = self.hotspotsImageMasks.get(hp.name)
-                    if maskImg is not None:
-                        imgX = int(maskImg.getXSize() * sx / (hp.xe - hp.xo))
-                        imgY = int(maskImg.getYSize() * sy / (hp.ye - hp.yo))                        
-                        col = maskImg.getXel(imgX, imgY)
-                        if col[0] == 0.0 and col[1] == 0.0 and col[2] == 0.0:                            
-                            continue                        
+                    mask = self.hotspotsClickMasks.get(hp.name)
+                    if mask is not None and not mask.contains((sx - hp.xo) / (hp.xe - hp.xo), (sy - hp.yo) / (hp.ye - hp.yo)):
+                        continue                        
                         
                     hotspots.append(hp)
         return hotspots
@@ -26,20 +26,23 @@ import os
 import math
 import logging
 
-from pandac.PandaModules import Texture, NodePath
-from pandac.PandaModules import CollisionNode
-from pandac.PandaModules import CollisionPolygon
+from pandac.PandaModules import Texture, NodePath, PNMImage
+from pandac.PandaModules import Thread
 from pandac.PandaModules import TextureAttrib, CullFaceAttrib
 from pandac.PandaModules import GeomVertexReader
 from pandac.PandaModules import LineSegs
 from pandac.PandaModules import Filename
 from pandac.PandaModules import PerspectiveLens
 from direct.showbase.PythonUtil import *
-from pandac.PandaModules import Mat4, VBase3
+from direct.stdpy import threading
+from direct.task.Task import Task
+from pandac.PandaModules import Mat4, VBase3, Point2, Point3
 
 from pano.constants import PanoConstants
 from pano.view.VideoPlayer import VideoPlayer
-from pano.view.NodeRaycaster import NodeRaycaster
+from pano.view.HotspotsGrid import HotspotsGrid
+from pano.view.CubemapTiles import CubemapTiles
+from pano.view.CubemapAtlas import CubemapAtlas
 from pano.view.sprites import *
 
 # Check these two posts:
@@ -98,12 +101,18 @@ class NodeRenderer:
         #frontTexture = self.faceTextures[CBM_FRONT_FACE]        
         self.facesGeomNodes = {}
         
+        # the NodePaths of the faces' geom nodes, indexed by the face constant
+        self.facesNodePaths = {}
+        
         # for every hotspot we store its bounds in the local space of each face
         self.hotspotsFaceBounds = {}
         
-        # for every hotspot we store a PNMImage which has been declared to act as an interaction mask.
-        # i.e. places where the image is black define a non-interactive region
-        self.hotspotsImageMasks = {}
+        # indexes the bounds of the interactive hotspots of each face, indexed by the face constant
+        self.hotspotsGrids = {}
+        
+        # for every hotspot we store a ClickMask which has been declared to act as an interaction mask.
+        # i.e. places where the mask's image is black define a non-interactive region
+        self.hotspotsClickMasks = {}
         
         # the normal of each face, indexed by the face constant (e.g. PanoConstants.CBM_TOP_FACE) 
         self.faceNormals = {
@@ -131,20 +140,58 @@ class NodeRenderer:
         # if true then self.debugGeomsParent will be visible
         self.vizDebugGeoms = False
 
-        # parent all hotspots collision geometries
-        self.collisionsGeomsParent = None
-        
         # the texture cards for sprites rendering are descendants of this node
         self.spritesParent = None                  
         
         # sprites in format {hotspot_name : (<spriteRenderInterface instance>)}
         self.spritesByHotspot = {}  
+        
+        # the cubemap face of each hotspot whose sprite is a video, used to pause the videos outside the frustum
+        self.videoSpritesFaces = {}
+        
+        # if True then the static sprites are rendered through self.spritesBatch, see setSpritesBatching
+        self.spritesBatching = False
+        self.spritesBatch = None
                 
-        # used for detecting the hotspot under a window coordinate
-        self.raycaster = None
+        # incremented whenever the hotspots that can be raycasted change, see getHotspotsVersion
+        self.hotspotsVersion = 0
         
         self.spritesEngine = spriteEngine
         
+        # if True then only the visible faces are loaded by displayNode and the rest are streamed, see setStreaming
+        self.streaming = False
+        
+        # the maximum number of streamed faces whose textures are applied per frame
+        self.streamingBudget = 1
+        
+        # the texture filenames of the faces that display a placeholder until they are streamed, indexed by face 
+        self.pendingFaces = {}
+        
+        # the dimensions of the pending faces' textures, as read from the headers of their images
+        self.pendingFacesDims = {}
+        
+        # the faces whose textures have been loaded in the background, guarded by self.streamingLock
+        self.streamedFaces = {}
+        
+        # the (face, filename) tuples that the streaming task has yet to load and the faces that it is loading,
+        # in { face : filename } format, both guarded by self.streamingLock
+        self.queuedFaces = []
+        self.loadingFaces = {}
+        self.streamingLock = threading.Lock()
+        
+        # displayed by the pending faces
+        self.placeholderTexture = None
+        
+        # renders the faces of tiled cubemaps
+        self.tiles = CubemapTiles(self)
+        
+        # the maximum number of tiles that are loaded per frame
+        self.tilesBudget = 2
+        
+        # if True then the faces are packed in an atlas and rendered with a single geom, see setAtlas
+        self.useAtlas = False
+        self.atlas = CubemapAtlas(self)
+        
 
     def initialize(self):        
 
@@ -152,12 +199,8 @@ class NodeRenderer:
         self.sceneRoot = render.attachNewNode(PanoConstants.NODE_ROOT_NODE)
         self.debugGeomsParent = self.sceneRoot.attachNewNode(PanoConstants.NODE_DEBUG_GEOMS_PARENT)
         self.debugGeomsParent.hide()
-        self.collisionsGeomsParent = self.sceneRoot.attachNewNode(PanoConstants.NODE_COLLISIONS_GEOMS_PARENT)
-        self.collisionsGeomsParent.hide()
         self.spritesParent = self.sceneRoot.attachNewNode(PanoConstants.NODE_SPRITES_PARENT)
-        
-        self.raycaster = NodeRaycaster(self)
-        self.raycaster.initialize()
+        self.spritesBatch = SpriteBatch(self.spritesParent)
         
         # we want perspective
         # TODO: modify view parameters per node and in real-time
@@ -173,9 +216,6 @@ class NodeRenderer:
         '''
         Disposes any rendering resources, it assumes that this instance won't be used again.
         '''
-        if self.raycaster is not None:
-            self.raycaster.dispose()
-            
         self.clearScene()
         
         if self.sceneRoot is not None:
@@ -231,6 +271,7 @@ class NodeRenderer:
             geomNode = self.cmap.find("**/Cube/=name=" + n)
             state = geomNode.node().getGeomState(0)
             self.facesGeomNodes[i] = geomNode.node()
+            self.facesNodePaths[i] = geomNode
              
                                     
         # builds matrices used in transforming points from/to world space and the faces' image space
@@ -249,6 +290,7 @@ class NodeRenderer:
         '''
         Clears the scenegraph effectively removing all nodes from rendering.
         '''        
+        self.hotspotsVersion += 1
         self.debugGeomsParent.removeNode()            
         self.debugGeomsParent = self.sceneRoot.attachNewNode(PanoConstants.NODE_DEBUG_GEOMS_PARENT)
         if self.vizDebugGeoms:
@@ -256,15 +298,23 @@ class NodeRenderer:
         else:
             self.debugGeomsParent.hide()
         
-        self.collisionsGeomsParent.removeNode()
-        self.collisionsGeomsParent = self.sceneRoot.attachNewNode(PanoConstants.NODE_COLLISIONS_GEOMS_PARENT)
-        self.collisionsGeomsParent.hide()
+        # removes the sprites through their render interface, so that they are parked in the sprites pool
+        for sri in self.spritesByHotspot.values():
+            sri.remove()
+        self.spritesByHotspot = {}
+        self.videoSpritesFaces = {}
         
+        self.spritesBatch.clear()
         self.spritesParent.removeNode()
         self.spritesParent = self.sceneRoot.attachNewNode(PanoConstants.NODE_SPRITES_PARENT)        
+        self.spritesBatch = SpriteBatch(self.spritesParent)
         
         self.hotspotsFaceBounds = {}
-        self.hotspotsImageMasks = {}
+        self.hotspotsClickMasks = {}
+        self.hotspotsGrids = {}
+        self._cancelStreaming()
+        self.tiles.clear()
+        self.atlas.clear()
         
         self.cmap.hide()                   
         
@@ -283,6 +333,14 @@ class NodeRenderer:
         return self.sceneRoot
     
     
+    def getHotspotsVersion(self):
+        '''
+        Returns a counter that changes whenever hotspots are added, removed, hidden or shown, so that
+        the results of raycastHotspots can be reused while it remains the same.
+        '''
+        return self.hotspotsVersion
+    
+    
     def getCamera(self):
         '''
         Returns the NodePath of the camera that is used for rendering this node.
@@ -291,7 +349,67 @@ class NodeRenderer:
     
     
     def render(self, millis):
-        pass
+        if self.pendingFaces:
+            self._updateStreaming()
+            
+        if self.tiles.isActive():
+            self.tiles.update(self.tilesBudget)
+            
+        if self.videoSpritesFaces:
+            self._updateVideosVisibility()
+            
+        self.spritesBatch.flush()
+        
+        
+    def _updateVideosVisibility(self):
+        '''
+        Lets the VideoDecodePool know which video sprites lie on faces that are in the frustum.
+        '''
+        facesInView = {}
+        for name, face in self.videoSpritesFaces.items():
+            inView = facesInView.get(face)
+            if inView is None:
+                inView = self.isFaceInFrustum(face)
+                facesInView[face] = inView
+            self.spritesByHotspot[name].video.setInView(inView)
+            
+            
+    def setStreaming(self, enabled, budget = 1):
+        '''
+        Enables or disables the streaming of the cubemaps' textures. When streaming, displayNode loads only the 
+        textures of the faces that are in the frustum while the rest of the faces display a placeholder until their 
+        textures are loaded. If threads are supported they are loaded by the threads of the streaming task chain,
+        otherwise they are loaded on the main thread. Faces that enter the frustum are loaded immediately.
+        @param enabled: True to enable streaming.
+        @param budget: The maximum number of streamed faces whose textures are applied per frame.
+        '''
+        self.streaming = enabled
+        self.streamingBudget = max(1, budget)
+        
+        
+    def setAtlas(self, enabled):
+        '''
+        Enables or disables rendering the cubemaps with a single geom that is textured with an atlas of the six faces,
+        instead of a geom and a texture for each face. The atlas isn't used for tiled cubemaps and when enabled the 
+        faces aren't streamed, as the atlas needs all of them.
+        @param enabled: True to render through an atlas.
+        '''
+        self.useAtlas = enabled
+        
+        
+    def setSpritesBatching(self, enabled):
+        '''
+        Enables or disables rendering the static sprites of hotspots through a SpriteBatch, which merges the sprites 
+        that share the same texture into a single geom. It affects the sprites of the nodes displayed afterwards.
+        '''
+        self.spritesBatching = enabled
+        
+        
+    def setTilesBudget(self, budget):
+        '''
+        Sets the maximum number of tiles of tiled cubemaps that are loaded per frame.
+        '''
+        self.tilesBudget = max(1, budget)
     
         
     def displayNode(self, node):
@@ -314,8 +432,9 @@ class NodeRenderer:
         # load the cubemap or the background image        
         self._replaceCubemapTextures()
                 
-        # creates hotspot collision geometries and sprites
+        # creates hotspot sprites and indexes the hotspots for raycasting
         self._createHotspotsGeoms()
+        self.hotspotsVersion += 1
         
         self.cmap.show()
                              
@@ -358,17 +477,17 @@ class NodeRenderer:
             
     def _createHotspotsGeoms(self):
         """
-        Creates nodes for the collision geometry (a box) and the sprite.
+        Creates nodes for the sprite and the debug geometry and indexes the hotspot for raycasting.
         """
         for hp in self.node.getHotspots():            
             self.renderHotspot(hp)        
-            self.createHotspotCollisionGeom(hp)
+            self.indexHotspot(hp)
             self.renderHotspotDebugGeom(hp)
             
             if hp.clickMask is not None:
-                img = self.resources.loadImage(hp.clickMask)
-                if img:
-                    self.hotspotsImageMasks[hp.name] = img
+                mask = self.resources.loadClickMask(hp.clickMask)
+                if mask is not None:
+                    self.hotspotsClickMasks[hp.name] = mask
                       
                     
     def getHotspotSprite(self, hotspot):
@@ -396,7 +515,9 @@ class NodeRenderer:
                 self.log.error("Failed to add sprite %s because it wasn't found")
                 return
             
-            nodePath = SpritesUtil.createSprite3D(self.resources, sprite, self.spritesParent)                                    
+            nodePath = self.spritesEngine.createSprite3D(sprite, self.spritesParent)
+            if nodePath is None:
+                return                                    
             
             # gets position of hotspot's center in world space
             dim = self.getFaceTextureDimensions(hp.face)
@@ -419,51 +540,41 @@ class NodeRenderer:
                 nodePath.hide()
                 
             self.log.debug('adding hotspot %s' % hp.name)
-            self.spritesByHotspot[hp.name] = SpriteRenderInterface(nodePath)          
+            sri = SpriteRenderInterface(nodePath)
+            if self.spritesBatching and sri.isBatchable():
+                sri.setBatch(self.spritesBatch)
+            self.spritesByHotspot[hp.name] = sri
+            if sri.video is not None:
+                self.videoSpritesFaces[hp.name] = hp.face
 
 
-    def createHotspotCollisionGeom(self, hp):
+    def indexHotspot(self, hp):
         '''
-        Creates a collision box that covers the hotspot's interactive area in order to be able to detect a hotspot
+        Adds the hotspot's interactive area to the grid of its face, in order to be able to detect the hotspot
         by raycasting from the mouse position.
         '''
-        dim = self.getFaceTextureDimensions(hp.face)            
-                
-        # get world space coords of top left corner
-        t1 = hp.xo / dim[0]
-        t2 = hp.yo / dim[1]
-        topLeft = self.getWorldPointFromFacePoint(hp.face, (t1, t2))
-        
-        # get world space coords of top right corner
-        t1 = hp.xe / dim[0]
-        t2 = hp.yo / dim[1]
-        topRight = self.getWorldPointFromFacePoint(hp.face, (t1, t2))
+        dim = self.getFaceTextureDimensions(hp.face)
+        if dim[0] == 0 or dim[1] == 0:
+            self.log.error("Failed to index hotspot %s because its face isn't textured" % hp.name)
+            return
         
-        # get world space coords of bottom right corner
-        t1 = hp.xe / dim[0]
-        t2 = hp.ye / dim[1]
-        bottomRight = self.getWorldPointFromFacePoint(hp.face, (t1, t2))
+        bounds = [hp.xo / dim[0], hp.yo / dim[1], hp.xe / dim[0], hp.ye / dim[1]]
+        self.hotspotsFaceBounds[hp.name] = bounds
         
-        # get world space coords of bottom left corner
-        t1 = hp.xo / dim[0]
-        t2 = hp.ye / dim[1]
-        bottomLeft = self.getWorldPointFromFacePoint(hp.face, (t1, t2))
+        grid = self.hotspotsGrids.get(hp.face)
+        if grid is None:
+            grid = HotspotsGrid()
+            self.hotspotsGrids[hp.face] = grid
+        grid.add(hp.name, bounds)
         
-#        polygon = CollisionPolygon(topLeft, bottomLeft, bottomRight, topRight)
-        polygon = CollisionPolygon(topLeft, topRight, bottomRight, bottomLeft)
-                
-        # name it as the hotspot, it will be convenient for raycasting
-        cn = CollisionNode(hp.name)
-        cn.addSolid(polygon)
         
-        collisionNP = NodePath(cn)
-        collisionNP.setName(hp.name)        
-        collisionNP.reparentTo(self.collisionsGeomsParent)
-                
-        if not hp.active:
-            collisionNP.hide()
-        else:
-            collisionNP.show()
+    def unindexHotspot(self, hp):
+        '''
+        Removes the hotspot from the grid of its face, so that raycasting won't detect it anymore.
+        '''
+        grid = self.hotspotsGrids.get(hp.face)
+        if grid is not None:
+            grid.remove(hp.name)
         
 
     def renderHotspotDebugGeom(self, hp):
@@ -483,9 +594,6 @@ class NodeRenderer:
         t4 = hp.ye / dim[1]
         we = self.getWorldPointFromFacePoint(hp.face, (t1, t2))
         
-        # store the face local bounds, useful for raycasting
-        self.hotspotsFaceBounds[hp.name] = [t1, t2, t3, t4]
-        
         box = self.resources.loadModel('box.egg') 
         box.setName('debug_' + hp.name)
         
@@ -523,11 +631,13 @@ class NodeRenderer:
         '''
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('Removing hotspot %s' % hotspot.name)
+        self.hotspotsVersion += 1
             
         spr = self.getHotspotSprite(hotspot)
         if spr is not None:
             spr.remove()
             del self.spritesByHotspot[hotspot.name]                
+            self.videoSpritesFaces.pop(hotspot.name, None)
 
         # remove the hotspot's debug geometry
         if self.debugGeomsParent is not None:
@@ -535,11 +645,7 @@ class NodeRenderer:
             if np != None and not np.isEmpty():
                 np.removeNode()
                 
-        # remove the collision geometry
-        if self.collisionsGeomsParent is not None:
-            np = self.collisionsGeomsParent.find(hotspot.name)
-            if np != None and not np.isEmpty():
-                np.removeNode()
+        self.unindexHotspot(hotspot)
 
 
     def hideHotspot(self, hp):
@@ -549,16 +655,14 @@ class NodeRenderer:
         '''
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('Hiding hotspot %s' % hp.name)
+        self.hotspotsVersion += 1
                 
         sri = self.getHotspotSprite(hp)
         if sri is not None:
             sri.hide()
             
-        # remove the collision geometry while the hotspot is hidden
-        if self.collisionsGeomsParent is not None:
-            np = self.collisionsGeomsParent.find(hp.name)
-            if np != None and not np.isEmpty():
-                np.removeNode()
+        # the hotspot can't be raycasted while it is hidden
+        self.unindexHotspot(hp)
 
 
     def showHotspot(self, hp):
@@ -568,13 +672,14 @@ class NodeRenderer:
         '''
         if self.log.isEnabledFor(logging.DEBUG):
             self.log.debug('Showing hotspot %s' % hp.name)
+        self.hotspotsVersion += 1
         
         sri = self.getHotspotSprite(hp)
         if sri is not None:
             sri.show()
             
-        # create again the collision geometry
-        self.createHotspotCollisionGeom(hp)
+        # make it available again for raycasting
+        self.indexHotspot(hp)
 
 
     def replaceHotspotSprite(self, hotspot, newSprite):
@@ -609,42 +714,97 @@ class NodeRenderer:
     def raycastHotspots(self, x, y):
         '''
         Returns the hotspot under the given window coordinates.
+        The camera ray is intersected analytically with the cube and the hit point is looked up in the grid of 
+        the hit face, so no collision geometry or scenegraph traversal is involved.
         @param x: The x window coordinate in render space.
         @param y: The y window coordinate in render space.
         @return: A list of Hotspot instances that were found under the window point. The hotspots are ordered
         by their depth from the camera. 
         '''                
-        self.collisionsGeomsParent.show()        
         hotspots = []
-        results = self.raycaster.raycastWindow(x, y, True)        
-        if results is not None:
-            for np, pt in results:                
-                hp = self.node.getHotspot(np.getName())
-                if hp is not None:
-                                                            
-                    # we have a hotspot but perhaps its click mask, if any, will reject that point
-                    # the mask should have the same dimensions with the hotspot's rectangular interaction area
-                    maskImg = self.hotspotsImageMasks.get(hp.name)
-                    if maskImg is not None:
-                        bounds = self.hotspotsFaceBounds[hp.name]
-                        facePoint = self.getFaceLocalCoords(hp.face, pt)                        
-                        hotspotRelativePoint = [(facePoint[0] - bounds[0]) / (bounds[2] - bounds[0]), (facePoint[1] - bounds[1]) / (bounds[3] - bounds[1])]
-                        hotspotRelativePoint[0] *= maskImg.getXSize()
-                        hotspotRelativePoint[1] *= maskImg.getYSize()
-                        col = maskImg.getXel(int(hotspotRelativePoint[0]), int(hotspotRelativePoint[1]))                    
-                        if col[0] == 0.0 and col[1] == 0.0 and col[2] == 0.0:                            
-                            continue                        
-                            
-                    hotspots.append(hp)
-                 
-        self.collisionsGeomsParent.hide()
+        hit = self.raycastCube(x, y)
+        if hit is None:
+            return hotspots
         
-#        self.log.debug("------------------------")
-#        for hp in hotspots:
-#            self.log.debug('raycasted hotspot %s' % hp.name)
-#        self.log.debug("------------------------")
-#            
+        face, point = hit
+        grid = self.hotspotsGrids.get(face)
+        if grid is None or grid.isEmpty():
+            return hotspots
+        
+        facePoint = self.getFaceLocalCoords(face, point)
+        for name in grid.query(facePoint[0], facePoint[1]):
+            hp = self.node.getHotspot(name)
+            if hp is not None:
+                                                        
+                # we have a hotspot but perhaps its click mask, if any, will reject that point
+                # the mask should have the same dimensions with the hotspot's rectangular interaction area
+                mask = self.hotspotsClickMasks.get(hp.name)
+                if mask is not None:
+                    bounds = self.hotspotsFaceBounds[hp.name]
+                    if not mask.contains((facePoint[0] - bounds[0]) / (bounds[2] - bounds[0]), (facePoint[1] - bounds[1]) / (bounds[3] - bounds[1])):
+                        continue                        
+                        
+                hotspots.append(hp)
+                 
         return hotspots                       
+    
+    
+    def raycastCube(self, x, y):
+        '''
+        Casts a ray from the camera through the given window coordinates and intersects it with the cube.
+        @param x: The x window coordinate in render space.
+        @param y: The y window coordinate in render space.
+        @return: A (face, point) tuple with the face constant of the hit face and the hit point as a VBase3 in 
+        the space of the scene root, or None if the ray couldn't be computed.
+        '''
+        cam = self.getCamera()
+        nearPoint = Point3()
+        farPoint = Point3()
+        if not cam.node().getLens().extrude(Point2(x, y), nearPoint, farPoint):
+            return None
+        
+        origin = self.sceneRoot.getRelativePoint(cam, nearPoint)
+        target = self.sceneRoot.getRelativePoint(cam, farPoint)
+        return self.intersectCube((origin[0], origin[1], origin[2]), 
+                                  (target[0] - origin[0], target[1] - origin[1], target[2] - origin[2]))
+    
+    
+    def intersectCube(self, origin, direction):
+        '''
+        Intersects a ray that starts inside the cube with the cube's faces. 
+        Similarly to findFaceFromNormal, the face is found by considering the axis along which the ray first 
+        reaches the cube and the sign of the ray's direction along that axis.
+        @param origin: The origin of the ray as a sequence of x, y, z values.
+        @param direction: The direction of the ray as a sequence of x, y, z values.
+        @return: A (face, point) tuple with the face constant of the hit face and the hit point as a VBase3, or
+        None if the ray has no direction.
+        '''
+        h = self.faceHalfDim
+        facesByAxis = ((PanoConstants.CBM_RIGHT_FACE, PanoConstants.CBM_LEFT_FACE),
+                       (PanoConstants.CBM_FRONT_FACE, PanoConstants.CBM_BACK_FACE),
+                       (PanoConstants.CBM_TOP_FACE, PanoConstants.CBM_BOTTOM_FACE))
+        tMin = None
+        face = None
+        for axis in xrange(3):
+            d = direction[axis]
+            if math.fabs(d) < NodeRenderer.EPSILON_POS:
+                continue
+            
+            if d > 0.0:
+                t = (h - origin[axis]) / d
+                f = facesByAxis[axis][0]
+            else:
+                t = (-h - origin[axis]) / d
+                f = facesByAxis[axis][1]
+                
+            if t >= 0.0 and (tMin is None or t < tMin):
+                tMin = t
+                face = f
+                
+        if tMin is None:
+            return None
+        
+        return (face, VBase3(origin[0] + tMin*direction[0], origin[1] + tMin*direction[1], origin[2] + tMin*direction[2]))
             
     
     def getFaceLocalCoords(self, face, p):    
@@ -740,7 +900,7 @@ class NodeRenderer:
         
         if face != PanoConstants.CBM_TOP_FACE and face != PanoConstants.CBM_BOTTOM_FACE:        
             # read camera's heading angle
-            camHeading = base.camera.getH()
+            camHeading = self.getCamera().getH() % 360.0
             
             if self.log.isEnabledFor(logging.DEBUG):                         
                 self.log.debug('camHeading: %f', camHeading)
@@ -757,7 +917,7 @@ class NodeRenderer:
             if camHeading < 270.0 and camHeading > 90.0 and face == PanoConstants.CBM_BACK_FACE:
                 return True
         else:
-            camPitch = base.camera.getP()
+            camPitch = self.getCamera().getP() % 360.0
             if self.log.isEnabledFor(logging.DEBUG): 
                 self.log.debug('camPitch: %f', camPitch)
             
@@ -780,6 +940,29 @@ class NodeRenderer:
         Returns a tuple containing the width and height of the cubemap textures.
         tuple[0] holds the width while tuple[1] holds the height of the textures.
         """
+        # hotspots of tiled faces are specified in the full resolution of the face
+        if self.tiles.isActive():
+            return self.tiles.getFaceDimensions(face)
+        
+        if self.atlas.isActive():
+            return self.atlas.getFaceDimensions(face)
+        
+        # faces that are being streamed display a placeholder, so report the size of their real texture 
+        dims = self.pendingFacesDims.get(face)
+        if dims is not None:
+            return dims
+        
+        tex = self.getFaceTexture(face)
+        if tex is not None:
+            return (tex.getXSize(), tex.getYSize())
+            
+        return (0, 0)             
+    
+    
+    def getFaceTexture(self, face):
+        '''
+        @return: The texture that is applied to the given face of the cube model or None.
+        '''
         if self.facesGeomNodes.has_key(face):
             # for Panda 1.5.4
 #            tex = self.facesGeomNodes[face].getGeomState(0).getTexture().getTexture()
@@ -788,12 +971,15 @@ class NodeRenderer:
             rs = self.facesGeomNodes[face].getGeomState(0)
             ta = rs.getAttrib(TextureAttrib.getClassType())
             if ta is not None:
-                tex = ta.getTexture()
-                
-                if tex is not None:
-                    return (tex.getXSize(), tex.getYSize())
-            
-        return (0, 0)             
+                return ta.getTexture()
+        return None
+    
+    
+    def getFaceNodePath(self, face):
+        '''
+        @return: The NodePath of the given face of the cube model.
+        '''
+        return self.facesNodePaths.get(face)
 
 
     def _replaceCubemapTextures(self):
@@ -809,8 +995,44 @@ class NodeRenderer:
                      PanoConstants.CBM_BOTTOM_FACE : '_bt.' + ext
                      }
         
+        self._cancelStreaming()
+        
+        # the level 0 tiles are small and are needed by the higher levels while loading, so they aren't streamed
+        if self.node.isTiled():
+            for face in faceCodes.keys():
+                self.setFaceTexture(face, self.tiles.getTileFilename(face, 0, 0, 0, self.node))
+            self.tiles.load(self.node)
+            return
+        
+        if self.useAtlas:
+            textures = {}
+            for face, suffix in faceCodes.items():
+                tex = self.resources.loadTexture(prefixFilename + suffix)
+                if tex is None:
+                    self.log.error('Failed to load texture %s%s' % (prefixFilename, suffix))
+                    break
+                textures[face] = tex
+                
+            # the faces are displayed separately if the atlas can't be built
+            if len(textures) == len(faceCodes) and self.atlas.build(textures):
+                return
+        
         for face, suffix in faceCodes.items():
-            self.setFaceTexture(face, prefixFilename + suffix)
+            filename = prefixFilename + suffix
+            if self.streaming and not self.isFaceInFrustum(face) and self._deferFaceTexture(face, filename):
+                continue
+            self.setFaceTexture(face, filename)
+            
+        if self.pendingFaces and Thread.isThreadingSupported():
+            self.streamingLock.acquire()
+            try:
+                self.queuedFaces = self.pendingFaces.items()
+            finally:
+                self.streamingLock.release()
+            if not taskMgr.hasTaskChain(PanoConstants.TASK_CHAIN_STREAMING):
+                taskMgr.setupTaskChain(PanoConstants.TASK_CHAIN_STREAMING, numThreads = 1, frameSync = False)
+            taskMgr.add(self._streamFacesTask, PanoConstants.TASK_CUBEMAP_STREAMING, 
+                        extraArgs = [], taskChain = PanoConstants.TASK_CHAIN_STREAMING)
 
 
     def setFaceTexture(self, face, filename):
@@ -818,10 +1040,133 @@ class NodeRenderer:
         Sets the texture of the specified face of the cubemap.        
         '''    
         tex = self.resources.loadTexture(filename)
+        if tex is None:
+            self.log.error('Failed to load texture %s of cubemap face %d' % (filename, face))
+            return
+        self._applyFaceTexture(face, tex)
+        
+        
+    def _applyFaceTexture(self, face, tex):
         tex.setWrapU(Texture.WMClamp)
         tex.setWrapV(Texture.WMClamp)        
         rs = self.facesGeomNodes[face].getGeomState(0).setAttrib(TextureAttrib.make(tex))
         self.facesGeomNodes[face].setGeomState(0, rs)
+        
+        
+    def _deferFaceTexture(self, face, filename):
+        '''
+        Displays a placeholder on the given face until its texture is streamed.
+        @return: True if the texture was deferred or False if it should be loaded immediately.
+        '''
+        if self.resources.isResourceLoaded(PanoConstants.RES_TYPE_TEXTURES, filename):
+            return False
+        
+        # the dimensions of the texture are needed for placing the hotspots
+        header = self.resources.loadImageHeader(filename)
+        if header is None:
+            return False
+        
+        if self.placeholderTexture is None:
+            img = PNMImage(1, 1)
+            img.fill(0.5, 0.5, 0.5)
+            self.placeholderTexture = Texture('cubemap_placeholder')
+            self.placeholderTexture.load(img)
+            
+        self.pendingFaces[face] = filename
+        self.pendingFacesDims[face] = (header.getXSize(), header.getYSize())
+        self._applyFaceTexture(face, self.placeholderTexture)
+        return True
+    
+    
+    def _streamFacesTask(self):
+        '''
+        Runs on the streaming task chain and loads the textures of the queued faces into the preload store of the
+        resource loader, from where _updateStreaming will fetch them. Faces that _updateStreaming removes from the
+        queue meanwhile are skipped.
+        '''
+        while True:
+            self.streamingLock.acquire()
+            try:
+                if not self.queuedFaces:
+                    return Task.done
+                face, filename = self.queuedFaces.pop(0)
+                self.loadingFaces[face] = filename
+            finally:
+                self.streamingLock.release()
+                
+            resource, isNew = self.resources.prefetchResource(PanoConstants.RES_TYPE_TEXTURES, filename)
+            self.streamingLock.acquire()
+            try:
+                self.streamedFaces[face] = filename
+                if self.loadingFaces.get(face) == filename:
+                    del self.loadingFaces[face]
+            finally:
+                self.streamingLock.release()
+        
+        
+    def _updateStreaming(self):
+        '''
+        Applies the textures of the faces that have entered the frustum or have been loaded in the background.
+        '''
+        self.streamingLock.acquire()
+        try:
+            streamed = self.streamedFaces.copy()
+        finally:
+            self.streamingLock.release()
+            
+        threaded = Thread.isThreadingSupported()
+        applied = 0
+        for face, filename in self.pendingFaces.items():
+            # the results of a cancelled stream are ignored
+            isStreamed = not threaded or streamed.get(face) == filename
+            if self.isFaceInFrustum(face):
+                # a face in the frustum can't wait, unless it is being loaded in the background already
+                if not isStreamed and not self._unqueueFace(face, filename):
+                    continue
+            elif applied >= self.streamingBudget or not isStreamed:
+                continue
+            
+            del self.pendingFaces[face]
+            del self.pendingFacesDims[face]
+            self.setFaceTexture(face, filename)
+            applied += 1
+                
+        self.streamingLock.acquire()
+        try:
+            for face in self.streamedFaces.keys():
+                if not self.pendingFaces.has_key(face):
+                    del self.streamedFaces[face]
+        finally:
+            self.streamingLock.release()
+                
+    
+    def _unqueueFace(self, face, filename):
+        '''
+        Removes a face from the queue of the streaming task, so that it can be loaded on the main thread without
+        being loaded twice.
+        @return: True if the face can be loaded on the main thread or False if the streaming task is loading it.
+        '''
+        self.streamingLock.acquire()
+        try:
+            if (face, filename) in self.queuedFaces:
+                self.queuedFaces.remove((face, filename))
+                return True
+            return self.loadingFaces.get(face) != filename
+        finally:
+            self.streamingLock.release()
+                
+    
+    def _cancelStreaming(self):
+        taskMgr.remove(PanoConstants.TASK_CUBEMAP_STREAMING)
+        self.pendingFaces = {}
+        self.pendingFacesDims = {}
+        self.streamingLock.acquire()
+        try:
+            self.streamedFaces = {}
+            # a load that is in progress will still complete, but its result will be ignored
+            self.queuedFaces = []
+        finally:
+            self.streamingLock.release()
 
 
     
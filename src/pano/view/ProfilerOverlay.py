@@ -0,0 +1,115 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+
+import logging
+
+from pandac.PandaModules import TextNode
+from direct.gui.OnscreenText import OnscreenText
+
+from pano.constants import PanoConstants
+
+
+class ProfilerOverlay:
+    '''
+    Displays the statistics of the game's FrameProfiler at the top left corner of the screen. The timers are 
+    listed by their 95th percentile in descending order and the ones whose 95th percentile exceeds the frame
+    budget are marked with an asterisk.
+    '''
+    
+    def __init__(self, gameRef):
+        self.log = logging.getLogger('pano.profilerOverlay')
+        self.game = gameRef
+        
+        # the OnscreenText that displays the statistics, None while the overlay is hidden
+        self.text = None
+        
+        # the frame budget in milliseconds
+        self.budget = 1000.0 / 60.0
+        
+        # the statistics are refreshed at this interval in milliseconds
+        self.interval = 500.0
+        self.elapsed = 0.0
+        
+        # the maximum number of timers that are displayed
+        self.maxLines = 16
+        
+        
+    def setBudget(self, millis):
+        self.budget = millis
+        
+        
+    def isVisible(self):
+        return self.text is not None
+    
+    
+    def show(self):
+        if self.text is None:
+            self.text = OnscreenText(
+                                     text='', 
+                                     pos=(0.05 - base.getAspectRatio(), 0.92), 
+                                     scale=0.035, 
+                                     fg=(1, 1, 1, 1),
+                                     shadow=(0, 0, 0, 1),
+                                     align=TextNode.ALeft,
+                                     parent=aspect2d,
+                                     mayChange=True)
+            self.text.setBin('fixed', PanoConstants.RENDER_ORDER_CONSOLE)
+            self.elapsed = self.interval
+            
+            
+    def hide(self):
+        if self.text is not None:
+            self.text.destroy()
+            self.text = None
+            
+            
+    def toggle(self):
+        if self.text is None:
+            self.show()
+        else:
+            self.hide()
+            
+            
+    def update(self, millis):
+        if self.text is None:
+            return
+        
+        # the game's millis are 0 while paused, so the real time step is used instead
+        self.elapsed += globalClock.getDt() * 1000.0
+        if self.elapsed < self.interval:
+            return
+        self.elapsed = 0.0
+        
+        profiler = self.game.getProfiler()
+        if not profiler.isEnabled():
+            self.text.setText('profiler disabled')
+            return
+        
+        stats = profiler.getStats()
+        timers = stats.items()
+        timers.sort(key = lambda t: t[1]['p95'], reverse = True)
+        lines = ['budget %.1f ms' % self.budget, '%-20s %7s %7s %7s' % ('timer', 'p50', 'p95', 'max')]
+        for name, s in timers[:self.maxLines]:
+            mark = '*' if s['p95'] > self.budget else ' '
+            lines.append('%s%-19s %7.2f %7.2f %7.2f' % (mark, name, s['p50'], s['p95'], s['max']))
+        self.text.setText('\n'.join(lines))
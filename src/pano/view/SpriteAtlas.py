@@ -0,0 +1,380 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+import logging
+
+from pandac.PandaModules import Texture, PNMImage, CardMaker
+from pandac.PandaModules import NodePath, Point2
+
+
+class AtlasRegion:
+    '''
+    The area of an atlas page that holds the image of a sprite.
+    '''
+    def __init__(self, atlas, name, page, x, y, w, h):
+        self.atlas = atlas
+        
+        # the name of the image
+        self.name = name
+        
+        # the AtlasPage that contains the image
+        self.page = page
+        
+        # the position and dimensions of the image in the page, in pixels measured from the top left corner
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        
+        # the number of sprites that display the region
+        self.refs = 0
+        
+        # the value of the atlas' clock when the region was last acquired, used to evict the least recently used regions
+        self.lastUse = 0
+        
+        # the cards that display the region, indexed by True for cards whose V coordinate is flipped by their parent
+        self.cards = {}
+        
+        
+    def getTexture(self):
+        return self.page.texture
+    
+    
+    def getCard(self, flipV = False):
+        '''
+        Returns a quad like the one of SpritesUtil.getCard whose texture coordinates map to the region of the image 
+        in the page. The sprites instance this card under their nodes and set the page's texture on them.
+        @param flipV: True if the card will be parented to a node that flips the V coordinate, like the nodes
+        of the 2D sprites do.
+        '''
+        card = self.cards.get(flipV)
+        if card is None:
+            size = float(self.page.size)
+            
+            # insets the coordinates by half a texel so that linear filtering doesn't sample the neighbouring images
+            u0 = (self.x + 0.5) / size
+            u1 = (self.x + self.w - 0.5) / size
+            if flipV:
+                # the parent negates V and the texture wraps, so these map to 1 - v0 and 1 - v1 respectively
+                v0 = (self.y + 0.5) / size
+                v1 = (self.y + self.h - 0.5) / size
+            else:
+                # rows of the page are counted from the top of the image while v runs from its bottom
+                v0 = 1.0 - (self.y + self.h - 0.5) / size
+                v1 = 1.0 - (self.y + 0.5) / size
+                
+            cm = CardMaker('atlasCard_' + self.name)
+            cm.setFrame(-0.5, 0.5, -0.5, 0.5)
+            cm.setColor(1, 1, 1, 1)
+            cm.setUvRange(Point2(u0, v0), Point2(u1, v1))
+            card = NodePath(cm.generate())
+            self.cards[flipV] = card
+        return card
+    
+    
+class AtlasPage:
+    '''
+    A texture of the atlas. The free space of the page is tracked as a list of rectangles which are split 
+    by the guillotine method whenever an image is packed.
+    '''
+    def __init__(self, num, size):
+        self.size = size
+        
+        # the image of the page, the texture is loaded from it when the page is dirty
+        self.image = PNMImage(size, size, 4)
+        self.image.fill(0, 0, 0)
+        self.image.alphaFill(0)
+        
+        self.texture = Texture('sprites_atlas_%i' % num)
+        self.texture.setMinfilter(Texture.FTLinear)
+        self.texture.setMagfilter(Texture.FTLinear)
+        self.texture.setWrapU(Texture.WMRepeat)
+        self.texture.setWrapV(Texture.WMRepeat)
+        
+        # list of (x, y, width, height) tuples
+        self.freeRects = [(0, 0, size, size)]
+        
+        # the regions packed in the page
+        self.regions = []
+        
+        # True if the image has changed since the texture was last loaded
+        self.dirty = False
+        
+        
+    def allocate(self, w, h):
+        '''
+        Finds space for a rectangle of the given dimensions.
+        @return: A (x, y) tuple with the position of the rectangle or None if it doesn't fit in the page.
+        '''
+        best = None
+        bestArea = 0
+        for i, (fx, fy, fw, fh) in enumerate(self.freeRects):
+            if fw >= w and fh >= h and (best is None or fw * fh < bestArea):
+                best = i
+                bestArea = fw * fh
+        if best is None:
+            return None
+        
+        fx, fy, fw, fh = self.freeRects.pop(best)
+        
+        # splits the remaining space along the shorter leftover axis, which keeps the larger free rectangle
+        if fw - w < fh - h:
+            right = (fx + w, fy, fw - w, h)
+            bottom = (fx, fy + h, fw, fh - h)
+        else:
+            right = (fx + w, fy, fw - w, fh)
+            bottom = (fx, fy + h, w, fh - h)
+        for r in (right, bottom):
+            if r[2] > 0 and r[3] > 0:
+                self.freeRects.append(r)
+        return (fx, fy)
+    
+    
+    def free(self, x, y, w, h):
+        '''
+        Returns a rectangle to the free space of the page and merges it with its neighbours, which undoes
+        the splits of allocate() and keeps the free space from fragmenting.
+        '''
+        if len(self.regions) == 0:
+            self.freeRects = [(0, 0, self.size, self.size)]
+            return
+        
+        rect = (x, y, w, h)
+        merged = True
+        while merged:
+            merged = False
+            x, y, w, h = rect
+            for i, (fx, fy, fw, fh) in enumerate(self.freeRects):
+                if fy == y and fh == h and (fx + fw == x or x + w == fx):
+                    rect = (min(x, fx), y, w + fw, h)
+                elif fx == x and fw == w and (fy + fh == y or y + h == fy):
+                    rect = (x, min(y, fy), w, h + fh)
+                else:
+                    continue
+                del self.freeRects[i]
+                merged = True
+                break
+        self.freeRects.append(rect)
+    
+    
+class SpriteAtlas:
+    '''
+    Packs the images of small sprites into a few large textures, the pages, so that sprites with different images 
+    share the same texture. This removes the texture binds between the sprites and the memory overhead of many small 
+    textures and allows SpriteBatch to merge the cards of sprites with different images into a single geom.
+    
+    Images are packed at load time by acquire(), which returns the region of a page that holds the image. 
+    Sprites display a region by instancing its card, which has its texture coordinates mapped to the region. 
+    Regions are reference counted, when a sprite is removed it releases its region. Released regions remain in 
+    their page so that they can be reused when the same image is displayed again, until their space is needed 
+    for another image, in which case the least recently used are evicted. Pages that are left without any acquired 
+    regions are dropped by commit().
+    
+    Images that are larger than maxImageSize in any dimension are not packed, their sprites should use the 
+    image's texture instead. 
+    '''
+    
+    def __init__(self, resources, pageSize = 1024, maxPages = 4, maxImageSize = None, padding = 1):
+        '''
+        @param resources: The ResourceLoader that loads the images.
+        @param pageSize: The width and height of each page in pixels.
+        @param maxPages: The maximum number of pages.
+        @param maxImageSize: The maximum width or height of the packed images, defaults to a quarter of the page size.
+        @param padding: The number of pixels left empty around each image.
+        '''
+        self.log = logging.getLogger('pano.spriteAtlas')
+        
+        self.resources = resources
+        self.pageSize = pageSize
+        self.maxPages = maxPages
+        self.maxImageSize = maxImageSize if maxImageSize is not None else pageSize / 4
+        self.padding = padding
+        
+        # list of AtlasPage
+        self.pages = []
+        
+        # the packed regions, indexed by image name
+        self.regions = {}
+        
+        # incremented on every acquire, orders the regions by their last use
+        self.clock = 0
+        
+        # statistics
+        self.packed = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.uploads = 0
+        self.pagesCounter = 0
+        
+        
+    def acquire(self, imageName):
+        '''
+        Returns the region that holds the given image, packing the image in the atlas if it isn't already.
+        Each call must be matched by a call to release() when the image isn't displayed anymore.
+        @param imageName: The filename of the image as a texture resource.
+        @return: An AtlasRegion or None if the image can't be packed, e.g. because it is too large.
+        '''
+        self.clock += 1
+        region = self.regions.get(imageName)
+        if region is None:
+            region = self._pack(imageName)
+            if region is None:
+                self.rejected += 1
+                return None
+        region.refs += 1
+        region.lastUse = self.clock
+        return region
+    
+    
+    def release(self, region):
+        '''
+        Signals that a sprite doesn't display the given region anymore.
+        '''
+        if region.refs > 0:
+            region.refs -= 1
+            
+            
+    def commit(self):
+        '''
+        Loads the textures of the pages that have changed and drops the pages without acquired regions. 
+        It should be called once per frame before rendering.
+        '''
+        for page in self.pages[:]:
+            if len(self.pages) > 1 and not [r for r in page.regions if r.refs > 0]:
+                for r in page.regions[:]:
+                    self._evict(r)
+                self.pages.remove(page)
+                continue
+            
+            if page.dirty:
+                page.texture.load(page.image)
+                page.texture.setMinfilter(Texture.FTLinear)
+                page.texture.setMagfilter(Texture.FTLinear)
+                page.dirty = False
+                self.uploads += 1
+                
+                
+    def purge(self):
+        '''
+        Evicts all released regions and drops the pages that are left empty.
+        '''
+        for region in self.regions.values():
+            if region.refs == 0:
+                self._evict(region)
+        self.pages = [p for p in self.pages if p.regions or p is self.pages[0]]
+        
+        
+    def clear(self):
+        '''
+        Removes all regions and pages.
+        '''
+        self.regions = {}
+        self.pages = []
+        
+        
+    def getStats(self):
+        '''
+        @return: A dictionary with the number of pages, packed images, acquired images and counters of the packed,
+        evicted and rejected images and of the uploaded pages.
+        '''
+        return {
+            'pages'    : len(self.pages),
+            'images'   : len(self.regions),
+            'acquired' : len([r for r in self.regions.values() if r.refs > 0]),
+            'packed'   : self.packed,
+            'evicted'  : self.evicted,
+            'rejected' : self.rejected,
+            'uploads'  : self.uploads
+        }
+        
+        
+    def _pack(self, imageName):
+        tex = self.resources.loadTexture(imageName)
+        if tex is None:
+            return None
+        
+        w, h = tex.getXSize(), tex.getYSize()
+        if w > self.maxImageSize or h > self.maxImageSize:
+            return None
+        
+        img = PNMImage()
+        if not tex.store(img):
+            self.log.error('Failed to read the image of texture %s' % imageName)
+            return None
+        if not img.hasAlpha():
+            img.addAlpha()
+            img.alphaFill(1.0)
+        
+        pw, ph = w + 2 * self.padding, h + 2 * self.padding
+        page, pos = self._allocate(pw, ph)
+        if page is None:
+            self.log.debug('No space left in the atlas for image %s' % imageName)
+            return None
+        
+        x, y = pos[0] + self.padding, pos[1] + self.padding
+        page.image.copySubImage(img, x, y, 0, 0, w, h)
+        page.dirty = True
+        
+        region = AtlasRegion(self, imageName, page, x, y, w, h)
+        page.regions.append(region)
+        self.regions[imageName] = region
+        self.packed += 1
+        return region
+    
+    
+    def _allocate(self, w, h):
+        '''
+        Finds space for a rectangle in the pages, evicting released regions or adding a new page if there is none.
+        @return: A (page, (x, y)) tuple or (None, None) if there is no space.
+        '''
+        for page in self.pages:
+            pos = page.allocate(w, h)
+            if pos is not None:
+                return page, pos
+            
+        released = [r for r in self.regions.values() if r.refs == 0]
+        released.sort(key = lambda r: r.lastUse)
+        for region in released:
+            page = region.page
+            self._evict(region)
+            pos = page.allocate(w, h)
+            if pos is not None:
+                return page, pos
+            
+        if len(self.pages) < self.maxPages:
+            self.pagesCounter += 1
+            page = AtlasPage(self.pagesCounter, self.pageSize)
+            self.pages.append(page)
+            pos = page.allocate(w, h)
+            if pos is not None:
+                return page, pos
+        return None, None
+    
+    
+    def _evict(self, region):
+        page = region.page
+        page.regions.remove(region)
+        page.free(region.x - self.padding, region.y - self.padding, 
+                  region.w + 2 * self.padding, region.h + 2 * self.padding)
+        del self.regions[region.name]
+        region.cards = {}
+        self.evicted += 1
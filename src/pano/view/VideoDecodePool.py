@@ -0,0 +1,293 @@
+'''
+    Copyright (c) 2008 Georgios Giannoudovardis, <vardis.g@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+'''
+import logging
+
+from pano.view.VideoPlayer import VideoPlayer
+
+
+class VideoDecoder:
+    '''
+    A video that is decoded once for all the sprites that display it.
+    '''
+    def __init__(self, pool, key, texture, anim):
+        self.pool = pool
+        
+        # the (video, audio) filenames
+        self.key = key
+        
+        # the MovieTexture that decodes the video
+        self.texture = texture
+        
+        # the object that controls the playback, i.e. the texture or the audio that the texture is synchronized to
+        self.anim = anim
+        
+        # the VideoHandles of the sprites that display the video
+        self.handles = []
+        
+        # True if the video is being decoded
+        self.playing = False
+        
+        # the number of seconds the video has been decoded for
+        self.decodeTime = 0.0
+        
+        
+    def resume(self):
+        self.anim.play()
+        self.playing = True
+        
+        
+    def pause(self):
+        t = self.anim.getTime()
+        self.anim.stop()
+        self.anim.setTime(t)
+        self.playing = False
+        
+        
+    def stop(self):
+        self.anim.stop()
+        self.playing = False
+        
+        
+    def isWanted(self):
+        '''
+        @return: True if a sprite has asked for the video to play.
+        '''
+        for h in self.handles:
+            if h.wantPlay:
+                return True
+        return False
+    
+    
+    def getNumActive(self):
+        '''
+        @return: The number of sprites that want to play the video and are visible.
+        '''
+        return len([h for h in self.handles if h.isActive()])
+    
+    
+class VideoHandle:
+    '''
+    The interface through which a sprite controls a video. It replaces the MovieTexture or AudioSound that was 
+    stored in the 'video' tag of the sprite's node and supports the subset of their methods that the sprites use. 
+    
+    Play and stop only express the sprite's intention, the VideoDecodePool decides whether the video is decoded.  
+    '''
+    def __init__(self, decoder):
+        self.decoder = decoder
+        
+        # True if the sprite wants the video to play
+        self.wantPlay = False
+        
+        # True if the sprite is hidden
+        self.hidden = False
+        
+        # False if the sprite is outside the frustum
+        self.inView = True
+        
+        
+    def getTexture(self):
+        return self.decoder.texture
+    
+    
+    def play(self):
+        self.wantPlay = True
+        
+        
+    def stop(self):
+        self.wantPlay = False
+        
+        
+    def setLoop(self, loop):
+        self.decoder.anim.setLoop(loop)
+        
+        
+    def getTime(self):
+        return self.decoder.anim.getTime()
+    
+    
+    def setTime(self, t):
+        self.decoder.anim.setTime(t)
+        
+        
+    def setHidden(self, hidden):
+        self.hidden = hidden
+        
+        
+    def setInView(self, inView):
+        self.inView = inView
+        
+        
+    def isActive(self):
+        return self.wantPlay and not self.hidden and self.inView
+    
+    
+    def release(self):
+        '''
+        Signals that the sprite has been destroyed, the handle must not be used afterwards.
+        '''
+        if self.decoder is not None:
+            self.decoder.pool.release(self)
+            self.decoder = None
+            
+
+class VideoDecodePool:
+    '''
+    Manages the decoding of the videos of sprites. Sprites that display the same video share a single decoder 
+    and videos are only decoded while at least one of their sprites plays them and is visible, i.e. it isn't 
+    hidden and lies on a face of the cubemap that is in the frustum. Additionally the number of videos that are 
+    decoded concurrently is limited, the videos with the most visible sprites are preferred while the rest are 
+    paused until a decoder becomes available.
+    
+    The decoding of a MovieTexture takes place during Panda's cull traversal, so instead of timing it the pool
+    reports for how long each video has been decoded.
+    '''
+    
+    def __init__(self, resources, maxDecoders = 4):
+        '''
+        @param resources: The ResourceLoader that locates the videos and audio files.
+        @param maxDecoders: The maximum number of videos that are decoded concurrently, 0 for no limit.
+        '''
+        self.log = logging.getLogger('pano.videoDecodePool')
+        
+        self.resources = resources
+        self.maxDecoders = maxDecoders
+        
+        # the open decoders indexed by their (video, audio) filenames
+        self.decoders = {}
+        
+        # statistics
+        self.opened = 0
+        self.pauses = 0
+        self.capped = 0
+        self.decodeTime = 0.0
+        
+        
+    def setMaxDecoders(self, maxDecoders):
+        self.maxDecoders = maxDecoders
+        
+        
+    def getMaxDecoders(self):
+        return self.maxDecoders
+    
+    
+    def acquire(self, video, audio = None):
+        '''
+        Returns a handle for playing the given video, the video is opened if no other sprite displays it. 
+        The handle must be released when the sprite is destroyed.
+        @param video: The filename of the video.
+        @param audio: The filename of the audio that the video is synchronized to or None. 
+        @return: A VideoHandle or None if the video couldn't be opened.
+        '''
+        key = (video, audio)
+        decoder = self.decoders.get(key)
+        if decoder is None:
+            texture, anim = VideoPlayer.openVideo(self.resources, video, audio)
+            if texture is None:
+                return None
+            
+            decoder = VideoDecoder(self, key, texture, anim)
+            self.decoders[key] = decoder
+            self.opened += 1
+            
+        handle = VideoHandle(decoder)
+        decoder.handles.append(handle)
+        return handle
+    
+    
+    def release(self, handle):
+        decoder = handle.decoder
+        decoder.handles.remove(handle)
+        if not decoder.handles:
+            decoder.stop()
+            del self.decoders[decoder.key]
+            
+            
+    def update(self, millis):
+        '''
+        Resumes or pauses the decoders according to the state of their sprites, it should be called once per frame.
+        @param millis: The milliseconds elapsed since the last frame.
+        '''
+        for decoder in self.decoders.values():
+            if decoder.playing:
+                decoder.decodeTime += millis / 1000.0
+                self.decodeTime += millis / 1000.0
+                
+        active = [(d.getNumActive(), d.playing, d) for d in self.decoders.values()]
+        active = [a for a in active if a[0] > 0]
+        
+        # prefers the videos with the most visible sprites and then the ones already decoded, to avoid restarting them
+        active.sort(key = lambda a: (a[0], a[1]), reverse = True)
+        if self.maxDecoders > 0 and len(active) > self.maxDecoders:
+            self.capped += len(active) - self.maxDecoders
+            active = active[:self.maxDecoders]
+            
+        selected = [a[2] for a in active]
+        for decoder in self.decoders.values():
+            if decoder in selected:
+                if not decoder.playing:
+                    decoder.resume()
+            elif decoder.playing:
+                if decoder.isWanted():
+                    decoder.pause()
+                    self.pauses += 1
+                else:
+                    decoder.stop()
+                    
+                    
+    def clear(self):
+        '''
+        Stops and closes all videos, the handles that have been acquired must not be used afterwards.
+        '''
+        for decoder in self.decoders.values():
+            decoder.stop()
+            for h in decoder.handles:
+                h.decoder = None
+        self.decoders = {}
+                    
+                    
+    def getStats(self):
+        '''
+        @return: A dictionary with the number of open and playing decoders, the number of sprites that display them,
+        the number of videos that have been opened, paused or held back by the maximum number of decoders and the 
+        total time in seconds that videos have been decoded for.
+        '''
+        return {
+            'decoders'   : len(self.decoders),
+            'playing'    : len([d for d in self.decoders.values() if d.playing]),
+            'sprites'    : sum([len(d.handles) for d in self.decoders.values()]),
+            'opened'     : self.opened,
+            'pauses'     : self.pauses,
+            'capped'     : self.capped,
+            'decodeTime' : self.decodeTime
+        }
+    
+    
+    def getDecodeTimes(self):
+        '''
+        @return: A dictionary with the time in seconds that each open video has been decoded for, indexed by the
+        video's filename.
+        '''
+        times = {}
+        for (video, audio), decoder in self.decoders.items():
+            times[video] = times.get(video, 0.0) + decoder.decodeTime
+        return times
@@ -140,16 +140,25 @@ class VideoPlayer:
         
         
     def renderToTexture(resources, video, audio):
-        
+        videoTex, anim = VideoPlayer.openVideo(resources, video, audio)
+        return anim
+    
+    
+    def openVideo(resources, video, audio):
+        '''
+        Loads a video as a MovieTexture and synchronizes it to the given audio.
+        @return: A (texture, anim) tuple where anim is the AudioSound if there is audio or the texture otherwise, 
+        or (None, None) if the video couldn't be loaded.
+        '''
         videoTex = loader.loadTexture(resources.getResourceFullPath(PanoConstants.RES_TYPE_VIDEOS, video))
         
         if videoTex is None:
             print "Couldn't load video %s" % video
-            return None        
+            return None, None
     
         if (videoTex.getType().getName() != "MovieTexture"):
             print "MovieTexture support is not enabled, cannot proceed."
-            return None
+            return None, None
                 
         videoTex.setWrapU(Texture.WMClamp)
         videoTex.setWrapV(Texture.WMClamp)  
@@ -160,11 +169,12 @@ class VideoPlayer:
         if audio is not None:
             vidSound = loader.loadSfx(resources.getResourceFullPath(PanoConstants.RES_TYPE_MUSIC, audio))
             videoTex.synchronizeTo(vidSound)
-            return vidSound
+            return videoTex, vidSound
         else:
-            return videoTex
+            return videoTex, videoTex
         
     renderToGeom = staticmethod(renderToGeom)
     renderToTexture = staticmethod(renderToTexture)
+    openVideo = staticmethod(openVideo)
             
         
\ No newline at end of file
@@ -37,6 +37,7 @@ from pano.resources.ResourcesTypes import ResourcesTypes
 from pano.messaging import Messenger
 from pano.model.inventory import Inventory
 from pano.model.Sprite import Sprite
+from pano.view.sprites import SpriteBatch
 
 
 class SlotsLayout:
@@ -287,6 +288,12 @@ class InventoryView:
         # stores image objects for each item's icon
         self.itemIcons = []
         
+        # renders the icons with as few geoms as possible, it is None unless sprites batching is enabled
+        self.iconsBatch = None
+        
+        # the regions of the sprites atlas that hold the images of the icons
+        self.iconsRegions = []
+        
         self.mousePointer = InventoryView.POINTER_NAME
         
         self.debugLayout = False        
@@ -303,6 +310,8 @@ class InventoryView:
             
         self.node      = aspect2d.attachNewNode(InventoryView.INVENTORY_SCENE_NODE)
         self.iconsNode = self.node.attachNewNode(InventoryView.ICONS_NODE)
+        if self.game.getConfig().getBool(PanoConstants.CVAR_SPRITES_BATCHING, False):
+            self.iconsBatch = SpriteBatch(self.iconsNode, 'inventory_icons_batch')
         
         # from here on we just initialize the member fields according to the cvars...
         cfg = self.game.getConfig()
@@ -575,11 +584,18 @@ class InventoryView:
             
     def _renderItemsIcons(self):
         
+        if self.iconsBatch is not None:
+            self.iconsBatch.clear()
         self.iconsNode.node().removeAllChildren()
         for icon in self.itemIcons:
             icon.destroy()            
         self.itemIcons = []
         
+        atlas = self.game.getView().getSpritesFactory().getAtlas()
+        for region in self.iconsRegions:
+            atlas.release(region)
+        self.iconsRegions = []
+        
         startItem = 0
         endItem = self.inventory.getSlotsCount()
         if self.itemsRange is not None:
@@ -593,16 +609,35 @@ class InventoryView:
                 # get slot position and size in aspect2d space
                 p, sz = self.slotsLayout.getRelativeSlotPosSize(s.getNum())
                 itemImage = s.getItem().getImage()
-                imagePath = self.game.getResources().getResourceFullPath(PanoConstants.RES_TYPE_TEXTURES, itemImage)
+                region = None
+                if atlas is not None:
+                    region = atlas.acquire(itemImage)
+                    
+                if region is not None:
+                    # the card of the region extends from -0.5 to 0.5, while OnscreenImage's card from -1 to 1
+                    self.iconsRegions.append(region)
+                    image = NodePath('icon_' + itemImage)
+                    region.getCard().instanceTo(image)
+                    image.setTexture(region.getTexture())
+                    scale = 0.4
+                else:
+                    image = self.game.getResources().getResourceFullPath(PanoConstants.RES_TYPE_TEXTURES, itemImage)
+                    scale = 0.2
+                    
                 iconNode = OnscreenImage(
                                          parent=self.iconsNode, 
-                                         image=imagePath, 
+                                         image=image, 
                                          pos=(p[0] + sz[0]/2.0, 0.0, p[1]+sz[1]/2.0),
-                                         scale=0.2                                      
+                                         scale=scale                                      
                                          )
                 iconNode.setTransparency(TransparencyAttrib.MAlpha)
                 iconNode.setBin("fixed", PanoConstants.RENDER_ORDER_INVENTORY_ITEMS)
                 self.itemIcons.append(iconNode)
+                if self.iconsBatch is not None:
+                    self.iconsBatch.add(iconNode)
+                    
+        if self.iconsBatch is not None:
+            self.iconsBatch.flush()
                 
     
     def _createButtons(self, cfg):
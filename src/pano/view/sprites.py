@@ -31,6 +31,8 @@ from pandac.PandaModules import TextureStage
 
 from pano.constants import PanoConstants
 from pano.view.VideoPlayer import VideoPlayer
+from pano.view.SpriteAtlas import SpriteAtlas
+from pano.view.VideoDecodePool import VideoDecodePool, VideoHandle
 
 
 class SpriteRenderInterface:
@@ -52,6 +54,16 @@ class SpriteRenderInterface:
         self.nodepath = nodepath
         self.sprite = nodepath.getPythonTag('sprite')
         self.video = nodepath.getPythonTag('video')
+        
+        # the region of the sprites atlas that holds the sprite's image or None if the image has its own texture
+        self.atlasRegion = nodepath.getPythonTag('atlas_region')
+        
+        # the SpritePool that parks the sprite when it is removed, or None if it is destroyed instead
+        self.pool = nodepath.getPythonTag('pool')
+        
+        # lets the VideoDecodePool know whether the video is visible, the node may be reused from the pool
+        if isinstance(self.video, VideoHandle):
+            self.video.setHidden(nodepath.isHidden())
         self.status = self.STOPPED 
         self.sequenceNode = self.nodepath.find('**/+SequenceNode')
         if self.sequenceNode is not None and not self.sequenceNode.isEmpty():
@@ -62,14 +74,38 @@ class SpriteRenderInterface:
         # tracks the copies of this sprite when using instancing, contains nodepaths                 
         self.instances = []
         
+        # the SpriteBatch that renders this sprite or None if it is rendered by itself
+        self.batch = None
+        
     def setPos(self, x, y, z):
         self.nodepath.setPos(x, y, z)
+        if self.batch is not None:
+            self.batch.invalidate()
         
     def isAnimated(self):
         '''
         @return: True if this sprite is animated and False if otherwise.
         '''
         return self.video is not None or self.sequenceNode is not None
+    
+    
+    def isBatchable(self):
+        '''
+        @return: True if this sprite displays a static image and can therefore be rendered by a SpriteBatch.
+        '''
+        return not self.isAnimated() and self.sprite is not None and self.sprite.image is not None and self.sprite.eggFile is None
+    
+    
+    def setBatch(self, batch):
+        '''
+        Renders this sprite through the given SpriteBatch, the sprite must be batchable.
+        @param batch: A SpriteBatch instance whose parent must be the parent of the sprite.
+        '''
+        if self.batch is not None:
+            self.batch.remove(self.nodepath)
+        self.batch = batch
+        if batch is not None:
+            batch.add(self.nodepath)
         
         
     def play(self):
@@ -123,9 +159,17 @@ class SpriteRenderInterface:
     
     def hide(self):
         self.nodepath.hide()        
+        if self.batch is not None:
+            self.batch.invalidate()
+        if isinstance(self.video, VideoHandle):
+            self.video.setHidden(True)
     
     def show(self):
         self.nodepath.show()        
+        if self.batch is not None:
+            self.batch.invalidate()
+        if isinstance(self.video, VideoHandle):
+            self.video.setHidden(False)
     
     def isVisible(self):
         return not self.nodepath.isHidden()        
@@ -146,19 +190,279 @@ class SpriteRenderInterface:
         '''
         Removes the sprite from the rendering process. This call will invalidate the current
         sprite instance as well.
+        If the sprite was created through a SpritesEngine, it is parked in the engine's pool for reuse 
+        instead of being destroyed.
         '''
         for inst in self.instances:
             inst.removeNode()
         self.instances = []
         
-        if self.video is not None:            
-            self.video.stop()            
-        
-        self.nodepath.clearTexture()    
-        self.nodepath.removeNode() 
+        if self.batch is not None:
+            self.batch.remove(self.nodepath)
+            self.batch = None
+            
+        if self.pool is None or not self.pool.park(self.nodepath):
+            SpriteRenderInterface.destroyNode(self.nodepath)
+            
+        self.atlasRegion = None
         self.nodepath = None
+        
+        
+    def destroyNode(nodepath):
+        '''
+        Stops the video of a sprite's node, releases its atlas region and removes the node. 
+        '''
+        video = nodepath.getPythonTag('video')
+        if video is not None:            
+            video.stop()            
+            if isinstance(video, VideoHandle):
+                video.release()
+            
+        region = nodepath.getPythonTag('atlas_region')
+        if region is not None:
+            region.atlas.release(region)
+        
+        nodepath.clearPythonTag('atlas_region')
+        nodepath.clearPythonTag('pool')
+        nodepath.clearTexture()    
+        nodepath.removeNode() 
+        
+    destroyNode = staticmethod(destroyNode)
 
 
+class SpriteBatch:
+    '''
+    Renders static sprites with as few geoms as possible. The sprites added to a batch are stashed and copies
+    of the visible ones are flattened under a single node, which merges the cards of sprites that share the same
+    render state, i.e. texture and bin, into a single geom and thus into a single draw call.
+    
+    The batch is rebuilt by flush() whenever a sprite has been added, removed, moved, hidden or shown, so it suits
+    sprites that change rarely such as the sprites of hotspots and the icons of the inventory.
+    '''
+    
+    def __init__(self, parent, name = 'sprites_batch'):
+        '''
+        @param parent: The NodePath that parents the sprites of the batch.
+        @param name: The name of the node that parents the flattened sprites.
+        '''
+        self.parent = parent
+        self.name = name
+        
+        # the NodePaths of the batched sprites
+        self.sprites = []
+        
+        # parents the flattened copies of the visible sprites
+        self.batchNode = None
+        
+        # True if the batch must be rebuilt
+        self.dirty = False
+        
+        # the number of geoms of the last build
+        self.numGeoms = 0
+        
+        
+    def add(self, nodepath):
+        '''
+        Adds a sprite to the batch, the sprite will be rendered by the batch after the next call to flush().
+        @param nodepath: The NodePath of the sprite, which must be a child of the batch's parent.
+        '''
+        nodepath.stash()
+        self.sprites.append(nodepath)
+        self.dirty = True
+        
+        
+    def remove(self, nodepath):
+        '''
+        Removes a sprite from the batch and renders it by itself again.
+        '''
+        if nodepath in self.sprites:
+            self.sprites.remove(nodepath)
+            nodepath.unstash()
+            self.dirty = True
+            
+            
+    def invalidate(self):
+        '''
+        Signals that the position or the visibility of a sprite has changed.
+        '''
+        self.dirty = True
+        
+        
+    def flush(self):
+        '''
+        Rebuilds the batch if it has been invalidated, it should be called once per frame.
+        '''
+        if not self.dirty:
+            return
+        self.dirty = False
+        
+        if self.batchNode is not None:
+            self.batchNode.removeNode()
+        self.batchNode = self.parent.attachNewNode(self.name)
+        
+        for np in self.sprites:
+            if not np.isHidden():
+                np.copyTo(self.batchNode)
+        self.batchNode.flattenStrong()
+        
+        self.numGeoms = 0
+        for geomNode in self.batchNode.findAllMatches('**/+GeomNode').asList():
+            self.numGeoms += geomNode.node().getNumGeoms()
+            
+            
+    def clear(self):
+        '''
+        Removes the flattened sprites, the batched sprites are released to their owners.
+        '''
+        for np in self.sprites:
+            if not np.isEmpty():
+                np.unstash()
+        self.sprites = []
+        
+        if self.batchNode is not None:
+            self.batchNode.removeNode()
+            self.batchNode = None
+        self.dirty = False
+        self.numGeoms = 0
+        
+        
+    def getStats(self):
+        '''
+        @return: A dictionary with the number of batched sprites and the number of geoms that render them.
+        '''
+        return {
+            'sprites' : len(self.sprites),
+            'geoms'   : self.numGeoms
+        }
+    
+
+class SpritePool:
+    '''
+    Keeps the nodes of removed sprites so that they can be reused by the next sprites of the same resource, which
+    is common when going from node to node as doors, arrows and props are shared among the nodes of a game.
+    
+    The nodes are parked, i.e. detached from the scenegraph and their videos stopped, while the textures and atlas 
+    regions they reference are kept. When more than capacity nodes are parked the least recently parked ones are 
+    destroyed. Nodes are keyed by the sprite's name and the kind of the renderer, since 2D and 3D sprites can't be 
+    exchanged.
+    '''
+    
+    def __init__(self, capacity = 32):
+        '''
+        @param capacity: The maximum number of parked nodes, 0 disables pooling.
+        '''
+        self.capacity = capacity
+        
+        # lists of parked nodes indexed by key
+        self.parked = {}
+        
+        # the keys of the parked nodes in the order they were parked
+        self.order = []
+        
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.parks = 0
+        self.evicted = 0
+        
+        
+    def setCapacity(self, capacity):
+        self.capacity = capacity
+        self._evict()
+        
+        
+    def getCapacity(self):
+        return self.capacity
+    
+    
+    def acquire(self, key, sprite):
+        '''
+        Returns a parked node of the given key and restarts its video if it has one.
+        @param key: A (sprite name, kind) tuple.
+        @param sprite: The Sprite resource, nodes that were created from a different instance of the resource, 
+        e.g. because it was reloaded since, are destroyed.
+        @return: A detached NodePath or None if there isn't a parked node with this key.
+        '''
+        nodes = self.parked.get(key)
+        while nodes:
+            # take the least recently parked node, which is the one whose key comes first in self.order
+            np = nodes.pop(0)
+            self.order.remove(key)
+            if np.getPythonTag('sprite') is not sprite:
+                SpriteRenderInterface.destroyNode(np)
+                self.evicted += 1
+                continue
+            
+            self.hits += 1
+            np.show()
+            video = np.getPythonTag('video')
+            if video is not None:
+                video.play()
+            return np
+        
+        self.misses += 1
+        return None
+    
+    
+    def park(self, nodepath):
+        '''
+        Parks the node of a removed sprite.
+        @return: True if the node was parked or False if pooling is disabled, in which case the caller 
+        should destroy the node.
+        '''
+        if self.capacity <= 0:
+            return False
+        
+        key = nodepath.getPythonTag('pool_key')
+        nodepath.detachNode()
+        video = nodepath.getPythonTag('video')
+        if video is not None:            
+            video.stop()
+            
+        self.parked.setdefault(key, []).append(nodepath)
+        self.order.append(key)
+        self.parks += 1
+        self._evict()
+        return True
+    
+    
+    def clear(self):
+        '''
+        Destroys all parked nodes.
+        '''
+        for nodes in self.parked.values():
+            for np in nodes:
+                SpriteRenderInterface.destroyNode(np)
+        self.parked = {}
+        self.order = []
+        
+        
+    def getStats(self):
+        '''
+        @return: A dictionary with the number of parked nodes, the pool's hits and misses and the number of 
+        parked and evicted nodes.
+        '''
+        return {
+            'size'    : len(self.order),
+            'hits'    : self.hits,
+            'misses'  : self.misses,
+            'parked'  : self.parks,
+            'evicted' : self.evicted
+        }
+        
+        
+    def _evict(self):
+        while len(self.order) > max(self.capacity, 0):
+            key = self.order.pop(0)
+            
+            # the nodes of a key are parked in order, so the first is the least recently parked
+            np = self.parked[key].pop(0)
+            if not self.parked[key]:
+                del self.parked[key]
+            SpriteRenderInterface.destroyNode(np)
+            self.evicted += 1
+            
+
 class SpritesEngine:
     """
     Provides utility methods for rendering sprites.
@@ -173,20 +477,34 @@ class SpritesEngine:
         # a CardMaker instance for building sprite quads
         self.cardMaker = None
         
+        # the quad that is shared by the cards of all sprites, see SpritesUtil.getCard
+        self.card = None
+        
         # sprites root
         self.sprite2d = None
         
         # root for sprites that need to consider the aspect ratio when rendering
         self.aspect_sprite2d = None
         
+        # the SpriteAtlas that packs the images of the sprites or None if each image uses its own texture 
+        self.atlas = None
+        
+        # parks the nodes of the removed sprites for reuse
+        self.pool = SpritePool()
+        
+        # decodes the videos of the sprites
+        self.videos = None
+        
         
     def initialize(self, resources):
         '''
         Performs any first-time initializations. 
         '''        
         self.resources = resources
+        self.videos = VideoDecodePool(resources)
         self.cardMaker = CardMaker('spritesMaker')
         self.cardMaker.setFrame(-0.5, 0.5, -0.5, 0.5)
+        self.card = SpritesUtil.getCard()
         self.sprite2d = self._createSpritesNodeSetup(render2d)
         self.aspect_sprite2d = self._createSpritesNodeSetup(aspect2d)
         __builtins__['sprite2d'] = self.sprite2d
@@ -197,6 +515,48 @@ class SpritesEngine:
         self.counter = 0            
         
         
+    def dispose(self):
+        '''
+        Destroys the nodes parked in the pool, closes the videos of the sprites and empties the atlas.
+        '''
+        self.pool.clear()
+        if self.videos is not None:
+            self.videos.clear()
+        if self.atlas is not None:
+            self.atlas.clear()
+            
+            
+    def update(self, millis):
+        '''
+        Updates the textures of the atlas with the images that were packed during the frame and 
+        resumes or pauses the videos of the sprites according to their visibility.
+        '''
+        if self.atlas is not None:
+            self.atlas.commit()
+        self.videos.update(millis)
+            
+            
+    def enableAtlas(self, pageSize = 1024, maxPages = 4):
+        '''
+        Packs the images of the sprites that are created from now on into the pages of a SpriteAtlas.
+        @param pageSize: The width and height of the pages in pixels.
+        @param maxPages: The maximum number of pages.
+        '''
+        self.atlas = SpriteAtlas(self.resources, pageSize, maxPages)
+        
+        
+    def getAtlas(self):
+        return self.atlas
+    
+    
+    def getPool(self):
+        return self.pool
+    
+    
+    def getVideos(self):
+        return self.videos
+        
+        
     def _createSpritesNodeSetup(self, parent):
         '''
         Setups a new scenegraph that allows using screen coordinates instead of 3D. The conversions are automated
@@ -234,24 +594,49 @@ class SpritesEngine:
         @param sprite: A Sprite resource that describes the properties of the sprite to created.
         @return: A SpriteRenderInterface instance or None if it failed to create the sprite.
         '''
+        poolKey = (sprite.name, '2d')
+        spriteNP = self.pool.acquire(poolKey, sprite)
+        if spriteNP is not None:
+            spriteNP.setName(self.getSpriteNodeName(sprite.name))
+            spriteNP.setPos(0, 1, 0)
+            spriteNP.reparentTo(self.sprite2d)
+            return SpriteRenderInterface(spriteNP)
+        
+        tex = None
         if sprite.eggFile is not None:
             spriteNP = self.resources.loadModel(sprite.eggFile)
-            tex = None
         else:        
             if sprite.video is not None:
-                card = self.cardMaker.generate()
-                tex = VideoPlayer.renderToTexture(self.resources, video=sprite.video, audio=sprite.audio)
+                video = self.videos.acquire(sprite.video, sprite.audio)
+                if video is None:
+                    self.log.error('Could not load video for sprite: %s' % sprite.name)
+                    return None
+                tex = video.getTexture()
             elif sprite.image is not None:
-                card = self.cardMaker.generate()
-                tex = self.resources.loadTexture(sprite.image)
-                sprite.width = tex.getXSize()
-                sprite.height = tex.getYSize()
+                region = None
+                if self.atlas is not None:
+                    region = self.atlas.acquire(sprite.image)
+                    
+                if region is not None:
+                    spriteNP = NodePath(sprite.name)
+                    region.getCard(True).instanceTo(spriteNP)
+                    spriteNP.setTexture(region.getTexture())
+                    spriteNP.setPythonTag('atlas_region', region)
+                    sprite.width = region.w
+                    sprite.height = region.h
+                else:
+                    tex = self.resources.loadTexture(sprite.image)
+                    sprite.width = tex.getXSize()
+                    sprite.height = tex.getYSize()
             else:
                 self.log.error('Could not determine type for sprite: %s' % sprite.name)
                 return None
             
-            spriteNP = NodePath(card)
-            spriteNP.setTexture(tex)
+            # the sprite's node only holds its state, its geometry is an instance of the shared card
+            if tex is not None:
+                spriteNP = NodePath(sprite.name)
+                self.card.instanceTo(spriteNP)
+                spriteNP.setTexture(tex)
             
         nodeName = self.getSpriteNodeName(sprite.name)             
         spriteNP.setName(nodeName)                    
@@ -265,15 +650,38 @@ class SpritesEngine:
         spriteNP.setDepthWrite(False)
         spriteNP.setBin("fixed", PanoConstants.RENDER_ORDER_SPRITES)
         spriteNP.setPythonTag('sprite', sprite)
+        spriteNP.setPythonTag('pool', self.pool)
+        spriteNP.setPythonTag('pool_key', poolKey)
         
         if sprite.video is not None:
-            spriteNP.setPythonTag('video', tex)
-            tex.setLoop(True)
-            tex.play()       
+            spriteNP.setPythonTag('video', video)
+            video.setLoop(True)
+            video.play()       
             
         return SpriteRenderInterface(spriteNP)
                  
     
+    def createSprite3D(self, sprite, parent):
+        '''
+        Creates the node of a sprite for NodeRenderer, see SpritesUtil.createSprite3D. The node is reused from 
+        the pool if a sprite of the same resource has been removed and it is packed in the atlas if one is enabled.
+        @param sprite: A Sprite resource that describes the properties of the sprite to created.
+        @param parent: The NodePath that will parent the sprite's node.
+        @return: The NodePath of the sprite or None if it failed to create it.
+        '''
+        poolKey = (sprite.name, '3d')
+        nodePath = self.pool.acquire(poolKey, sprite)
+        if nodePath is not None:
+            nodePath.setName(SpritesUtil.getSpriteNodeName(sprite.name))
+            nodePath.reparentTo(parent)
+        else:
+            nodePath = SpritesUtil.createSprite3D(self.resources, sprite, parent, self.atlas, self.videos)
+            if nodePath is not None:
+                nodePath.setPythonTag('pool', self.pool)
+                nodePath.setPythonTag('pool_key', poolKey)
+        return nodePath
+    
+    
     def getSpriteNodeName(self, spriteName):
         self.counter += 1
         return PanoConstants.SPRITES_NAME_PREFIX + spriteName + ('_%i' % self.counter) 
@@ -282,16 +690,32 @@ class SpritesEngine:
 class SpritesUtil:
     counter = 0
     
-    def createSprite3D(resources, sprite, parentNode):
+    # the quad that is shared by the cards of all sprites
+    card = None
+    
+    def getCard():
+        '''
+        Returns the quad that is used as the geometry of the sprites. It extends from -0.5 to 0.5 in the XZ plane 
+        and faces towards -Y. The sprites instance this quad under their nodes, so that all of them share the
+        same geom.
+        '''
+        if SpritesUtil.card is None:
+            cm = CardMaker('spriteCard')
+            cm.setFrame(-0.5, 0.5, -0.5, 0.5)
+            cm.setColor(1, 1, 1, 1)
+            SpritesUtil.card = NodePath(cm.generate())
+        return SpritesUtil.card
+    
+    def createSprite3D(resources, sprite, parentNode, atlas = None, videos = None):
         nodeName = SpritesUtil.getSpriteNodeName(sprite.name)
         nodePath = None
 
         if sprite.eggFile is not None:
             nodePath = SpritesUtil.createImageSequenceSprite3D(resources, sprite, parentNode)
         elif sprite.video is not None:
-            nodePath = SpritesUtil.createVideoSprite3D(resources, sprite, parentNode)
+            nodePath = SpritesUtil.createVideoSprite3D(resources, sprite, parentNode, videos)
         elif sprite.image is not None:
-            nodePath = SpritesUtil.createImageSprite3D(resources, sprite, parentNode)
+            nodePath = SpritesUtil.createImageSprite3D(resources, sprite, parentNode, atlas)
         else:
             print 'Could not determine type for sprite: %s' % sprite.name
 
@@ -304,21 +728,33 @@ class SpritesUtil:
         return nodePath
     
      
-    def createVideoSprite3D(resources, sprite, parent):
+    def createVideoSprite3D(resources, sprite, parent, videos = None):
         """
         Creates a node responsible for rendering a video sprite.
         
         For video sprites we use a finite plane on which the video will be displayed as a movie texture.
         The VideoPlayer class is used to initiate video & audio playback and to acquire an animation interface 
-        which is stored as an attribute at the nodepath level. 
+        which is stored as an attribute at the nodepath level. If a VideoDecodePool is given, the video is
+        acquired from the pool and the interface is a VideoHandle.
         
         Returns: the NodePath for the created node.
         """
-        # loads a plane that extends from -0.5 to 0.5 in XZ plane, face towards world -Y
-        np = loader.loadModel(resources.getResourceFullPath(PanoConstants.RES_TYPE_MODELS, 'plane.egg'))
-        np.reparentTo(parent)
+        # instances the shared card which extends from -0.5 to 0.5 in XZ plane, face towards world -Y
+        np = parent.attachNewNode(sprite.name)
+        SpritesUtil.getCard().instanceTo(np)
         np.setPythonTag('sprite', sprite)
-        video = VideoPlayer.renderToGeom(resources, geom=np, video=sprite.video, audio=sprite.audio)
+        if videos is not None:
+            video = videos.acquire(sprite.video, sprite.audio)
+            if video is not None:
+                tex = video.getTexture()
+                np.setTexture(tex)
+                if tex.getTexturesPower2():            
+                    np.setTexScale(TextureStage.getDefault(), tex.getTexScale()) 
+        else:
+            video = VideoPlayer.renderToGeom(resources, geom=np, video=sprite.video, audio=sprite.audio)
+        if video is None:
+            np.removeNode()
+            return None
         np.setPythonTag('video', video)    
         video.setLoop(True)
         video.play()        
@@ -341,23 +777,31 @@ class SpritesUtil:
         textureCard.setPythonTag('sprite', sprite)                
         return textureCard
     
-    def createImageSprite3D(resources, sprite, parent = None):
+    def createImageSprite3D(resources, sprite, parent = None, atlas = None):
         """
         Creates a node responsible for rendering a sprite whose visual representation consists of a single image.
         
-        We use the CardMaker in order to generate a quad where the image will be applied as a texture.        
+        We instance the shared card of the sprites, see getCard, and apply the image as a texture to its parent.        
+        If an atlas is given and the image can be packed in it, the card of the image's region and the atlas' 
+        texture are used instead.
         
         Returns: the NodePath for the created node.
         """
-        tex = resources.loadTexture(sprite.image)
-        cm = CardMaker(sprite.name)
-        cm.setFrame(-0.5, 0.5, -0.5, 0.5)
-        cm.setColor(1,1,1,1)
         if parent is not None:
-            card = parent.attachNewNode(cm.generate())
+            card = parent.attachNewNode(sprite.name)
+        else:
+            card = NodePath(sprite.name)
+            
+        region = None
+        if atlas is not None:
+            region = atlas.acquire(sprite.image)
+        if region is not None:
+            region.getCard().instanceTo(card)
+            card.setTexture(region.getTexture())
+            card.setPythonTag('atlas_region', region)
         else:
-            card = NodePath(cm.generate())
-        card.setTexture(tex)
+            SpritesUtil.getCard().instanceTo(card)
+            card.setTexture(resources.loadTexture(sprite.image))
         card.setPythonTag('sprite', sprite)
         return card
     
@@ -365,6 +809,7 @@ class SpritesUtil:
         SpritesUtil.counter += 1
         return PanoConstants.SPRITES_NAME_PREFIX + spriteName + ('_%i' % SpritesUtil.counter) 
     
+    getCard                     = staticmethod(getCard)
     createSprite3D              = staticmethod(createSprite3D)
     createVideoSprite3D         = staticmethod(createVideoSprite3D)
     createImageSequenceSprite3D = staticmethod(createImageSequenceSprite3D)